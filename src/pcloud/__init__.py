@@ -1,6 +1,8 @@
 #
 from pcloud.api import PyCloud
+from pcloud.asyncapi import AsyncPyCloud
 
 PyCloud  # pyflakes
+AsyncPyCloud  # pyflakes
 
-__all__ = ["PyCloud"]
+__all__ = ["PyCloud", "AsyncPyCloud"]
@@ -1,25 +1,35 @@
 import os
 import httpx
+import inspect
+import threading
+import time
 import zipfile
 
+from concurrent.futures import ThreadPoolExecutor
 from hashlib import sha1
 from io import BytesIO
 
+from pcloud.binaryprotocol import PCloudBinaryConnection
+from pcloud.binaryprotocol import PCloudBinaryConnectionPool
+from pcloud.endpointselector import EndpointSelector
 from pcloud.protocols import JsonAPIProtocol
 from pcloud.protocols import JsonEAPIProtocol
 from pcloud.protocols import BinAPIProtocol
 from pcloud.protocols import BinEAPIProtocol
 from pcloud.protocols import TestProtocol
 from pcloud.protocols import NearestProtocol
+from pcloud.protocols import BinNearestProtocol
 from pcloud.jsonprotocol import PCloudJSONConnection
 from pcloud.oauth2 import TokenHandler
+from pcloud.paralleldownload import ParallelDownload
+from pcloud.resumableupload import ResumableUpload
+from pcloud.treeindex import TreeIndex
 from pcloud.utils import log
 from pcloud.utils import to_api_datetime
 from pcloud.validate import MODE_AND
 from pcloud.validate import RequiredParameterCheck
 
 from urllib.parse import urlparse
-from urllib.parse import urlunsplit
 
 
 # File open flags https://docs.pcloud.com/methods/fileops/file_open.html
@@ -45,6 +55,91 @@ class InvalidFileModeError(Exception):
     """File mode not supported"""
 
 
+class PyCloudPipeline(object):
+    """Collects API calls and sends them as one batch.
+
+    Use it via `PyCloud.pipeline`. Calls are validated like on `PyCloud`,
+    but only queued. Their results are available in `results` in call order
+    once the pipeline has been executed. Calls return the index of their
+    result. Methods which don't map to a single request, whose response
+    is post-processed (i.e. uploads or `file_exists`) or whose data is
+    written or streamed raise a TypeError.
+    """
+
+    # the cache and resolver are updated once the calls have been sent
+    cache = None
+    resolver = None
+    # class the API methods are taken from, per default the one of the api
+    api_class = None
+    unsupported_methods = frozenset(
+        [
+            "file_exists",
+            "file_write",
+            "get_auth_token",
+            "getdigest",
+            "getnearestendpoint",
+            "parallel_download",
+            "pin",
+            "pipeline",
+            "resumable_upload",
+            "tree_index",
+            "upload_write",
+            "uploadfile",
+            "warmup",
+        ]
+    )
+
+    def __init__(self, api):
+        self.api = api
+        self.commands = []
+        self.results = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+
+    def __getattr__(self, name):
+        if name in self.unsupported_methods:
+            raise TypeError(f"{name} can't be used in a pipeline.")
+        # bind the methods of PyCloud to the pipeline,
+        # so their requests end up in our `_do_request`
+        method = inspect.getattr_static(self.api_class or type(self.api), name, None)
+        if isinstance(method, staticmethod):
+            return method.__func__
+        if not inspect.isfunction(method):
+            raise AttributeError(name)
+        return method.__get__(self)
+
+    def getpubzip(self, unzip=False, **kwargs):
+        if unzip:
+            raise TypeError("getpubzip(unzip=True) can't be used in a pipeline.")
+        return self.__getattr__("getpubzip")(**kwargs)
+
+    def _do_request(self, method, authenticate=True, json=True, endpoint=None, **kw):
+        special = sorted(key for key in kw if key.startswith("_"))
+        if special:
+            # i.e. writer or stream of downloads
+            raise TypeError(f"{method} with {special} can't be used in a pipeline.")
+        self.commands.append((method, authenticate, json, endpoint, kw))
+        return len(self.commands) - 1
+
+    def execute(self):
+        """Send all queued calls and return their results."""
+        commands, self.commands = self.commands, []
+        self.api._authenticate()
+        self.results = self.api.connection.pipeline(commands)
+        self._invalidate_results(commands)
+        return self.results
+
+    def _invalidate_results(self, commands):
+        """Update the cache of the api with the results of mutating calls"""
+        for (method, _, _, _, params), result in zip(commands, self.results):
+            self.api._invalidate_cache(method, params, result)
+
+
 class PyCloud(object):
     endpoints = {
         "api": JsonAPIProtocol,
@@ -53,11 +148,61 @@ class PyCloud(object):
         "binapi": BinAPIProtocol,
         "bineapi": BinEAPIProtocol,
         "nearest": NearestProtocol,
+        "binnearest": BinNearestProtocol,
     }
+    cache = None
+    endpoint_selector = None
+    resolver = None
+    token_store = None
+    username = password = b""
+    auth_token = access_token = ""
+    # results of requests with an invalid or expired auth token
+    auth_errors = frozenset([1000, 2000])
 
     def __init__(
-        self, username, password, endpoint="api", token_expire=31536000, oauth2=False
+        self,
+        username,
+        password,
+        endpoint="api",
+        token_expire=31536000,
+        oauth2=False,
+        pool_size=None,
+        timeout=None,
+        limits=None,
+        http2=False,
+        cache=None,
+        resolver=None,
+        token_store=None,
+        lazy=False,
+        endpoint_selector=None,
     ):
+        """
+        :param pool_size: number of connections kept open. Creates a pool of
+            connections for the binary protocol.
+        :param timeout: timeout for the JSON protocol in seconds or httpx.Timeout
+        :param limits: httpx.Limits for the JSON protocol, takes precedence over
+            `pool_size`
+        :param http2: use HTTP/2 for the JSON protocol
+        :param cache: a `MetadataCache` for the responses of stat, listfolder
+            and other metadata requests
+        :param resolver: a `PathResolver` replacing paths with known ids
+        :param token_store: a token store, i.e. `FileTokenStore`, to reuse
+            auth tokens until they expire or are rejected
+        :param lazy: connect and authenticate on the first request instead
+            of here, see also `warmup`
+        :param endpoint_selector: an `EndpointSelector` choosing the server of
+            the *nearest* and *binnearest* endpoints
+        """
+        self.cache = cache
+        self.endpoint_selector = endpoint_selector
+        self.resolver = resolver
+        self.token_store = token_store
+        self._auth_lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        if pool_size and limits is None:
+            limits = httpx.Limits(
+                max_connections=pool_size, max_keepalive_connections=pool_size
+            )
         if endpoint not in self.endpoints:
             log.error(
                 "Endpoint (%s) not found. Use one of: %s",
@@ -65,33 +210,91 @@ class PyCloud(object):
                 ", ".join(self.endpoints.keys()),
             )
             return
-        elif endpoint == "nearest":
-            self.endpoint = self.getnearestendpoint()
-            conn = PCloudJSONConnection(self)
-        else:
-            protocol = self.endpoints.get(endpoint)
-            self.endpoint = protocol.endpoint
-            conn = protocol.connection(self)
-        self.connection = conn.connect()
-
-        log.info(f"Using pCloud API endpoint: {self.endpoint}")
+        self.protocol = self.endpoints.get(endpoint)
+        self.endpoint = self.protocol.endpoint
+        self._connection_options = {
+            "pool_size": pool_size,
+            "timeout": timeout,
+            "limits": limits,
+            "http2": http2,
+        }
         self.username = username.lower().encode("utf-8")
         self.password = password.encode("utf-8")
         self.token_expire = token_expire
+        self.access_token = ""
+        self.auth_token = ""
         if oauth2:
             log.info("Using oauth2 authentication method.")
             self.access_token = password
-            self.auth_token = ""
         elif not username and not password:
             log.info(
                 "No username/password specified. Only public methods are available."
             )
-            self.access_token = ""
-            self.auth_token = ""
         else:
             log.info("Using username/password authentication method.")
-            self.access_token = ""
-            self.auth_token = self.get_auth_token()
+        if not lazy:
+            self._connection = self._open_connection()
+            self._authenticate()
+
+    @property
+    def connection(self):
+        """The connection to the API, which is opened on first use"""
+        if self._connection is None:
+            with self._connect_lock:
+                if self._connection is None:
+                    self._connection = self._open_connection()
+        return self._connection
+
+    @connection.setter
+    def connection(self, connection):
+        self._connection = connection
+
+    _connection = None
+
+    def _open_connection(self):
+        options = dict(self._connection_options)
+        pool_size = options.pop("pool_size")
+        protocol = self.protocol
+        if protocol in (NearestProtocol, BinNearestProtocol):
+            self.endpoint = self.getnearestendpoint()
+        connection_pool = getattr(protocol, "connection_pool", None)
+        if pool_size and connection_pool is not None:
+            conn = connection_pool(self, size=pool_size)
+        elif issubclass(protocol.connection, PCloudJSONConnection):
+            conn = protocol.connection(self, **options)
+        else:
+            conn = protocol.connection(self)
+        log.info(f"Using pCloud API endpoint: {self.endpoint}")
+        return conn.connect()
+
+    def _authenticate(self):
+        """Get an auth token on first use if username and password are given."""
+        if self.auth_token or self.access_token:
+            return
+        if not self.username and not self.password:
+            return
+        # the nearest protocols choose the endpoint, which stored tokens
+        # are keyed by, on connecting
+        self.connection
+        with self._auth_lock:
+            if not self.auth_token:
+                self.auth_token = self._login()
+
+    def warmup(self):
+        """Connect and authenticate in a background thread, which is
+        returned. Requests made meanwhile wait for it.
+        """
+
+        def run():
+            try:
+                self.connection
+                self._authenticate()
+            except Exception:
+                log.exception("Warming up the connection failed.")
+
+        thread = threading.Thread(target=run, name="pcloud-warmup", daemon=True)
+        thread.start()
+        return thread
 
     @classmethod
     def oauth2_authorize(
@@ -118,21 +321,115 @@ class PyCloud(object):
         return cls("", access_token, endpoint, token_expire, oauth2=True)
 
     def _do_request(self, method, authenticate=True, json=True, endpoint=None, **kw):
-        return self.connection.do_get_request(
-            method, authenticate, json, endpoint, **kw
-        )
+        if authenticate:
+            self._authenticate()
+        if not authenticate or self.token_store is None:
+            return self._resolved_request(method, authenticate, json, endpoint, kw)
+        token = self.auth_token
+        resp = self._resolved_request(method, authenticate, json, endpoint, kw)
+        if self._token_rejected(resp, token):
+            self._renew_token(token)
+            resp = self._resolved_request(method, authenticate, json, endpoint, kw)
+        return resp
+
+    def _resolved_request(self, method, authenticate, json, endpoint, kw):
+        resolver = self.resolver
+        if resolver is None:
+            return self._cached_request(method, authenticate, json, endpoint, kw)
+        params, resp = kw, None
+        try:
+            resp = self._cached_request(
+                method, authenticate, json, endpoint, resolver.resolve(method, kw)
+            )
+        finally:
+            resolver.update(method, params, resp)
+        return resp
+
+    def _cached_request(self, method, authenticate, json, endpoint, kw):
+        cache = self.cache
+        if cache is None:
+            return self.connection.do_get_request(
+                method, authenticate, json, endpoint, **kw
+            )
+        key = cache.key(method, kw) if method in cache.cached_methods else None
+        if key is not None:
+            resp = cache.get(key)
+            if resp is not None:
+                return resp
+        params, resp = dict(kw), None
+        try:
+            resp = self.connection.do_get_request(
+                method, authenticate, json, endpoint, **kw
+            )
+        finally:
+            if key is None:
+                cache.invalidate(method, params, resp)
+        if key is not None:
+            cache.put(key, params, resp)
+        return resp
+
+    def _invalidate_cache(self, method, params, resp=None):
+        if self.cache is not None:
+            self.cache.invalidate(method, params, resp)
+        if self.resolver is not None:
+            self.resolver.update(method, params, resp)
+
+    @staticmethod
+    def _download_params(
+        kwargs, writer=None, stream=False, chunk_size=None, progress_callback=None
+    ):
+        """Add the parameters for downloading data in chunks to kwargs.
+
+        :param writer: write the data to this file like object
+        :param stream: return an iterator over the chunks of the data
+        :param chunk_size: the size of the chunks
+        :param progress_callback: called with the size of every chunk
+        """
+        if writer is not None:
+            kwargs["_data_writer"] = writer
+        elif stream:
+            kwargs["_stream"] = True
+        else:
+            return kwargs
+        kwargs["_data_progress_callback"] = progress_callback
+        kwargs["_data_chunk_size"] = chunk_size
+        return kwargs
+
+    def pin(self):
+        """Context manager which sends all calls of the current thread over
+        the same connection. Use it for file descriptor based methods when
+        working with a connection pool:
+
+        with pc.pin():
+            fd = pc.file_open(path="/foo.txt", flags=O_WRITE)["fd"]
+            pc.file_read(fd=fd, count=1024)
+        """
+        return self.connection.pin()
+
+    def pipeline(self):
+        """Queue API calls and send them in one batch.
+
+        With the binary protocol the requests are written back to back on
+        the socket before any result is read, which saves a round trip per
+        call:
+
+        with pc.pipeline() as p:
+            p.stat(path="/foo.txt")
+            p.deletefile(path="/bar.txt")
+        p.results
+        """
+        return PyCloudPipeline(self)
 
     # Authentication
     def getdigest(self):
         resp = self._do_request("getdigest", authenticate=False)
         return bytes(resp["digest"], "utf-8")
 
-    def get_auth_token(self):
-        digest = self.getdigest()
+    def _get_auth_params(self, digest):
         passworddigest = sha1(
             self.password + bytes(sha1(self.username).hexdigest(), "utf-8") + digest
         )
-        params = {
+        return {
             "getauth": 1,
             "logout": 1,
             "username": self.username.decode("utf-8"),
@@ -140,11 +437,46 @@ class PyCloud(object):
             "passworddigest": passworddigest.hexdigest(),
             "authexpire": self.token_expire,
         }
+
+    def get_auth_token(self):
+        params = self._get_auth_params(self.getdigest())
         resp = self._do_request("userinfo", authenticate=False, **params)
         if "auth" not in resp:
             raise AuthenticationError(resp)
         return resp["auth"]
 
+    def _token_key(self):
+        return f"{self.endpoint} {self.username.decode('utf-8')}"
+
+    def _login(self):
+        """Return the stored auth token or get and store a new one"""
+        if self.token_store is None:
+            return self.get_auth_token()
+        key = self._token_key()
+        token = self.token_store.get(key)
+        if token:
+            log.info("Using stored auth token.")
+            return token
+        token = self.get_auth_token()
+        self.token_store.set(key, token, time.time() + self.token_expire)
+        return token
+
+    def _token_rejected(self, resp, token):
+        return (
+            bool(token)
+            and isinstance(resp, dict)
+            and resp.get("result") in self.auth_errors
+        )
+
+    def _renew_token(self, token):
+        """Replace the rejected auth token, once for all threads"""
+        with self._auth_lock:
+            if self.auth_token != token:
+                return
+            log.info("Auth token was rejected, authenticating again.")
+            self.token_store.delete(self._token_key())
+            self.auth_token = self._login()
+
     # General
     def userinfo(self, **kwargs):
         return self._do_request("userinfo")
@@ -153,16 +485,13 @@ class PyCloud(object):
         return self._do_request("supportedlanguages")
 
     def getnearestendpoint(self):
-        default_api = self.endpoints.get("api")
-        resp = self._do_request(
-            "getapiserver", authenticate=False, endpoint=default_api
-        )
-
-        api = resp.get("api")
-        if len(api):
-            return urlunsplit(["https", api[0], "/", "", ""])
-        else:
-            return default_api
+        """Return the endpoint with the lowest latency for the protocol
+        of this instance, see `EndpointSelector`
+        """
+        if self.endpoint_selector is None:
+            self.endpoint_selector = EndpointSelector()
+        binary = self.protocol.connection is PCloudBinaryConnection
+        return self.endpoint_selector.select(binary=binary)
 
     @RequiredParameterCheck(("language",))
     def setlanguage(self, **kwargs):
@@ -187,6 +516,12 @@ class PyCloud(object):
     def getapiserver(self):
         return self._do_request("getapiserver")
 
+    def tree_index(self, path="/"):
+        """Return a `TreeIndex` of all files and folders below path,
+        which answers metadata queries locally.
+        """
+        return TreeIndex(self, path).refresh()
+
     # Folders
     @RequiredParameterCheck(("path", "folderid", "name"))
     def createfolder(self, **kwargs):
@@ -223,34 +558,126 @@ class PyCloud(object):
         1) You can specify a list of filenames to upload
         files=['/home/pcloud/foo.txt', '/home/pcloud/bar.txt']
 
-        2) you can specify binary data via the data parameter and
+        2) you can specify binary data or a file like object, which is
+        read from its current position, via the data parameter and
         need to specify the filename too
         data=b'Hello pCloud', filename='foo.txt'
+
+        Files are sent in chunks of `chunk_size` bytes and the optional
+        `progress_callback` is called with the size of every chunk sent.
+
+        With `workers` the files are uploaded with one request per file
+        over up to `workers` connections at once. A list with the response
+        of every file is returned, which contains the raised exception if
+        the upload of a file failed. The progress callback is called from
+        all workers.
         """
+        workers = kwargs.pop("workers", None)
+        files, params, kwargs = self._uploadfile_args(kwargs)
+        resp = None
+        try:
+            if workers:
+                return self._upload_parallel(files, workers, **kwargs)
+            resp = self._upload("uploadfile", files, **kwargs)
+            return resp
+        finally:
+            self._invalidate_cache("uploadfile", params, resp)
+
+    def _uploadfile_args(self, kwargs):
+        """Return the files, the given and the resolved parameters of uploadfile"""
         if "files" in kwargs:
+            # files are opened one after another while uploading
             upload_files = kwargs.pop("files", [])
-            files = [
-                ("file", (os.path.split(f)[1], open(f, "rb"))) for f in upload_files
-            ]
+            files = [("file", (os.path.split(f)[1], f)) for f in upload_files]
         else:  # 'data' in kwargs:
+            data = kwargs.pop("data")
             files = [
                 (
                     "file",
                     (
                         kwargs.pop("filename", "data-upload.bin"),
-                        BytesIO(kwargs.pop("data")),
+                        data if hasattr(data, "read") else BytesIO(data),
                     ),
                 )
             ]
+        params = kwargs
+        if self.resolver is not None:
+            kwargs = self.resolver.resolve("uploadfile", kwargs)
         if "folderid" in kwargs:
             # cast folderid to string, since API allows this but requests not
             kwargs["folderid"] = str(kwargs["folderid"])
-        return self.connection.upload("uploadfile", files, **kwargs)
+        return files, params, kwargs
+
+    def _upload(self, method, files, **kwargs):
+        self._authenticate()
+        return self.connection.upload(method, files, **kwargs)
+
+    def _upload_parallel(self, files, workers, **kwargs):
+        self._authenticate()
+        connection = self.connection
+        if isinstance(connection, PCloudBinaryConnection):
+            # a single socket can't be shared between threads
+            connection = PCloudBinaryConnectionPool(self, size=workers)
+
+        def upload(entry):
+            try:
+                return connection.upload("uploadfile", [entry], **kwargs)
+            except Exception as e:
+                return e
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(upload, files))
+        finally:
+            if connection is not self.connection:
+                connection.close()
 
     @RequiredParameterCheck(("progresshash",))
     def uploadprogress(self, **kwargs):
         return self._do_request("uploadprogress", **kwargs)
 
+    def resumable_upload(
+        self, filename, chunk_size=None, journal=None, progress_callback=None, **kwargs
+    ):
+        """Upload a large file in chunks, which continues where it stopped
+        when called again after a failure. See `ResumableUpload`.
+
+        The other keyword arguments are passed to `upload_save`, i.e.
+        path='/backup' or folderid=0.
+        """
+        upload = ResumableUpload(
+            self,
+            filename,
+            chunk_size=chunk_size,
+            journal=journal,
+            progress_callback=progress_callback,
+        )
+        return upload.upload(**kwargs)
+
+    # Upload sessions
+    def upload_create(self, **kwargs):
+        return self._do_request("upload_create", **kwargs)
+
+    @RequiredParameterCheck(("uploadid", "uploadoffset", "data"), mode=MODE_AND)
+    def upload_write(self, **kwargs):
+        files = [("file", ("upload-chunk.bin", BytesIO(kwargs.pop("data"))))]
+        return self._upload("upload_write", files, **kwargs)
+
+    @RequiredParameterCheck(("uploadid",))
+    def upload_info(self, **kwargs):
+        return self._do_request("upload_info", **kwargs)
+
+    @RequiredParameterCheck(("uploadid", "name"), mode=MODE_AND)
+    def upload_save(self, **kwargs):
+        return self._do_request("upload_save", **kwargs)
+
+    @RequiredParameterCheck(("uploadid",))
+    def upload_delete(self, **kwargs):
+        return self._do_request("upload_delete", **kwargs)
+
+    def upload_list(self, **kwargs):
+        return self._do_request("upload_list", **kwargs)
+
     @RequiredParameterCheck(("url",))
     def downloadfile(self, **kwargs):
         return self._do_request("downloadfile", **kwargs)
@@ -337,13 +764,62 @@ class PyCloud(object):
         return self._do_request("file_open", use_session=True, **kwargs)
 
     @RequiredParameterCheck(("fd", "count"))
-    def file_read(self, **kwargs):
+    def file_read(
+        self,
+        writer=None,
+        progress_callback=None,
+        stream=False,
+        chunk_size=None,
+        **kwargs,
+    ):
+        """Read `count` bytes from the file descriptor `fd`
+
+        The data is returned as bytes. To avoid holding it in memory pass a
+        file like object as `writer` to write the data to chunk by chunk or
+        set `stream` to get an iterator over the chunks, which must be
+        consumed before the next call.
+        """
+        self._download_params(kwargs, writer, stream, chunk_size, progress_callback)
         return self._do_request("file_read", json=False, use_session=True, **kwargs)
 
     @RequiredParameterCheck(("fd",))
-    def file_pread(self, **kwargs):
+    def file_pread(
+        self,
+        writer=None,
+        progress_callback=None,
+        stream=False,
+        chunk_size=None,
+        **kwargs,
+    ):
+        """Read `count` bytes at `offset` from the file descriptor `fd`
+
+        See `file_read` for `writer` and `stream`.
+        """
+        self._download_params(kwargs, writer, stream, chunk_size, progress_callback)
         return self._do_request("file_pread", json=False, use_session=True, **kwargs)
 
+    @RequiredParameterCheck(("path", "fileid"))
+    def parallel_download(
+        self,
+        destination,
+        chunk_size=None,
+        workers=None,
+        progress_callback=None,
+        **kwargs,
+    ):
+        """Download the file given by `path` or `fileid` to the local path
+        `destination`, fetching ranges over several connections at once.
+        See `ParallelDownload`.
+        """
+        download = ParallelDownload(
+            self,
+            destination,
+            chunk_size=chunk_size,
+            workers=workers,
+            progress_callback=progress_callback,
+        )
+        return download.download(**kwargs)
+
     @RequiredParameterCheck(("fd", "data"))
     def file_pread_ifmod(self, **kwargs):
         return self._do_request(
@@ -362,7 +838,8 @@ class PyCloud(object):
     def file_write(self, **kwargs):
         files = [("file", ("upload-file.io", BytesIO(kwargs.pop("data"))))]
         kwargs["fd"] = str(kwargs["fd"])
-        return self.connection.upload("file_write", files, **kwargs)
+        self._invalidate_cache("file_write", kwargs)
+        return self._upload("file_write", files, **kwargs)
 
     @RequiredParameterCheck(("fd",))
     def file_pwrite(self, **kwargs):
@@ -391,7 +868,19 @@ class PyCloud(object):
         return self._do_request("extractarchive", **kwargs)
 
     @RequiredParameterCheck(("folderid", "folderids", "fileids"))
-    def getzip(self, **kwargs):
+    def getzip(
+        self,
+        writer=None,
+        progress_callback=None,
+        stream=False,
+        chunk_size=None,
+        **kwargs,
+    ):
+        """Return a zip archive of the given files and folders.
+
+        See `file_read` for `writer` and `stream`.
+        """
+        self._download_params(kwargs, writer, stream, chunk_size, progress_callback)
         return self._do_request("getzip", json=False, **kwargs)
 
     @RequiredParameterCheck(("folderid", "folderids", "fileids"))
@@ -461,14 +950,33 @@ class PyCloud(object):
         return self._do_request("getfolderpublink", **kwargs)
 
     @RequiredParameterCheck(("code",))
-    def getpubzip(self, unzip=False, **kwargs):
+    def getpubzip(
+        self,
+        unzip=False,
+        writer=None,
+        progress_callback=None,
+        stream=False,
+        chunk_size=None,
+        **kwargs,
+    ):
+        """Return the zip archive of a public link.
+
+        See `file_read` for `writer` and `stream`, which can't be
+        combined with `unzip`.
+        """
+        if unzip and (writer is not None or stream):
+            raise ValueError("unzip can't be used with writer or stream")
+        self._download_params(kwargs, writer, stream, chunk_size, progress_callback)
         zipresponse = self._do_request(
             "getpubzip", authenticate=False, json=False, **kwargs
         )
         if not unzip:
             return zipresponse
+        return self._unzip_first(zipresponse, kwargs.get("code"))
+
+    def _unzip_first(self, zipresponse, code):
+        """Return contents of the first file in the zip archive"""
         zipfmem = BytesIO(zipresponse)
-        code = kwargs.get("code")
         try:
             zf = zipfile.ZipFile(zipfmem)
         except zipfile.BadZipfile:
@@ -508,12 +1016,13 @@ class PyCloud(object):
     @RequiredParameterCheck(("path",))
     def file_exists(self, **kwargs):
         path = kwargs["path"]
-        resp = self.file_open(path=path, flags=O_APPEND)
-        result = resp.get("result")
-        if result == 0:
-            self.file_close(fd=resp["fd"])
-            return True
-        elif result == 2009:
+        with self.pin():
+            resp = self.file_open(path=path, flags=O_APPEND)
+            result = resp.get("result")
+            if result == 0:
+                self.file_close(fd=resp["fd"])
+                return True
+        if result == 2009:
             return False
         else:
             raise OSError(f"pCloud error occured ({result}) - {resp['error']}:  {path}")
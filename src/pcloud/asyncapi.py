@@ -0,0 +1,365 @@
+import asyncio
+import httpx
+import time
+
+from pcloud.api import AuthenticationError
+from pcloud.api import O_APPEND
+from pcloud.api import PyCloud
+from pcloud.api import PyCloudPipeline
+from pcloud.asyncjsonprotocol import AsyncPCloudJSONConnection
+from pcloud.endpointselector import EndpointSelector
+from pcloud.paralleldownload import AsyncParallelDownload
+from pcloud.protocols import BinAPIProtocol
+from pcloud.protocols import BinEAPIProtocol
+from pcloud.protocols import JsonAPIProtocol
+from pcloud.protocols import JsonEAPIProtocol
+from pcloud.protocols import TestProtocol
+from pcloud.resumableupload import AsyncResumableUpload
+from pcloud.treeindex import AsyncTreeIndex
+from pcloud.utils import log
+from pcloud.validate import RequiredParameterCheck
+
+
+class AsyncPyCloudPipeline(PyCloudPipeline):
+    """Pipeline for `AsyncPyCloud`, which must be used with `async with`."""
+
+    # the coroutines of AsyncPyCloud would not queue their requests
+    api_class = PyCloud
+
+    def __enter__(self):
+        raise TypeError("Use 'async with' for pipelines of AsyncPyCloud.")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            await self.execute()
+
+    async def execute(self):
+        """Send all queued calls and return their results."""
+        commands, self.commands = self.commands, []
+        await self.api._authenticate()
+        self.results = await self.api.connection.pipeline(commands)
+        self._invalidate_results(commands)
+        return self.results
+
+
+class AsyncPyCloud(PyCloud):
+    """Asynchronous pCloud client with the API methods of `PyCloud`
+
+    All API methods are coroutines. Connecting and authentication
+    happen on the first request:
+
+    async with AsyncPyCloud(username, password) as pc:
+        await pc.listfolder(folderid=0)
+    """
+
+    endpoints = {
+        "api": JsonAPIProtocol,
+        "eapi": JsonEAPIProtocol,
+        "test": TestProtocol,
+        "binapi": BinAPIProtocol,
+        "bineapi": BinEAPIProtocol,
+    }
+
+    def __init__(
+        self,
+        username,
+        password,
+        endpoint="api",
+        token_expire=31536000,
+        oauth2=False,
+        pool_size=None,
+        timeout=None,
+        limits=None,
+        http2=False,
+        cache=None,
+        resolver=None,
+        token_store=None,
+    ):
+        """See `PyCloud`. The binary protocol always uses a single connection.
+        The nearest endpoints aren't supported.
+        """
+        self.cache = cache
+        self.resolver = resolver
+        self.token_store = token_store
+        if endpoint not in self.endpoints:
+            log.error(
+                "Endpoint (%s) not found. Use one of: %s",
+                endpoint,
+                ", ".join(self.endpoints.keys()),
+            )
+            return
+        protocol = self.endpoints.get(endpoint)
+        self.endpoint = protocol.endpoint
+        if issubclass(protocol.async_connection, AsyncPCloudJSONConnection):
+            if pool_size and limits is None:
+                limits = httpx.Limits(
+                    max_connections=pool_size, max_keepalive_connections=pool_size
+                )
+            self.connection = protocol.async_connection(
+                self, timeout=timeout, limits=limits, http2=http2
+            )
+        else:
+            self.connection = protocol.async_connection(self)
+
+        log.info(f"Using pCloud API endpoint: {self.endpoint}")
+        self.username = username.lower().encode("utf-8")
+        self.password = password.encode("utf-8")
+        self.token_expire = token_expire
+        self.auth_token = ""
+        self.access_token = password if oauth2 else ""
+        self._auth_lock = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        await self.connection.close()
+
+    def warmup(self):
+        """Authenticate in a background task, which is returned. Requests
+        made meanwhile wait for it.
+        """
+
+        async def run():
+            try:
+                await self._authenticate()
+            except Exception:
+                log.exception("Warming up the connection failed.")
+
+        return asyncio.ensure_future(run())
+
+    async def _authenticate(self):
+        """Get an auth token on first use if username and password are given."""
+        if self.auth_token or self.access_token:
+            return
+        if not self.username and not self.password:
+            return
+        if self._auth_lock is None:
+            self._auth_lock = asyncio.Lock()
+        async with self._auth_lock:
+            if not self.auth_token:
+                self.auth_token = await self._login()
+
+    async def _login(self):
+        """Return the stored auth token or get and store a new one"""
+        if self.token_store is None:
+            return await self.get_auth_token()
+        key = self._token_key()
+        token = self.token_store.get(key)
+        if token:
+            return token
+        token = await self.get_auth_token()
+        self.token_store.set(key, token, time.time() + self.token_expire)
+        return token
+
+    async def _renew_token(self, token):
+        """Replace the rejected auth token, once for all tasks"""
+        async with self._auth_lock:
+            if self.auth_token != token:
+                return
+            log.info("Auth token was rejected, authenticating again.")
+            self.token_store.delete(self._token_key())
+            self.auth_token = await self._login()
+
+    async def _do_request(
+        self, method, authenticate=True, json=True, endpoint=None, **kw
+    ):
+        if authenticate:
+            await self._authenticate()
+        if not authenticate or self.token_store is None:
+            return await self._resolved_request(
+                method, authenticate, json, endpoint, kw
+            )
+        token = self.auth_token
+        resp = await self._resolved_request(method, authenticate, json, endpoint, kw)
+        if self._token_rejected(resp, token):
+            await self._renew_token(token)
+            resp = await self._resolved_request(
+                method, authenticate, json, endpoint, kw
+            )
+        return resp
+
+    async def _resolved_request(self, method, authenticate, json, endpoint, kw):
+        resolver = self.resolver
+        if resolver is None:
+            return await self._cached_request(method, authenticate, json, endpoint, kw)
+        params, resp = kw, None
+        try:
+            resp = await self._cached_request(
+                method, authenticate, json, endpoint, resolver.resolve(method, kw)
+            )
+        finally:
+            resolver.update(method, params, resp)
+        return resp
+
+    async def _cached_request(self, method, authenticate, json, endpoint, kw):
+        cache = self.cache
+        if cache is None:
+            return await self.connection.do_get_request(
+                method, authenticate, json, endpoint, **kw
+            )
+        key = cache.key(method, kw) if method in cache.cached_methods else None
+        if key is not None:
+            resp = cache.get(key)
+            if resp is not None:
+                return resp
+        params, resp = dict(kw), None
+        try:
+            resp = await self.connection.do_get_request(
+                method, authenticate, json, endpoint, **kw
+            )
+        finally:
+            if key is None:
+                cache.invalidate(method, params, resp)
+        if key is not None:
+            cache.put(key, params, resp)
+        return resp
+
+    def pipeline(self):
+        """Queue API calls and send them concurrently.
+
+        async with pc.pipeline() as p:
+            p.stat(path="/foo.txt")
+            p.deletefile(path="/bar.txt")
+        p.results
+        """
+        return AsyncPyCloudPipeline(self)
+
+    # Authentication
+    async def getdigest(self):
+        resp = await self._do_request("getdigest", authenticate=False)
+        return bytes(resp["digest"], "utf-8")
+
+    async def get_auth_token(self):
+        params = self._get_auth_params(await self.getdigest())
+        resp = await self._do_request("userinfo", authenticate=False, **params)
+        if "auth" not in resp:
+            raise AuthenticationError(resp)
+        return resp["auth"]
+
+    # General
+    async def getnearestendpoint(self):
+        """Return the endpoint with the lowest latency, see `EndpointSelector`"""
+        if self.endpoint_selector is None:
+            self.endpoint_selector = EndpointSelector()
+        binary = not isinstance(self.connection, AsyncPCloudJSONConnection)
+        # probing blocks, so it runs in a thread
+        return await asyncio.to_thread(self.endpoint_selector.select, binary=binary)
+
+    # File
+    @RequiredParameterCheck(("files", "data"))
+    async def uploadfile(self, **kwargs):
+        """upload a file to pCloud, see `PyCloud.uploadfile`"""
+        workers = kwargs.pop("workers", None)
+        files, params, kwargs = self._uploadfile_args(kwargs)
+        await self._authenticate()
+        resp = None
+        try:
+            if workers:
+                return await self._upload_parallel(files, workers, **kwargs)
+            resp = await self.connection.upload("uploadfile", files, **kwargs)
+            return resp
+        finally:
+            self._invalidate_cache("uploadfile", params, resp)
+
+    def _upload(self, method, files, **kwargs):
+        # the callers authenticate before
+        return self.connection.upload(method, files, **kwargs)
+
+    async def _upload_parallel(self, files, workers, **kwargs):
+        """Upload the files concurrently, at most `workers` at once."""
+        semaphore = asyncio.Semaphore(workers)
+
+        async def upload(entry):
+            async with semaphore:
+                return await self.connection.upload("uploadfile", [entry], **kwargs)
+
+        return await asyncio.gather(
+            *(upload(entry) for entry in files), return_exceptions=True
+        )
+
+    async def tree_index(self, path="/"):
+        return await AsyncTreeIndex(self, path).refresh()
+
+    @RequiredParameterCheck(("path", "fileid"))
+    async def parallel_download(
+        self,
+        destination,
+        chunk_size=None,
+        workers=None,
+        progress_callback=None,
+        **kwargs,
+    ):
+        download = AsyncParallelDownload(
+            self,
+            destination,
+            chunk_size=chunk_size,
+            workers=workers,
+            progress_callback=progress_callback,
+        )
+        return await download.download(**kwargs)
+
+    async def resumable_upload(
+        self, filename, chunk_size=None, journal=None, progress_callback=None, **kwargs
+    ):
+        upload = AsyncResumableUpload(
+            self,
+            filename,
+            chunk_size=chunk_size,
+            journal=journal,
+            progress_callback=progress_callback,
+        )
+        return await upload.upload(**kwargs)
+
+    async def upload_write(self, **kwargs):
+        await self._authenticate()
+        return await super().upload_write(**kwargs)
+
+    async def file_write(self, **kwargs):
+        await self._authenticate()
+        return await super().file_write(**kwargs)
+
+    # Public links
+    @RequiredParameterCheck(("code",))
+    async def getpubzip(
+        self,
+        unzip=False,
+        writer=None,
+        progress_callback=None,
+        stream=False,
+        chunk_size=None,
+        **kwargs,
+    ):
+        if unzip and (writer is not None or stream):
+            raise ValueError("unzip can't be used with writer or stream")
+        self._download_params(kwargs, writer, stream, chunk_size, progress_callback)
+        zipresponse = await self._do_request(
+            "getpubzip", authenticate=False, json=False, **kwargs
+        )
+        if not unzip:
+            return zipresponse
+        return self._unzip_first(zipresponse, kwargs.get("code"))
+
+    # convenience methods
+    @RequiredParameterCheck(("path",))
+    async def file_exists(self, **kwargs):
+        path = kwargs["path"]
+        async with self.pin():
+            resp = await self.file_open(path=path, flags=O_APPEND)
+            result = resp.get("result")
+            if result == 0:
+                await self.file_close(fd=resp["fd"])
+                return True
+        if result == 2009:
+            return False
+        else:
+            raise OSError(f"pCloud error occured ({result}) - {resp['error']}:  {path}")
+
+
+# EOF
@@ -0,0 +1,268 @@
+import asyncio
+import inspect
+import ssl
+
+from contextlib import asynccontextmanager
+from pcloud.binaryprotocol import PCloudBinaryConnection
+from pcloud.binaryprotocol import PCloudBinaryDecoder
+from pcloud.utils import open_upload
+from urllib.parse import urlparse
+
+
+class AsyncPCloudBinaryConnection(object):
+    """Connection to pcloud.com based on their binary protocol using asyncio.
+
+    Requests of concurrent tasks are written back to back on the socket
+    and their results are read in the same order, so a single connection
+    serves many tasks at once.
+
+    The connection is established on the first request.
+    """
+
+    allowed_endpoints = frozenset(["binapi", "bineapi"])
+    # size of the slices uploaded and downloaded data is transferred in
+    chunk_size = 1024 * 1024
+
+    # request encoding is shared with the blocking connection
+    _prepare_send_request = PCloudBinaryConnection._prepare_send_request
+    _determine_data_len = PCloudBinaryConnection._determine_data_len
+    _auth_params = PCloudBinaryConnection._auth_params
+
+    def __init__(self, api, persistent_params=None):
+        self.api = api
+        self.server = urlparse(api.endpoint).netloc
+        self.timeout = 30
+        self.reader = None
+        self.writer = None
+        self._send_lock = None
+        self._last_read = None
+        if persistent_params is None:
+            self.persistent_params = {}
+        else:
+            self.persistent_params = persistent_params
+
+    async def _open_connection(self):
+        context = ssl.create_default_context()
+        return await asyncio.wait_for(
+            asyncio.open_connection(
+                self.server, 443, ssl=context, server_hostname=self.server
+            ),
+            self.timeout,
+        )
+
+    async def connect(self):
+        """Establish connection and return self."""
+        if self.writer:
+            raise ValueError("maybe connect called twice?")
+        self.reader, self.writer = await self._open_connection()
+        self._last_read = None
+        return self
+
+    def _lock(self):
+        # created on first use, so it belongs to the running event loop
+        if self._send_lock is None:
+            self._send_lock = asyncio.Lock()
+        return self._send_lock
+
+    async def do_get_request(
+        self, method, authenticate=True, json=True, endpoint=None, **kw
+    ):
+        """Send command and wait for its result.
+
+        Accepts the same special parameters as
+        PCloudBinaryConnection.do_get_request except _noresult. _stream
+        returns an asynchronous iterator. The results of all other tasks
+        wait until it has been consumed, so prefer _data_writer. There is
+        no timeout for reading results, except _timeout of the request,
+        after which the connection is reset.
+        """
+        stream = kw.pop("_stream", None)
+        timeout = kw.pop("_timeout", None)
+        data = kw.pop("_data", None)
+        data_progress_callback = kw.pop("_data_progress_callback", None)
+        data_chunk_size = kw.pop("_data_chunk_size", None)
+        data_writer = kw.pop("_data_writer", None)
+        if authenticate:
+            kw.update(self._auth_params())
+        async with self._lock():
+            if self.writer is None:
+                # on first use or after the connection has been aborted
+                await self.connect()
+            # results are read in the order the requests have been sent
+            previous, turn = self._last_read, asyncio.Event()
+            self._last_read = turn
+            reader = self.reader
+            try:
+                await self._send_command(
+                    method, kw, data, data_progress_callback, data_chunk_size
+                )
+            except BaseException:
+                self._abort()
+                turn.set()
+                raise
+        streaming = False
+        try:
+            if previous is not None:
+                await previous.wait()
+            if stream:
+                result, data_len = await self._get_result_header(reader)
+                if data_len:
+                    streaming = True
+                    return self._iter_data(
+                        reader, data_len, turn, data_progress_callback, data_chunk_size
+                    )
+                return result
+            result = self._get_result(
+                reader, data_writer, data_progress_callback, data_chunk_size
+            )
+            if timeout is not None:
+                return await asyncio.wait_for(result, timeout)
+            return await result
+        except BaseException:
+            # the result is not consumed, following results would be garbage
+            if reader is self.reader:
+                self._abort()
+            raise
+        finally:
+            if not streaming:
+                turn.set()
+
+    async def pipeline(self, commands):
+        """Send commands back to back and return their results in order."""
+        return await asyncio.gather(
+            *(
+                self.do_get_request(method, authenticate, json, endpoint, **params)
+                for method, authenticate, json, endpoint, params in commands
+            )
+        )
+
+    async def upload(self, method, files, **kwargs):
+        progress_callback = kwargs.pop("progress_callback", None)
+        chunk_size = kwargs.pop("chunk_size", None)
+        for entry in files:
+            filename, source = entry[1]
+            with open_upload(source) as fd:
+                response = await self.do_get_request(
+                    method,
+                    _data=fd,
+                    filename=filename,
+                    _data_progress_callback=progress_callback,
+                    _data_chunk_size=chunk_size,
+                    **kwargs,
+                )
+        return response
+
+    async def _send_command(
+        self, method, params, data, data_progress_callback, data_chunk_size
+    ):
+        data_len = self._determine_data_len(data)
+        params.update(self.persistent_params)
+        req = self._prepare_send_request(method, params, data_len)
+        assert len(req) < 65536, "Request too long {0}".format(len(req))
+        self.writer.write(len(req).to_bytes(2, "little"))
+        self.writer.write(req)
+        if data is not None:
+            await self._send_raw_data(
+                data, data_len, data_progress_callback, data_chunk_size
+            )
+        await self.writer.drain()
+
+    async def _send_raw_data(self, data, data_len, progress_callback, chunk_size):
+        """Sends data at the end of the command, waiting for the socket
+        buffer to drain after every chunk.
+        """
+        chunk_size = chunk_size or self.chunk_size
+        if hasattr(data, "read"):
+            read_chunk = data.read
+        else:
+            view = memoryview(data).cast("B")
+            pos = 0
+
+            def read_chunk(size):
+                nonlocal pos
+                chunk = view[pos : pos + size]
+                pos += len(chunk)
+                return chunk
+
+        while data_len > 0:
+            chunk = read_chunk(min(data_len, chunk_size))
+            if not chunk:
+                raise IOError("Mismatch between bytes written and supplied data length")
+            self.writer.write(chunk)
+            await self.writer.drain()
+            data_len -= len(chunk)
+            if progress_callback:
+                progress_callback(len(chunk))
+
+    async def _get_result_header(self, reader):
+        """Read the result and return it with the length of its data"""
+        frame_len = int.from_bytes(await reader.readexactly(4), "little")
+        frame = await reader.readexactly(frame_len)
+        data_lens = []
+        result = PCloudBinaryDecoder(frame, data_lens.append).decode()
+        return result, data_lens[0] if data_lens else None
+
+    async def _get_result(
+        self, reader, data_writer=None, progress_callback=None, chunk_size=None
+    ):
+        result, data_len = await self._get_result_header(reader)
+        if data_len is None:
+            return result
+        if data_writer is not None:
+            await self._write_data(
+                reader, data_writer, data_len, progress_callback, chunk_size
+            )
+            return result
+        return await reader.readexactly(data_len) or result
+
+    async def _iter_data(self, reader, data_len, turn, progress_callback, chunk_size):
+        """Yield the data of a response in chunks. The next result is read
+        when the iterator is exhausted or closed.
+        """
+        chunk_size = chunk_size or self.chunk_size
+        try:
+            while data_len > 0:
+                chunk = await reader.readexactly(min(chunk_size, data_len))
+                data_len -= len(chunk)
+                yield chunk
+                if progress_callback:
+                    progress_callback(len(chunk))
+        finally:
+            if data_len > 0 and reader is self.reader:
+                # the rest of the data would be read as the next result
+                self._abort()
+            turn.set()
+
+    async def _write_data(
+        self, reader, writer, data_len, progress_callback=None, chunk_size=None
+    ):
+        """Write data from response to writer, which may be asynchronous."""
+        chunk_size = chunk_size or self.chunk_size
+        while data_len > 0:
+            chunk = await reader.readexactly(min(chunk_size, data_len))
+            written = writer.write(chunk)
+            if inspect.isawaitable(written):
+                await written
+            data_len -= len(chunk)
+            if progress_callback:
+                progress_callback(len(chunk))
+
+    @asynccontextmanager
+    async def pin(self):
+        """There is only one socket, so every call uses the same anyway."""
+        yield self
+
+    def _abort(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def close(self):
+        writer = self.writer
+        self.reader = self.writer = None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
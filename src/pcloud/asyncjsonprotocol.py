@@ -0,0 +1,174 @@
+import asyncio
+import contextvars
+import httpx
+import inspect
+
+from contextlib import asynccontextmanager
+from pcloud.jsonprotocol import PCloudJSONConnection
+from pcloud.utils import log
+
+
+class AsyncPCloudJSONConnection(PCloudJSONConnection):
+    """Connection to pcloud.com based on their JSON protocol using
+    httpx.AsyncClient. All requests share the connection pool of the client.
+    """
+
+    allowed_endpoints = frozenset(["api", "eapi"])
+
+    def __init__(self, api, timeout=None, limits=None, http2=False):
+        """Connect to pcloud API based on their JSON protocol.
+
+        See PCloudJSONConnection for the parameters.
+        """
+        self.client_options = {"http2": http2}
+        if timeout is not None:
+            self.client_options["timeout"] = timeout
+        if limits is not None:
+            self.client_options["limits"] = limits
+        self._session = httpx.AsyncClient(**self.client_options)
+        self._pinned = contextvars.ContextVar("pinned_session", default=None)
+        # clients with a single connection, which are kept open for pinning
+        self._idle = []
+        self.api = api
+
+    @property
+    def session(self):
+        """The httpx.AsyncClient pinned to the current task or the shared one"""
+        return self._pinned.get() or self._session
+
+    @session.setter
+    def session(self, session):
+        self._session = session
+
+    async def connect(self):
+        return self
+
+    @asynccontextmanager
+    async def pin(self):
+        """Send all requests of the current task over the same HTTP
+        connection. File descriptors are only valid on the connection they
+        were opened on.
+        """
+        if self._pinned.get() is not None:
+            yield self
+            return
+        if self._idle:
+            session = self._idle.pop()
+        else:
+            options = dict(
+                self.client_options, limits=httpx.Limits(max_connections=1)
+            )
+            session = httpx.AsyncClient(**options)
+        token = self._pinned.set(session)
+        try:
+            yield self
+        except BaseException:
+            # the state of the connection is unknown, don't reuse it
+            await session.aclose()
+            raise
+        finally:
+            self._pinned.reset(token)
+        self._idle.append(session)
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for session in idle:
+            await session.aclose()
+        await self._session.aclose()
+
+    async def do_get_request(
+        self, method, authenticate=True, json=True, endpoint=None, **kw
+    ):
+        """See PCloudJSONConnection.do_get_request, _stream returns an
+        asynchronous iterator.
+        """
+        data_writer = kw.pop("_data_writer", None)
+        data_progress_callback = kw.pop("_data_progress_callback", None)
+        data_chunk_size = kw.pop("_data_chunk_size", None) or self.chunk_size
+        stream = kw.pop("_stream", None)
+        timeout = kw.pop("_timeout", None)
+        url, params = self._prepare_request(method, authenticate, endpoint, kw)
+        if not json and data_writer is not None:
+            return await self._write_data(
+                url, params, data_writer, data_progress_callback, data_chunk_size
+            )
+        if not json and stream:
+            return await self._iter_data(
+                url, params, data_progress_callback, data_chunk_size
+            )
+        if timeout is not None:
+            resp = await self.session.get(url, params=params, timeout=timeout)
+        else:
+            resp = await self.session.get(url, params=params)
+        resp.raise_for_status()
+        if json:
+            result = resp.json()
+        else:
+            result = resp.content
+        log.debug("Response: %s", result)
+        return result
+
+    async def _open_data(self, url, params):
+        """See PCloudJSONConnection._open_data"""
+        session = self.session
+        request = session.build_request("GET", url, params=params)
+        resp = await session.send(request, stream=True)
+        try:
+            resp.raise_for_status()
+            if self._is_json(resp):
+                await resp.aread()
+                error = self._api_error(resp)
+                if error is not None:
+                    await resp.aclose()
+                    return error
+        except BaseException:
+            await resp.aclose()
+            raise
+        return resp
+
+    async def _iter_data(self, url, params, progress_callback, chunk_size):
+        """Return an asynchronous iterator over the chunks of the response
+        body or the error returned instead.
+        """
+        resp = await self._open_data(url, params)
+        if isinstance(resp, dict):
+            return resp
+        return self._iter_body(resp, progress_callback, chunk_size)
+
+    async def _iter_body(self, resp, progress_callback, chunk_size):
+        try:
+            async for chunk in resp.aiter_bytes(chunk_size):
+                yield chunk
+                if progress_callback:
+                    progress_callback(len(chunk))
+        finally:
+            await resp.aclose()
+
+    async def _write_data(self, url, params, writer, progress_callback, chunk_size):
+        """Stream the response body to writer, which may be asynchronous."""
+        resp = await self._open_data(url, params)
+        if isinstance(resp, dict):
+            return resp
+        data_len = 0
+        async for chunk in self._iter_body(resp, progress_callback, chunk_size):
+            written = writer.write(chunk)
+            if inspect.isawaitable(written):
+                await written
+            data_len += len(chunk)
+        return {"result": 0, "data": data_len}
+
+    async def pipeline(self, commands):
+        """Send the commands concurrently and return their results in order."""
+        return await asyncio.gather(
+            *(
+                self.do_get_request(method, authenticate, json, endpoint, **params)
+                for method, authenticate, json, endpoint, params in commands
+            )
+        )
+
+    async def upload(self, method, files, **kwargs):
+        body = self._prepare_upload(files, kwargs)
+        resp = await self.session.post(
+            self.api.endpoint + method, content=body.__aiter__(), headers=body.headers
+        )
+        return resp.json()
@@ -1,7 +1,15 @@
 import io
+import mmap
+import os
 import socket
 import ssl
+import stat
+import tempfile
+import threading
 
+from contextlib import contextmanager
+from pcloud.utils import open_upload
+from pcloud.utils import stream_size
 from urllib.parse import urlparse
 
 
@@ -15,13 +23,186 @@ class PCloudBuffer(io.BufferedRWPair):
         return result
 
 
+class PCloudDataStream(io.RawIOBase):
+    """Data payload of a response, read directly from the connection.
+
+    No more than the announced number of bytes can be read. Iterating
+    yields chunks of `chunk_size` bytes. Data which hasn't been read is
+    discarded by the connection before the next command is sent.
+    """
+
+    chunk_size = 65536
+
+    def __init__(
+        self, fp, data_len, chunk_size=None, progress_callback=None, on_done=None
+    ):
+        """
+        :param on_done: called once all data has been read or discarded
+        """
+        self.fp = fp
+        self.size = data_len
+        self.remaining = data_len
+        self.chunk_size = chunk_size or self.chunk_size
+        self.progress_callback = progress_callback
+        self.on_done = on_done
+        if not data_len:
+            self._done()
+
+    def _done(self):
+        on_done, self.on_done = self.on_done, None
+        if on_done is not None:
+            on_done()
+
+    def __iter__(self):
+        return iter(lambda: self.read(self.chunk_size), b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        view = memoryview(b).cast("B")
+        to_read = min(len(view), self.remaining)
+        if not to_read:
+            return 0
+        read = self.fp.readinto(view[:to_read])
+        if not read:
+            raise IOError(f"Connection closed with {self.remaining} bytes left")
+        self.remaining -= read
+        if self.progress_callback:
+            self.progress_callback(read)
+        if not self.remaining:
+            self._done()
+        return read
+
+    def readall(self):
+        data = self.fp.read(self.remaining)
+        self.remaining = 0
+        if self.progress_callback:
+            self.progress_callback(len(data))
+        self._done()
+        return data
+
+    def drain(self):
+        """Discard the data not read yet."""
+        while self.remaining > 0:
+            to_read = min(self.chunk_size, self.remaining)
+            self.fp.read(to_read)
+            self.remaining -= to_read
+        self._done()
+
+    def close(self):
+        """Discard the data not read yet and close the stream."""
+        if not self.closed and self.on_done is not None:
+            self.drain()
+        super().close()
+
+
+class PCloudBinaryDecoder(object):
+    """Decoder for a single response frame of the binary protocol.
+
+    The whole frame is read from the socket in one go and parsed by
+    offset from a memoryview instead of issuing a read per value.
+    See https://docs.pcloud.com/protocols/binary_protocol/
+    """
+
+    def __init__(self, frame, read_data=None):
+        """:param frame: the response bytes following the length prefix
+        :param read_data: callable to fetch the data payload of a response,
+            which is sent after the frame
+        """
+        self.frame = memoryview(frame)
+        self.read_data = read_data
+        self.strings = []
+
+    def decode(self):
+        result, pos = self._read_object(0)
+        if pos != len(self.frame):
+            raise ValueError(
+                f"Trailing bytes in response: {len(self.frame) - pos} unparsed"
+            )
+        return result
+
+    def _read_dict(self, pos):
+        # hash
+        frame = self.frame
+        read_object = self._read_object
+        result = {}
+        while frame[pos] != 255:
+            key, pos = read_object(pos)
+            result[key], pos = read_object(pos)
+        pos += 1  # consume byte 255
+        data = result.get("data")
+        if data is not None and self.read_data is not None:
+            return self.read_data(data) or result, pos
+        return result, pos
+
+    def _read_list(self, pos):
+        # list
+        frame = self.frame
+        read_object = self._read_object
+        result = []
+        while frame[pos] != 255:
+            value, pos = read_object(pos)
+            result.append(value)
+        return result, pos + 1  # consume byte 255
+
+    def _read_object(self, pos):
+        frame = self.frame
+        obj_type = frame[pos]
+        pos += 1
+        if 100 <= obj_type <= 149:
+            # new string, short length
+            end = pos + obj_type - 100
+            string = str(frame[pos:end], "utf-8")
+            self.strings.append(string)
+            return string, end
+        elif 150 <= obj_type <= 199:
+            # existing string, short index
+            return self.strings[obj_type - 150], pos
+        elif 200 <= obj_type <= 219:
+            # int, inline
+            return obj_type - 200, pos
+        elif obj_type <= 3:
+            # new string, long length
+            end = pos + obj_type + 1
+            str_len = int.from_bytes(frame[pos:end], "little")
+            pos, end = end, end + str_len
+            string = str(frame[pos:end], "utf-8")
+            self.strings.append(string)
+            return string, end
+        elif 4 <= obj_type <= 7:
+            # existing string, long index
+            end = pos + obj_type - 3
+            return self.strings[int.from_bytes(frame[pos:end], "little")], end
+        elif 8 <= obj_type <= 15:
+            # int
+            end = pos + obj_type - 7
+            return int.from_bytes(frame[pos:end], "little"), end
+        elif obj_type == 16:
+            return self._read_dict(pos)
+        elif obj_type == 17:
+            return self._read_list(pos)
+        elif obj_type == 18:
+            return False, pos
+        elif obj_type == 19:
+            return True, pos
+        elif obj_type == 20:
+            # data, return data_length
+            # be sure to consume the data
+            return int.from_bytes(frame[pos : pos + 8], "little"), pos + 8
+        # nothing matched
+        raise ValueError("Unknown value returned: {0}".format(obj_type))
+
+
 class PCloudBinaryConnection(object):
     """Connection to pcloud.com based on their binary protocol.
 
     NOTE: .connect() must be called to establish network communication.
     """
 
-    allowed_endpoints = frozenset(["binapi", "bineapi"])
+    allowed_endpoints = frozenset(["binapi", "bineapi", "binnearest"])
+    # size of the slices uploaded data is sent in
+    chunk_size = 1024 * 1024
 
     def __init__(self, api, persistent_params=None):
         """Initializes the binary API.
@@ -32,11 +213,22 @@ class PCloudBinaryConnection(object):
         self.timeout = 30
         self.socket = None
         self.fp = None
+        self._data_stream = None
+        self.on_data_done = None
         if persistent_params is None:
             self.persistent_params = {}
         else:
             self.persistent_params = persistent_params
 
+    def _auth_params(self):
+        auth_token = getattr(self.api, "auth_token", "")
+        access_token = getattr(self.api, "access_token", "")
+        if auth_token:  # Password authentication
+            return {"auth": auth_token}
+        elif access_token:  # OAuth2 authentication
+            return {"access_token": access_token}
+        return {}
+
     def do_get_request(self, method, authenticate=True, json=True, endpoint=None, **kw):
         """Sends command and returns result. Blocks if result is needed.
 
@@ -45,37 +237,84 @@ class PCloudBinaryConnection(object):
         :param **params: parameters to be passed to the api, except:
             - _data is the file data
             - _data_progress_callback is the upload callback
+            - _data_chunk_size is the size of the slices data is sent
+                and received in
+            - _data_writer - write the data of the response to this file
+                like object, the progress is reported to the upload callback
+            - _stream - return data of the response as PCloudDataStream,
+                which must be consumed before the next command
             - _noresult - if no result should be returned (you must call
                 .get_result manually)
+            - _timeout - socket timeout in seconds while waiting for the
+                result of this request, i.e. of a blocking diff. After a
+                timeout the result is still pending, so `reconnect`.
         :returns dictionary returned by the api or None if _noresult is set
         """
+        if authenticate:
+            # the token is sent with every request, so a new socket (i.e.
+            # after reconnect) needs no login
+            kw.update(self._auth_params())
         data = kw.pop("_data", None)
         data_progress_callback = kw.pop("_data_progress_callback", None)
+        data_chunk_size = kw.pop("_data_chunk_size", None)
+        data_writer = kw.pop("_data_writer", None)
+        stream = kw.pop("_stream", None)
         noresult = kw.pop("_noresult", None)
+        timeout = kw.pop("_timeout", None)
         self.send_command_nb(
-            method, kw, data=data, data_progress_callback=data_progress_callback
+            method,
+            kw,
+            data=data,
+            data_progress_callback=data_progress_callback,
+            data_chunk_size=data_chunk_size,
         )
-        if not noresult:
-            return self.get_result()
+        if noresult:
+            return None
+        if data_writer is not None:
 
-    def upload(self, method, files, **kwargs):
-        if self.api.auth_token:  # Password authentication
-            kwargs["auth"] = self.api.auth_token
-        elif self.api.access_token:  # OAuth2 authentication
-            kwargs["access_token"] = self.api.access_token
+            def read_data(data_len):
+                self.write_data(
+                    data_writer, data_len, data_progress_callback, data_chunk_size
+                )
 
+        elif stream:
+
+            def read_data(data_len):
+                return self.open_data_stream(
+                    data_len, data_chunk_size, data_progress_callback
+                )
+
+        else:
+            read_data = self.read_data
+        if timeout is None:
+            return self.get_result(read_data)
+        self.socket.settimeout(timeout)
+        try:
+            return self.get_result(read_data)
+        finally:
+            self.socket.settimeout(self.timeout)
+
+    def upload(self, method, files, **kwargs):
         progress_callback = kwargs.pop("progress_callback", None)
+        chunk_size = kwargs.pop("chunk_size", None)
         for entry in files:
-            filename, fd = entry[1]
-            response = self.do_get_request(
-                method,
-                _data=fd,
-                filename=filename,
-                _data_progress_callback=progress_callback,
-                **kwargs,
-            )
+            filename, source = entry[1]
+            with open_upload(source) as fd:
+                response = self.do_get_request(
+                    method,
+                    _data=fd,
+                    filename=filename,
+                    _data_progress_callback=progress_callback,
+                    _data_chunk_size=chunk_size,
+                    **kwargs,
+                )
         return response
 
+    @contextmanager
+    def pin(self):
+        """There is only one socket, so every call uses the same anyway."""
+        yield self
+
     def connect(self):
         """Establish connection and return self."""
         if self.socket:
@@ -140,23 +379,104 @@ class PCloudBinaryConnection(object):
 
         return req
 
-    def _send_raw_data(self, data, data_len, progress_callback):
-        """Sends data at the end of send_command."""
-        if isinstance(data, io.IOBase):
-            written_bytes, to_write = 0, data_len
+    def _send_raw_data(self, data, data_len, progress_callback, chunk_size=None):
+        """Sends data at the end of send_command.
+
+        Bytes-like data and in-memory files are sent as memoryview slices,
+        regular files are memory mapped. Other streams are read into a
+        reused buffer. None of these copies the data in Python. Spooled
+        temporary files are read in chunks instead, since their fileno
+        writes them to disk.
+        """
+        chunk_size = chunk_size or self.chunk_size
+        if isinstance(data, io.BytesIO):
+            pos = data.tell()
+            with data.getbuffer() as view:
+                if len(view) - pos < data_len:
+                    raise IOError(
+                        "Mismatch between bytes written and supplied data length"
+                    )
+                self._send_view(
+                    view[pos : pos + data_len], progress_callback, chunk_size
+                )
+            data.seek(pos + data_len)
+        elif isinstance(data, tempfile.SpooledTemporaryFile):
+            self._send_chunks(data, data_len, progress_callback, chunk_size)
+        elif isinstance(data, io.IOBase):
+            mapped = self._mmap(data, data_len)
+            if mapped is None:
+                self._send_stream(data, data_len, progress_callback, chunk_size)
+            else:
+                pos = data.tell()
+                try:
+                    with memoryview(mapped) as view:
+                        self._send_view(
+                            view[pos : pos + data_len], progress_callback, chunk_size
+                        )
+                finally:
+                    mapped.close()
+                data.seek(pos + data_len)
+        else:
+            with memoryview(data) as view:
+                if view.nbytes != data_len:
+                    raise IOError(
+                        "Mismatch between bytes written and supplied data length"
+                    )
+                self._send_view(view.cast("B"), progress_callback, chunk_size)
+
+    def _mmap(self, data, data_len):
+        """Memory map a regular file or return None if this isn't possible."""
+        if data_len == 0:
+            return None
+        try:
+            fileno = data.fileno()
+            file_stat = os.fstat(fileno)
+            if not stat.S_ISREG(file_stat.st_mode):
+                return None
+            if data.tell() + data_len > file_stat.st_size:
+                return None
+            if data.writable():
+                data.flush()
+            return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # i.e. io.UnsupportedOperation for objects without a file descriptor
+            return None
+
+    def _send_view(self, view, progress_callback, chunk_size):
+        for offset in range(0, len(view), chunk_size):
+            chunk = view[offset : offset + chunk_size]
+            if len(chunk) != self.fp.write(chunk):
+                raise IOError("Mismatch between bytes written and supplied data length")
+            if progress_callback:
+                progress_callback(len(chunk))
+            chunk.release()
+
+    def _send_stream(self, data, data_len, progress_callback, chunk_size):
+        buf = bytearray(min(chunk_size, data_len))
+        with memoryview(buf) as view:
             while data_len > 0:
-                to_write = min(data_len, 8192)
-                if to_write != self.fp.write(data.read(to_write)):
+                to_write = min(data_len, len(buf))
+                read = data.readinto(view[:to_write])
+                if not read:
+                    raise IOError(
+                        "Mismatch between bytes written and supplied data length"
+                    )
+                if read != self.fp.write(view[:read]):
                     raise IOError(
                         "Mismatch between bytes written and supplied data length"
                     )
-                data_len -= to_write
+                data_len -= read
                 if progress_callback:
-                    progress_callback(to_write)
-        else:
-            written_bytes = self.fp.write(data)
-            if written_bytes != data_len:
+                    progress_callback(read)
+
+    def _send_chunks(self, data, data_len, progress_callback, chunk_size):
+        while data_len > 0:
+            chunk = data.read(min(data_len, chunk_size))
+            if not chunk or len(chunk) != self.fp.write(chunk):
                 raise IOError("Mismatch between bytes written and supplied data length")
+            data_len -= len(chunk)
+            if progress_callback:
+                progress_callback(len(chunk))
 
     def _determine_data_len(self, data, data_len=None):
         if data is None:
@@ -164,97 +484,101 @@ class PCloudBinaryConnection(object):
         elif data_len is None:  # and data is not None
             data_len = getattr(data, "__len__", lambda: None)()
             if data_len is None:
-                if isinstance(data, io.IOBase) and data.seekable():
-                    pos = data.tell()
-                    data_len = data.seek(0, io.SEEK_END) - pos
-                    data.seek(pos, io.SEEK_SET)
+                data_len = stream_size(data)
             if data_len is None:
                 raise ValueError("Unable to determine data length")
         return data_len
 
     def send_command_nb(
-        self, method, params, data=None, data_len=None, data_progress_callback=None
+        self,
+        method,
+        params,
+        data=None,
+        data_len=None,
+        data_progress_callback=None,
+        flush=True,
+        data_chunk_size=None,
     ):
         """Send command without blocking.
 
         NOTE: params is updated with self.persistent_params
 
         :param data_len: if not None should be consistent with data.
-        :param data_progress_callback: called only for data which is io.IOBase
+        :param data_progress_callback: called with the size of every chunk sent
+        :param flush: if False the request may stay in the write buffer
+        :param data_chunk_size: size of the slices data is sent in
         """
         data_len = self._determine_data_len(data, data_len)
+        self._drain_data_stream()
 
-        params.update(self.persistent_params)
-        req = self._prepare_send_request(method, params, data_len)
-        assert len(req) < 65536, "Request too long {0}".format(len(req))
-        self.fp.write(len(req).to_bytes(2, "little"))
-        self.fp.write(req)
+        self.fp.write(self._encode_command(method, params, data_len))
 
         if data is not None:
-            self._send_raw_data(data, data_len, data_progress_callback)
+            self._send_raw_data(data, data_len, data_progress_callback, data_chunk_size)
 
-        self.fp.flush()
+        if flush:
+            self.fp.flush()
 
-    def get_result(self):
-        """Return the result from a call to the pcloud API."""
-        self.fp.read(4)
-        return self._read_object(strings=dict())
+    def _encode_command(self, method, params, data_len=None):
+        """Return the request with its length prefix
 
-    def _read_dict(self, strings):
-        # hash
-        result = {}
-        while self.fp.peek(1)[0] != 255:
-            key = self._read_object(strings)
-            result[key] = self._read_object(strings)
-        self.fp.read(1)  # consume byte 255
-        data = result.get("data")
-        return data is not None and self.read_data(data) or result
+        NOTE: params is updated with self.persistent_params
+        """
+        params.update(self.persistent_params)
+        req = self._prepare_send_request(method, params, data_len)
+        assert len(req) < 65536, "Request too long {0}".format(len(req))
+        return len(req).to_bytes(2, "little") + req
 
-    def _read_list(self, strings):
-        # list
-        result = []
-        while self.fp.peek(1)[0] != 255:
-            result.append(self._read_object(strings))
-        self.fp.read(1)  # consume byte 255
-        return result
+    def pipeline(self, commands, window=512):
+        """Send commands back to back and return their results in order.
 
-    def _read_object(self, strings):
-        obj_type = self.fp.read(1)[0]
-        if (obj_type <= 3) or (100 <= obj_type <= 149):
-            # new string
-            if 100 <= obj_type:
-                str_len = obj_type - 100
-            else:
-                str_len = int.from_bytes(self.fp.read(obj_type + 1), "little")
-            string = self.fp.read(str_len).decode("utf-8")
-            strings[len(strings)] = string
-            return string
-        elif 4 <= obj_type <= 7:
-            # existing string, long index
-            return strings[int.from_bytes(self.fp.read(obj_type - 3), "little")]
-        elif 8 <= obj_type <= 15:
-            # int
-            return int.from_bytes(self.fp.read(obj_type - 7), "little")
-        elif obj_type == 16:
-            return self._read_dict(strings)
-        elif obj_type == 17:
-            return self._read_list(strings)
-        elif obj_type == 18:
-            return False
-        elif obj_type == 19:
-            return True
-        elif obj_type == 20:
-            # data, return data_length
-            # be sure to consume the data
-            return int.from_bytes(self.fp.read(8), "little")
-        elif 150 <= obj_type <= 199:
-            # existing string, short index
-            return strings[obj_type - 150]
-        elif 200 <= obj_type <= 219:
-            # int, inline
-            return obj_type - 200
-        # nothing matched
-        raise ValueError("Unknown value returned: {0}".format(obj_type))
+        All requests are encoded before the first one is written. If
+        sending or reading fails, the connection is replaced, since
+        requests or results might be left in the buffers.
+
+        :param commands: list of (method, authenticate, json, endpoint, params)
+        :param window: maximum number of requests awaiting their result.
+            Results are read before sending more, so neither side blocks
+            on a full socket buffer.
+        """
+        auth_params = self._auth_params()
+        requests = []
+        for method, authenticate, json, endpoint, params in commands:
+            if authenticate:
+                params.update(auth_params)
+            requests.append(self._encode_command(method, params))
+        self._drain_data_stream()
+        results = []
+        pending = 0
+        try:
+            for req in requests:
+                if pending >= window:
+                    self.fp.flush()
+                    results.append(self.get_result())
+                    pending -= 1
+                self.fp.write(req)
+                pending += 1
+            self.fp.flush()
+            for _ in range(pending):
+                results.append(self.get_result())
+        except BaseException:
+            self.reconnect()
+            raise
+        return results
+
+    def get_result(self, read_data=None):
+        """Return the result from a call to the pcloud API.
+
+        :param read_data: called with the length of the data payload,
+            if the response has one. Its return value replaces the result.
+            Per default the data is returned as bytes.
+        """
+        self._drain_data_stream()
+        frame_len = int.from_bytes(self.fp.read(4), "little")
+        decoder = PCloudBinaryDecoder(
+            self.fp.read(frame_len), read_data or self.read_data
+        )
+        return decoder.decode()
 
     def read_data(self, data_len):
         return self.fp.read(data_len)
@@ -267,17 +591,189 @@ class PCloudBinaryConnection(object):
         """
         return self.fp
 
-    def write_data(self, writer, data_len, progress_callback=None):
+    def open_data_stream(self, data_len, chunk_size=None, progress_callback=None):
+        """Returns the data of the response as bounded stream.
+
+        Data not read from the stream is discarded before the next command.
+        `on_data_done` is called once the stream has been read.
+        """
+        on_done, self.on_data_done = self.on_data_done, None
+        self._data_stream = PCloudDataStream(
+            self.fp, data_len, chunk_size, progress_callback, on_done
+        )
+        return self._data_stream
+
+    def _drain_data_stream(self):
+        if self._data_stream is not None:
+            self._data_stream.drain()
+            self._data_stream = None
+
+    def write_data(self, writer, data_len, progress_callback=None, chunk_size=None):
         """Write data from response.
 
-        NOTE: Be sure to consume all of it.
+        NOTE: The writer must not keep a reference to the written buffer.
         """
-        while data_len > 0:
-            to_write = min(8192, data_len)
-            assert to_write == writer.write(self.fp.read(to_write))
-            data_len -= to_write
-            if progress_callback:
-                progress_callback(to_write)
+        stream = PCloudDataStream(self.fp, data_len, chunk_size)
+        buf = bytearray(min(stream.chunk_size, data_len))
+        with memoryview(buf) as view:
+            while stream.remaining > 0:
+                read = stream.readinto(view)
+                written = writer.write(view[:read])
+                if written is not None and written != read:
+                    raise IOError(f"Wrote {written} of {read} bytes")
+                if progress_callback:
+                    progress_callback(read)
 
     def close(self):
         self.socket.close()
+
+    def reconnect(self):
+        """Replace the socket with a new connection and return self.
+
+        Needed when a response is left unread, i.e. after a timeout, as it
+        would be taken for the result of the next request.
+        """
+        self.close()
+        self.socket = self.fp = None
+        self._data_stream = None
+        self.on_data_done = None
+        return self.connect()
+
+
+class PCloudBinaryConnectionPool(object):
+    """Thread-safe pool of connections based on the binary protocol.
+
+    Every call checks out its own connection, so threads don't share a
+    socket. Connections are opened on demand up to `size`, returned to the
+    pool after use and dropped if a call fails on them.
+    """
+
+    allowed_endpoints = frozenset(["binapi", "bineapi", "binnearest"])
+    connection_class = PCloudBinaryConnection
+
+    def __init__(self, api, size=4):
+        self.api = api
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._local = threading.local()
+
+    def connect(self):
+        """Connections are established lazily, so just return self."""
+        return self
+
+    _auth_params = PCloudBinaryConnection._auth_params
+
+    def _new_connection(self):
+        return self.connection_class(self.api).connect()
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            return conn or self._new_connection()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, conn, reuse=True):
+        if reuse:
+            with self._lock:
+                self._idle.append(conn)
+        else:
+            # the state of the socket is unknown
+            conn.close()
+        self._slots.release()
+
+    @contextmanager
+    def checkout(self):
+        """Borrow a connection from the pool for the duration of the block."""
+        conn = getattr(self._local, "connection", None)
+        if conn is not None:
+            # the thread has pinned a connection
+            yield conn
+            return
+        conn = self._acquire()
+        try:
+            yield conn
+        except BaseException:
+            self._release(conn, reuse=False)
+            raise
+        self._release(conn)
+
+    @contextmanager
+    def pin(self):
+        """Use the same connection for all calls of the current thread.
+
+        Needed for file descriptor based methods (file_open, file_read, ...)
+        as file descriptors are only valid on the connection they were
+        opened on.
+        """
+        if getattr(self._local, "connection", None) is not None:
+            yield self._local.connection
+            return
+        with self.checkout() as conn:
+            self._local.connection = conn
+            try:
+                yield conn
+            finally:
+                self._local.connection = None
+
+    def do_get_request(self, method, authenticate=True, json=True, endpoint=None, **kw):
+        """Send the request over a connection of the pool.
+
+        _noresult is only supported on a pinned connection, as the result
+        would be read by the next borrower otherwise.
+        """
+        pinned = getattr(self._local, "connection", None) is not None
+        if kw.get("_noresult") and not pinned:
+            raise ValueError("_noresult requires a pinned connection")
+        if authenticate:
+            kw.update(self._auth_params())
+        if kw.get("_stream") and not pinned:
+            return self._stream_request(method, authenticate, json, endpoint, kw)
+        with self.checkout() as conn:
+            return conn.do_get_request(method, authenticate, json, endpoint, **kw)
+
+    def _stream_request(self, method, authenticate, json, endpoint, kw):
+        """Send a request, whose data is returned as stream. The connection
+        stays checked out until the stream has been read or closed.
+        """
+        conn = self._acquire()
+        released = []
+
+        def release():
+            if not released:
+                released.append(conn)
+                self._release(conn)
+
+        conn.on_data_done = release
+        try:
+            resp = conn.do_get_request(method, authenticate, json, endpoint, **kw)
+        except BaseException:
+            conn.on_data_done = None
+            released.append(conn)
+            self._release(conn, reuse=False)
+            raise
+        if conn.on_data_done is not None:
+            # the response has no data
+            conn.on_data_done = None
+            release()
+        return resp
+
+    def pipeline(self, commands, window=512):
+        with self.checkout() as conn:
+            return conn.pipeline(commands, window=window)
+
+    def upload(self, method, files, **kwargs):
+        with self.checkout() as conn:
+            return conn.upload(method, files, **kwargs)
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
@@ -0,0 +1,174 @@
+import copy
+import posixpath
+import threading
+import time
+
+from collections import OrderedDict
+from pcloud.api import O_APPEND
+from pcloud.api import O_CREAT
+from pcloud.api import O_TRUNC
+from pcloud.api import O_WRITE
+
+
+class MetadataCache(object):
+    """LRU cache with expiry for the responses of metadata requests.
+
+    Responses of `cached_methods` are stored per method and parameters.
+    Every entry remembers the paths and file/folder ids it describes, so
+    calls of `invalidating_methods` drop the entries of the paths and ids
+    they change. Calls of `clearing_methods` can affect whole subtrees,
+    which can't be resolved from their parameters, so they drop all entries.
+    Changes made by other clients are only seen once entries expire.
+    """
+
+    cached_methods = frozenset(["stat", "listfolder", "checksumfile", "currentserver"])
+    invalidating_methods = frozenset(
+        [
+            "createfolder",
+            "createfolderifnotexists",
+            "uploadfile",
+            "upload_save",
+            "copyfile",
+            "copypubfile",
+            "deletefile",
+            "renamefile",
+            "file_open",
+            "downloadfile",
+            "downloadfileasync",
+            "savezip",
+            "trash_clear",
+        ]
+    )
+    clearing_methods = frozenset(
+        [
+            "renamefolder",
+            "deletefolder",
+            "deletefolderrecursive",
+            "copyfolder",
+            "extractarchive",
+            "trash_restore",
+            "trash_restorepath",
+            # writes by file descriptor don't tell which file changed
+            "file_write",
+            "file_pwrite",
+            "file_truncate",
+        ]
+    )
+
+    # flags of file_open, which may create or change the file
+    writing_flags = O_WRITE | O_CREAT | O_TRUNC | O_APPEND
+
+    def __init__(self, maxsize=1024, ttl=60):
+        """
+        :param maxsize: maximum number of responses kept
+        :param ttl: seconds after which a response expires
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(method, params):
+        """Return the cache key of a request or None if it isn't cacheable"""
+        key = (method, frozenset(params.items()))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key):
+        """Return a copy of the cached response or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            response = entry[1]
+        # callers may modify the response
+        return copy.deepcopy(response)
+
+    def put(self, key, params, response):
+        """Store a successful response."""
+        if not isinstance(response, dict) or response.get("result") != 0:
+            return
+        paths, ids = self._affected(params, response, recursive=True)
+        entry = (time.monotonic() + self.ttl, copy.deepcopy(response), paths, ids)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, method, params, response=None):
+        """Drop the entries affected by a call of `method`."""
+        if method in self.clearing_methods:
+            self.clear()
+            return
+        if method not in self.invalidating_methods:
+            return
+        if method == "file_open" and not self.writing_flags & int(
+            params.get("flags", 0)
+        ):
+            # reading leaves the file as it is
+            return
+        paths, ids = self._affected(params, response)
+        parents = {posixpath.dirname(path) for path in paths}
+        with self._lock:
+            for key, (_, _, entry_paths, entry_ids) in list(self._entries.items()):
+                if ids & entry_ids or any(
+                    path in parents or self._is_below(path, paths)
+                    for path in entry_paths
+                ):
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _is_below(path, paths):
+        return any(path == p or path.startswith(p.rstrip("/") + "/") for p in paths)
+
+    @staticmethod
+    def _affected(params, response, recursive=False):
+        """Return the paths and ids a request and its response refer to"""
+        paths = set()
+        ids = set()
+        for name in ("path", "topath"):
+            if params.get(name):
+                paths.add(posixpath.normpath(params[name]))
+        for name in ("fileid", "folderid", "tofolderid"):
+            if params.get(name) is not None:
+                ids.add((name.replace("to", ""), int(params[name])))
+        metadata = response.get("metadata") if isinstance(response, dict) else None
+        pending = list(metadata) if isinstance(metadata, list) else [metadata]
+        while pending:
+            meta = pending.pop()
+            if not isinstance(meta, dict):
+                continue
+            if meta.get("path"):
+                paths.add(meta["path"])
+            if "folderid" in meta:
+                ids.add(("folderid", meta["folderid"]))
+            if "fileid" in meta:
+                ids.add(("fileid", meta["fileid"]))
+            if "parentfolderid" in meta:
+                ids.add(("folderid", meta["parentfolderid"]))
+            if recursive:
+                # folders of a recursive listing include their contents
+                pending.extend(
+                    child for child in meta.get("contents", []) if "contents" in child
+                )
+        return paths, ids
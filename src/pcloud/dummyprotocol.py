@@ -1,27 +1,14 @@
 from pcloud.jsonprotocol import PCloudJSONConnection
 
 
-class NoOpSession(object):
-    kwargs = {}
-
-    def get(self, url, **kwargs):
-        self.kwargs = kwargs
-        self.kwargs["url"] = url
-        return self
-
-    def json(self):
-        return self.kwargs
-
-
 class PCloudDummyConnection(PCloudJSONConnection):
     """Connection to pcloud.com based on their JSON protocol."""
 
     allowed_endpoints = frozenset(["test"])
 
-    def __init__(self, api):
+    def __init__(self, api, **kwargs):
         """Connect to pcloud API based on their JSON protocol."""
-        self.session = NoOpSession()
-        self.api = api
+        super().__init__(api, **kwargs)
 
     def do_get_request(self, method, authenticate=True, json=True, endpoint=None, **kw):
         if "noop" in kw:
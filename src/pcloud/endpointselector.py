@@ -0,0 +1,117 @@
+import httpx
+import json
+import os
+import socket
+import ssl
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from pcloud.utils import log
+from urllib.parse import urlparse
+
+
+class EndpointSelector(object):
+    """Chooses the API server with the lowest latency.
+
+    The candidates are the servers `getapiserver` of the default endpoint
+    returns for the JSON or binary protocol and the default server itself.
+    Each one is probed by opening a TLS connection, which takes the round
+    trip of the TCP connect and the TLS handshake. The fastest server is
+    remembered for `ttl` seconds, in `cache_file` if given, so other
+    processes don't have to probe again.
+    """
+
+    ttl = 24 * 60 * 60
+    # seconds to wait for getapiserver and each probe
+    timeout = 3
+    # number of connections per server, the fastest one counts
+    rounds = 2
+
+    def __init__(self, endpoint="https://api.pcloud.com/", cache_file=None, ttl=None):
+        """
+        :param endpoint: default endpoint of the region of the account
+        :param cache_file: JSON file to store the choice in
+        :param ttl: seconds the choice is valid
+        """
+        self.endpoint = endpoint
+        self.cache_file = os.fspath(cache_file) if cache_file is not None else None
+        self.ttl = ttl or self.ttl
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _default_host(self, binary):
+        host = urlparse(self.endpoint).netloc
+        return "bin" + host if binary else host
+
+    def candidates(self, binary=False):
+        """Return the hosts to choose from"""
+        default = self._default_host(binary)
+        try:
+            resp = httpx.get(self.endpoint + "getapiserver", timeout=self.timeout)
+            hosts = resp.json().get("binapi" if binary else "api") or []
+        except (httpx.HTTPError, ValueError) as e:
+            log.warning("Getting the API servers failed: %s", e)
+            hosts = []
+        return list(dict.fromkeys(hosts + [default]))
+
+    def probe(self, host, port=443):
+        """Return the seconds a TLS connection to host takes or None"""
+        context = ssl.create_default_context()
+        latency = None
+        for i in range(self.rounds):
+            start = time.perf_counter()
+            try:
+                with socket.create_connection((host, port), self.timeout) as sock:
+                    with context.wrap_socket(sock, server_hostname=host):
+                        elapsed = time.perf_counter() - start
+            except OSError as e:
+                log.debug("Probing %s failed: %s", host, e)
+                return None
+            latency = elapsed if latency is None else min(latency, elapsed)
+        return latency
+
+    def _read_cache(self):
+        if self.cache_file is None:
+            return self._cache
+        try:
+            with open(self.cache_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_cache(self, cache):
+        if self.cache_file is None:
+            self._cache = cache
+            return
+        directory = os.path.dirname(self.cache_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # replace the file at once, so readers never see parts of it
+        tmp = f"{self.cache_file}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp, self.cache_file)
+
+    def select(self, binary=False):
+        """Return the endpoint URL with the lowest latency"""
+        key = f"{self.endpoint} {'binapi' if binary else 'api'}"
+        with self._lock:
+            endpoint, expires = self._read_cache().get(key, (None, 0))
+            if endpoint and expires > time.time():
+                return endpoint
+            hosts = self.candidates(binary)
+            with ThreadPoolExecutor(max_workers=len(hosts)) as executor:
+                latencies = dict(zip(hosts, executor.map(self.probe, hosts)))
+            log.debug("Latencies of the API servers: %s", latencies)
+            reachable = [host for host in hosts if latencies[host] is not None]
+            if not reachable:
+                # don't remember, the network might be down
+                return f"https://{self._default_host(binary)}/"
+            host = min(reachable, key=latencies.get)
+            endpoint = f"https://{host}/"
+            now = time.time()
+            cache = {k: v for k, v in self._read_cache().items() if v[1] > now}
+            cache[key] = (endpoint, now + self.ttl)
+            self._write_cache(cache)
+        return endpoint
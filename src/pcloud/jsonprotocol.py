@@ -1,38 +1,227 @@
 import httpx
+import os
+import threading
+import uuid
 
+from contextlib import contextmanager
 from pcloud.utils import log
+from pcloud.utils import open_upload
+from pcloud.utils import stream_size
+
+
+def _quote(value):
+    """Escape a value for use in a quoted header parameter"""
+    return value.replace("\\", "\\\\").replace('"', "%22").replace("\r\n", " ")
+
+
+class PCloudMultipartStream(object):
+    """multipart/form-data body, which is generated while it is sent.
+
+    Files are given as path or file like object and read in chunks of
+    `chunk_size` bytes. Paths are opened right before and closed right
+    after their content is sent.
+    """
+
+    chunk_size = 1024 * 1024
+
+    def __init__(self, fields, files, chunk_size=None, progress_callback=None):
+        self.boundary = uuid.uuid4().hex
+        self.fields = fields
+        self.files = files
+        self.chunk_size = chunk_size or self.chunk_size
+        self.progress_callback = progress_callback
+
+    @property
+    def headers(self):
+        headers = {"Content-Type": f"multipart/form-data; boundary={self.boundary}"}
+        content_length = self.content_length
+        if content_length is not None:
+            headers["Content-Length"] = str(content_length)
+        return headers
+
+    @property
+    def content_length(self):
+        """Size of the body or None if a file has an unknown size"""
+        size = sum(len(part) for part in self._field_parts())
+        for name, (filename, source) in self.files:
+            file_size = self._file_size(source)
+            if file_size is None:
+                return None
+            size += len(self._file_header(name, filename)) + file_size + 2
+        return size + len(self._trailer())
+
+    @staticmethod
+    def _file_size(source):
+        if isinstance(source, (str, os.PathLike)):
+            return os.path.getsize(source)
+        return stream_size(source)
+
+    def _field_parts(self):
+        for name, value in self.fields.items():
+            if not isinstance(value, bytes):
+                value = str(value).encode("utf-8")
+            header = (
+                f"--{self.boundary}\r\n"
+                f'Content-Disposition: form-data; name="{_quote(name)}"\r\n\r\n'
+            )
+            yield header.encode("utf-8") + value + b"\r\n"
+
+    def _file_header(self, name, filename):
+        header = (
+            f"--{self.boundary}\r\n"
+            f"Content-Disposition: form-data; "
+            f'name="{_quote(name)}"; filename="{_quote(filename)}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n"
+        )
+        return header.encode("utf-8")
+
+    def _trailer(self):
+        return f"--{self.boundary}--\r\n".encode("utf-8")
+
+    def __iter__(self):
+        yield from self._field_parts()
+        for name, (filename, source) in self.files:
+            yield self._file_header(name, filename)
+            with open_upload(source) as fd:
+                while True:
+                    chunk = fd.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+                    if self.progress_callback:
+                        self.progress_callback(len(chunk))
+            yield b"\r\n"
+        yield self._trailer()
+
+    async def __aiter__(self):
+        for chunk in self:
+            yield chunk
 
 
 class PCloudJSONConnection(object):
-    """Connection to pcloud.com based on their JSON protocol."""
+    """Connection to pcloud.com based on their JSON protocol.
+
+    All requests go through one httpx.Client, which keeps connections alive
+    and is safe to share between threads.
+    """
 
     allowed_endpoints = frozenset(["api", "eapi", "nearest"])
+    # size of the chunks downloaded data is read in
+    chunk_size = 1024 * 1024
+
+    def __init__(self, api, timeout=None, limits=None, http2=False):
+        """Connect to pcloud API based on their JSON protocol.
 
-    def __init__(self, api):
-        """Connect to pcloud API based on their JSON protocol."""
-        self.session = httpx.Client()
+        :param timeout: timeout in seconds or a httpx.Timeout
+        :param limits: httpx.Limits of the connection pool,
+            i.e. max_connections and keepalive_expiry
+        :param http2: use HTTP/2, needs the `http2` extra of httpx
+        """
+        self.client_options = {"http2": http2}
+        if timeout is not None:
+            self.client_options["timeout"] = timeout
+        if limits is not None:
+            self.client_options["limits"] = limits
+        self._session = httpx.Client(**self.client_options)
+        self._local = threading.local()
+        # clients with a single connection, which are kept open for pinning
+        self._pinned = []
+        self._pinned_lock = threading.Lock()
         self.api = api
 
+    @property
+    def session(self):
+        """The httpx.Client pinned to the current thread or the shared one"""
+        return getattr(self._local, "session", None) or self._session
+
+    @session.setter
+    def session(self, session):
+        self._session = session
+
     def connect(self):
         return self
 
-    def do_get_request(self, method, authenticate=True, json=True, endpoint=None, **kw):
-        if authenticate and self.api.auth_token:  # Password authentication
-            params = {"auth": self.api.auth_token}
-        elif authenticate and self.api.access_token:  # OAuth2 authentication
-            params = {"access_token": self.api.access_token}
-        else:
-            params = {}
+    @contextmanager
+    def pin(self):
+        """Send all requests of the current thread over the same HTTP
+        connection. File descriptors are only valid on the connection they
+        were opened on.
+        """
+        if getattr(self._local, "session", None) is not None:
+            yield self
+            return
+        with self._pinned_lock:
+            session = self._pinned.pop() if self._pinned else None
+        if session is None:
+            options = dict(
+                self.client_options, limits=httpx.Limits(max_connections=1)
+            )
+            session = httpx.Client(**options)
+        self._local.session = session
+        try:
+            yield self
+        except BaseException:
+            # the state of the connection is unknown, don't reuse it
+            session.close()
+            raise
+        finally:
+            self._local.session = None
+        with self._pinned_lock:
+            self._pinned.append(session)
+
+    def close(self):
+        with self._pinned_lock:
+            pinned, self._pinned = self._pinned, []
+        for session in pinned:
+            session.close()
+        self._session.close()
+
+    def _auth_params(self):
+        if self.api.auth_token:  # Password authentication
+            return {"auth": self.api.auth_token}
+        elif self.api.access_token:  # OAuth2 authentication
+            return {"access_token": self.api.access_token}
+        return {}
+
+    def _prepare_request(self, method, authenticate, endpoint, kw):
+        """Return URL and query parameters of a request"""
+        params = self._auth_params() if authenticate else {}
         if endpoint is None:
             endpoint = self.api.endpoint
+        kw.pop("use_session", None)
         params.update(kw)
         log.debug("Doing request to %s%s", endpoint, method)
         log.debug("Params: %s", params)
-        if "use_session" in kw:
-            get_method = self.session.get
+        return endpoint + method, params
+
+    def do_get_request(self, method, authenticate=True, json=True, endpoint=None, **kw):
+        """Send request and return the result.
+
+        Responses with json=False can be downloaded in chunks instead of
+        being returned as bytes:
+            - _data_writer - write the response body to this file like object
+            - _stream - return an iterator over the chunks of the body
+            - _data_chunk_size - the size of the chunks
+            - _data_progress_callback - called with the size of every chunk
+
+        _timeout overrides the timeout of the client for this request.
+        """
+        data_writer = kw.pop("_data_writer", None)
+        data_progress_callback = kw.pop("_data_progress_callback", None)
+        data_chunk_size = kw.pop("_data_chunk_size", None) or self.chunk_size
+        stream = kw.pop("_stream", None)
+        timeout = kw.pop("_timeout", None)
+        url, params = self._prepare_request(method, authenticate, endpoint, kw)
+        if not json and data_writer is not None:
+            return self._write_data(
+                url, params, data_writer, data_progress_callback, data_chunk_size
+            )
+        if not json and stream:
+            return self._iter_data(url, params, data_progress_callback, data_chunk_size)
+        if timeout is not None:
+            resp = self.session.get(url, params=params, timeout=timeout)
         else:
-            get_method = httpx.get
-        resp = get_method(endpoint + method, params=params)
+            resp = self.session.get(url, params=params)
         resp.raise_for_status()
         if json:
             result = resp.json()
@@ -41,12 +230,98 @@ class PCloudJSONConnection(object):
         log.debug("Response: %s", result)
         return result
 
-    def upload(self, method, files, **kwargs):
-        if self.api.auth_token:  # Password authentication
-            kwargs["auth"] = self.api.auth_token
-        elif self.api.access_token:  # OAuth2 authentication
-            kwargs["access_token"] = self.api.access_token
+    @staticmethod
+    def _is_json(resp):
+        """Whether the response is JSON, which data never is"""
+        return resp.headers.get("content-type", "").startswith("application/json")
+
+    @staticmethod
+    def _api_error(resp):
+        """Return the error in the read JSON body of resp or None.
+
+        The API reports errors of data requests with status 200 and a JSON
+        body instead of the data.
+        """
+        try:
+            result = resp.json()
+        except ValueError:
+            return None
+        if isinstance(result, dict) and result.get("result"):
+            return result
+        return None
+
+    def _open_data(self, url, params):
+        """Send the request and return the response with the body unread or
+        the error the API returned instead of the data.
+        """
+        session = self.session
+        request = session.build_request("GET", url, params=params)
+        resp = session.send(request, stream=True)
+        try:
+            resp.raise_for_status()
+            if self._is_json(resp):
+                resp.read()
+                error = self._api_error(resp)
+                if error is not None:
+                    resp.close()
+                    return error
+        except BaseException:
+            resp.close()
+            raise
+        return resp
+
+    def _iter_data(self, url, params, progress_callback, chunk_size):
+        """Return an iterator over the chunks of the response body or the
+        error returned instead. The request is sent right away, on the
+        session of the caller.
+        """
+        resp = self._open_data(url, params)
+        if isinstance(resp, dict):
+            return resp
+        return self._iter_body(resp, progress_callback, chunk_size)
+
+    def _iter_body(self, resp, progress_callback, chunk_size):
+        try:
+            for chunk in resp.iter_bytes(chunk_size):
+                yield chunk
+                if progress_callback:
+                    progress_callback(len(chunk))
+        finally:
+            resp.close()
+
+    def _write_data(self, url, params, writer, progress_callback, chunk_size):
+        """Write the response body to writer in chunks."""
+        resp = self._open_data(url, params)
+        if isinstance(resp, dict):
+            return resp
+        data_len = 0
+        for chunk in self._iter_body(resp, progress_callback, chunk_size):
+            writer.write(chunk)
+            data_len += len(chunk)
+        return {"result": 0, "data": data_len}
+
+    def pipeline(self, commands):
+        """Execute commands one after another and return their results.
+
+        HTTP has no pipelining, so every command is a separate request.
+        """
+        return [
+            self.do_get_request(method, authenticate, json, endpoint, **params)
+            for method, authenticate, json, endpoint, params in commands
+        ]
+
+    def _prepare_upload(self, files, kwargs):
+        """Return the streaming multipart body of an upload"""
+        progress_callback = kwargs.pop("progress_callback", None)
+        chunk_size = kwargs.pop("chunk_size", None)
+        kwargs.update(self._auth_params())
         log.debug(f"Upload files: {files}")
         log.debug(f"Upload fields: {kwargs}")
-        resp = httpx.post(self.api.endpoint + method, data=kwargs, files=files)
+        return PCloudMultipartStream(kwargs, files, chunk_size, progress_callback)
+
+    def upload(self, method, files, **kwargs):
+        body = self._prepare_upload(files, kwargs)
+        resp = self.session.post(
+            self.api.endpoint + method, content=body, headers=body.headers
+        )
         return resp.json()
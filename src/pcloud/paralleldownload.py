@@ -0,0 +1,219 @@
+import asyncio
+import copy
+import mmap
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from pcloud.binaryprotocol import PCloudBinaryConnection
+from pcloud.binaryprotocol import PCloudBinaryConnectionPool
+from pcloud.utils import ViewWriter
+from pcloud.utils import log
+
+
+class ParallelDownloadError(Exception):
+    """pCloud rejected a request of the download"""
+
+
+class ParallelDownload(object):
+    """Download of a file in ranges, which are fetched in parallel.
+
+    Every worker opens the file on its own connection, since file
+    descriptors are bound to the connection they were opened on, and reads
+    ranges of `chunk_size` bytes with `file_pread`. The ranges are written
+    directly into the memory mapped destination file, which is allocated
+    with the final size up front.
+    """
+
+    chunk_size = 8 * 1024 * 1024
+    workers = 4
+
+    def __init__(
+        self, api, destination, chunk_size=None, workers=None, progress_callback=None
+    ):
+        """
+        :param api: PyCloud instance
+        :param destination: local path the file is written to
+        :param chunk_size: size of the ranges read with one request
+        :param workers: number of connections used at once
+        :param progress_callback: called with the number of bytes received,
+            from all workers
+        """
+        self.api = api
+        self.destination = os.fspath(destination)
+        self.chunk_size = chunk_size or self.chunk_size
+        self.workers = workers or self.workers
+        self.progress_callback = progress_callback
+        self._lock = threading.Lock()
+        self._ranges = None
+        self._failed = threading.Event()
+
+    def _check(self, resp, method):
+        if not isinstance(resp, dict) or resp.get("result") != 0:
+            raise ParallelDownloadError(
+                f"pCloud error occured in {method}: {resp} - {self.destination}"
+            )
+        return resp
+
+    def _client(self):
+        """Return an api, whose connection can be used by several threads."""
+        if not isinstance(self.api.connection, PCloudBinaryConnection):
+            return self.api
+        # a single socket can't be shared between threads
+        api = copy.copy(self.api)
+        api.connection = PCloudBinaryConnectionPool(api, size=self.workers)
+        return api
+
+    def _next_range(self):
+        with self._lock:
+            return next(self._ranges, None)
+
+    def _read_range(self, api, fd, view, offset, count):
+        with view[offset : offset + count] as target:
+            writer = ViewWriter(target)
+            resp = api.file_pread(
+                fd=fd,
+                offset=offset,
+                count=count,
+                writer=writer,
+                progress_callback=self.progress_callback,
+            )
+        self._check(resp, "file_pread")
+        if writer.pos != count:
+            raise ParallelDownloadError(
+                f"Got {writer.pos} of {count} bytes at {offset}: {self.destination}"
+            )
+
+    def _worker(self, api, view, params):
+        with api.pin():
+            fd = None
+            try:
+                resp = self._check(api.file_open(flags=0, **params), "file_open")
+                fd = resp["fd"]
+                while not self._failed.is_set():
+                    byte_range = self._next_range()
+                    if byte_range is None:
+                        break
+                    self._read_range(api, fd, view, *byte_range)
+            except BaseException:
+                self._failed.set()
+                raise
+            finally:
+                if fd is not None:
+                    api.file_close(fd=fd)
+
+    def _plan(self, metadata, kwargs):
+        """Prepare the ranges and return the parameters to open the file
+        with and the number of workers.
+        """
+        size = metadata["size"]
+        params = (
+            {"fileid": metadata["fileid"]} if "fileid" in metadata else dict(kwargs)
+        )
+        self._ranges = (
+            (offset, min(self.chunk_size, size - offset))
+            for offset in range(0, size, self.chunk_size)
+        )
+        workers = min(self.workers, (size + self.chunk_size - 1) // self.chunk_size)
+        log.info("Downloading %s bytes with %s workers", size, workers)
+        return params, workers
+
+    def download(self, **kwargs):
+        """Download the file given by `path` or `fileid` and return its
+        metadata.
+        """
+        metadata = self._check(self.api.stat(**kwargs), "stat")["metadata"]
+        size = metadata["size"]
+        params, workers = self._plan(metadata, kwargs)
+        with open(self.destination, "wb+") as f:
+            f.truncate(size)
+            if not size:
+                return metadata
+            api = self._client()
+            try:
+                with mmap.mmap(f.fileno(), size) as mm, memoryview(mm) as view:
+                    with ThreadPoolExecutor(max_workers=workers) as executor:
+                        futures = [
+                            executor.submit(self._worker, api, view, params)
+                            for i in range(workers)
+                        ]
+                    for future in futures:
+                        future.result()
+                    mm.flush()
+            except BaseException:
+                f.close()
+                os.remove(self.destination)
+                raise
+            finally:
+                if api is not self.api:
+                    api.connection.close()
+        return metadata
+
+
+class AsyncParallelDownload(ParallelDownload):
+    """`ParallelDownload` for `AsyncPyCloud`, `download` is a coroutine.
+
+    The workers are tasks. With the JSON protocol every task pins a
+    connection of its own, the binary protocol sends the requests of all
+    tasks back to back over its single connection.
+    """
+
+    async def _read_range(self, api, fd, view, offset, count):
+        with view[offset : offset + count] as target:
+            writer = ViewWriter(target)
+            resp = await api.file_pread(
+                fd=fd,
+                offset=offset,
+                count=count,
+                writer=writer,
+                progress_callback=self.progress_callback,
+            )
+        self._check(resp, "file_pread")
+        if writer.pos != count:
+            raise ParallelDownloadError(
+                f"Got {writer.pos} of {count} bytes at {offset}: {self.destination}"
+            )
+
+    async def _worker(self, api, view, params):
+        async with api.pin():
+            fd = None
+            try:
+                resp = self._check(await api.file_open(flags=0, **params), "file_open")
+                fd = resp["fd"]
+                while not self._failed.is_set():
+                    byte_range = self._next_range()
+                    if byte_range is None:
+                        break
+                    await self._read_range(api, fd, view, *byte_range)
+            except BaseException:
+                self._failed.set()
+                raise
+            finally:
+                if fd is not None:
+                    await api.file_close(fd=fd)
+
+    async def download(self, **kwargs):
+        """See `ParallelDownload.download`"""
+        metadata = self._check(await self.api.stat(**kwargs), "stat")["metadata"]
+        size = metadata["size"]
+        params, workers = self._plan(metadata, kwargs)
+        with open(self.destination, "wb+") as f:
+            f.truncate(size)
+            if not size:
+                return metadata
+            try:
+                with mmap.mmap(f.fileno(), size) as mm, memoryview(mm) as view:
+                    # wait for all tasks, they write into the mapping
+                    results = await asyncio.gather(
+                        *(self._worker(self.api, view, params) for i in range(workers)),
+                        return_exceptions=True,
+                    )
+                    for result in results:
+                        if isinstance(result, BaseException):
+                            raise result
+                    mm.flush()
+            except BaseException:
+                f.close()
+                os.remove(self.destination)
+                raise
+        return metadata
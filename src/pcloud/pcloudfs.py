@@ -1,23 +1,29 @@
 # -*- coding: utf-8 -*-
+import copy
+import httpx
 import io
 import os
 import tempfile
 
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import closing
 from datetime import datetime
 from fs import errors
-from fs.enums import ResourceType
 from fs.base import FS
 from fs.info import Info
 from fs.opener import Opener
 from fs.path import abspath
+from fs.path import combine
 from fs.path import dirname
 from fs.mode import Mode
 from fs.subfs import SubFS
+from fs.walk import BoundWalker
+from fs.walk import Walker
 from pcloud import api
-
-
-DT_FORMAT_STRING = "%a, %d %b %Y %H:%M:%S %z"
+from pcloud.binaryprotocol import PCloudBinaryConnection
+from pcloud.binaryprotocol import PCloudBinaryConnectionPool
+from pcloud.rangedreader import RangedReader
+from pcloud.utils import DT_FORMAT_STRING
 
 FSMODEMMAP = {
     "w": api.O_WRITE,
@@ -30,10 +36,13 @@ FSMODEMMAP = {
 class PCloudFile(io.IOBase):
     """Proxy for a pCloud file."""
 
+    # files up to this size are kept in memory
+    spool_size = 8 * 1024 * 1024
+
     @classmethod
     def factory(cls, path, mode, on_close):
-        """Create a S3File backed with a temporary file."""
-        _temp_file = tempfile.TemporaryFile()
+        """Create a PCloudFile backed with a spooled temporary file."""
+        _temp_file = tempfile.SpooledTemporaryFile(max_size=cls.spool_size)
         proxy = cls(_temp_file, path, mode, on_close=on_close)
         return proxy
 
@@ -140,7 +149,131 @@ class PCloudFile(io.IOBase):
         return self.__mode.to_platform_bin()
 
 
+class PCloudWalker(Walker):
+    """Walker fetching the whole tree below the path with a single recursive
+    `listfolder` and walking it in memory.
+
+    If the recursive listing fails, i.e. times out for a very large tree,
+    or `max_depth` is set, the folders are listed level by level with up to
+    `workers` requests at once. Directories missing in the prefetched tree
+    are scanned as usual.
+    """
+
+    # number of listfolder requests at once when listing level by level
+    workers = 8
+    # seconds to wait for the recursive listing
+    recursive_timeout = 120
+
+    @classmethod
+    def bind(cls, fs):
+        # Walker.bind always binds the base class
+        return BoundWalker(fs, walker_class=cls)
+
+    def _iter_walk(self, fs, path, namespaces=None):
+        pcloudfs, _path = fs, path
+        if hasattr(fs, "delegate_path"):
+            pcloudfs, _path = fs.delegate_path(path)
+        if not isinstance(pcloudfs, PCloudFS):
+            return super()._iter_walk(fs, path, namespaces=namespaces)
+        # the listings are only valid for this walk
+        walker = copy.copy(self)
+        walker._listings = {}
+        metadata = self._fetch(pcloudfs, pcloudfs.validatepath(_path))
+        pending = [(path, metadata)] if metadata else []
+        while pending:
+            dir_path, metadata = pending.pop()
+            walker._listings[dir_path] = [
+                pcloudfs._info_from_metadata(item, namespaces or ())
+                for item in metadata["contents"]
+            ]
+            pending.extend(
+                (combine(dir_path, item["name"]), item)
+                for item in metadata["contents"]
+                if "contents" in item
+            )
+        return Walker._iter_walk(walker, fs, path, namespaces=namespaces)
+
+    def _scan(self, fs, dir_path, namespaces=None):
+        listing = getattr(self, "_listings", {}).get(dir_path)
+        if listing is None:
+            return super()._scan(fs, dir_path, namespaces=namespaces)
+        return iter(listing)
+
+    def _fetch(self, pcloudfs, path):
+        """Return the metadata of the folder at path with the contents of
+        its subfolders or None
+        """
+        if self.max_depth is None:
+            pcloud = pcloudfs.pcloud
+            try:
+                with pcloudfs._lock:
+                    try:
+                        resp = pcloud.listfolder(
+                            path=path, recursive=1, _timeout=self.recursive_timeout
+                        )
+                    except (httpx.HTTPError, OSError):
+                        if isinstance(pcloud.connection, PCloudBinaryConnection):
+                            # the late response would be read as the next result
+                            pcloud.connection.reconnect()
+                        raise
+            except (httpx.HTTPError, OSError) as e:
+                api.log.warning(f"Recursive listing of {path} failed: {e}")
+            else:
+                if resp.get("result") == 0:
+                    return resp["metadata"]
+                api.log.warning(f"Recursive listing of {path} failed: {resp}")
+        return self._fetch_levels(pcloudfs, path)
+
+    def _fetch_levels(self, pcloudfs, path):
+        """Return the metadata of the folder at path with the contents of
+        its subfolders listed level by level or None
+        """
+        pcloud = pcloudfs.pcloud
+        if isinstance(pcloud.connection, PCloudBinaryConnection):
+            # a single socket can't be shared between threads
+            pcloud = copy.copy(pcloud)
+            pcloud.connection = PCloudBinaryConnectionPool(pcloud, size=self.workers)
+
+        def listfolder(folder):
+            try:
+                resp = pcloud.listfolder(folderid=folder["folderid"])
+            except (httpx.HTTPError, OSError) as e:
+                resp = {"result": None, "error": e}
+            if resp.get("result") == 0:
+                folder["contents"] = resp["metadata"]["contents"]
+            else:
+                # the walk scans it again and handles the error
+                api.log.warning(f"Listing of {folder.get('name')} failed: {resp}")
+
+        with pcloudfs._lock:
+            resp = pcloudfs.pcloud.listfolder(path=path)
+        if resp.get("result") != 0:
+            return None
+        root = resp["metadata"]
+        level = [root]
+        depth = 1
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                while self.max_depth is None or depth < self.max_depth:
+                    level = [
+                        item
+                        for folder in level
+                        for item in folder.get("contents", ())
+                        if item.get("isfolder")
+                    ]
+                    if not level:
+                        break
+                    list(executor.map(listfolder, level))
+                    depth += 1
+        finally:
+            if pcloud is not pcloudfs.pcloud:
+                pcloud.connection.close()
+        return root
+
+
 class PCloudSubFS(SubFS):
+    walker_class = PCloudWalker
+
     def __init__(self, parent_fs, path):
         super().__init__(parent_fs, path)
         if not hasattr(self._wrap_fs, "_wrap_sub_dir"):
@@ -153,6 +286,9 @@ class PCloudFS(FS):
     # make alternative implementations possible (i.e. for testing)
     factory = api.PyCloud
     subfs_class = PCloudSubFS
+    walker_class = PCloudWalker
+    # bytes read at once from files opened for reading only
+    read_ahead = 1024 * 1024
 
     _meta = {
         "invalid_path_chars": "\0:",
@@ -167,9 +303,9 @@ class PCloudFS(FS):
         "virtual": False,
     }
 
-    def __init__(self, username, password, endpoint="api"):
+    def __init__(self, username, password, endpoint="api", **kwargs):
         super().__init__()
-        self.pcloud = self.factory(username, password, endpoint)
+        self.pcloud = self.factory(username, password, endpoint, **kwargs)
 
     def __repr__(self):
         return "<pCloudFS>"
@@ -224,14 +360,40 @@ class PCloudFS(FS):
                     f.truncate(size=0)
             return True
 
+    def _listfolder(self, path):
+        """Return the metadata of the folder at path including its contents"""
+        with self._lock:
+            resp = self.pcloud.listfolder(path=path)
+        result = resp.get("result")
+        if result == 0:
+            return resp["metadata"]
+        elif result in (2002, 2005):
+            # pCloud doesn't tell missing folders and files apart
+            if self.exists(path):
+                raise errors.DirectoryExpected(path)
+            raise errors.ResourceNotFound(path)
+        raise errors.OperationFailed(
+            path=path,
+            msg=f"Listing of directory failed with ({result}) {resp.get('error')}",
+        )
+
     def listdir(self, path):
+        self.check()
         _path = self.validatepath(path)
-        _type = self.gettype(_path)
-        if _type is not ResourceType.directory:
-            raise errors.DirectoryExpected(path)
-        with self._lock:
-            result = self.pcloud.listfolder(path=_path)
-        return [item["name"] for item in result["metadata"]["contents"]]
+        return [item["name"] for item in self._listfolder(_path)["contents"]]
+
+    def scandir(self, path, namespaces=None, page=None):
+        """Return the resource info of the contents of a directory, which
+        `listfolder` returns with one request for all namespaces.
+        """
+        self.check()
+        namespaces = namespaces or ()
+        _path = self.validatepath(path)
+        contents = self._listfolder(_path)["contents"]
+        if page is not None:
+            start, end = page
+            contents = contents[start:end]
+        return iter([self._info_from_metadata(item, namespaces) for item in contents])
 
     def makedir(self, path, permissions=None, recreate=False):
         self.check()
@@ -291,18 +453,19 @@ class PCloudFS(FS):
             raise api.InvalidFileModeError
 
         def on_close(pcloudfile):
-            if _mode.create or _mode.writing:
-                pcloudfile.raw.seek(0)
-                data = pcloudfile.raw.read()
-                resp = self.pcloud.uploadfile(
-                    path=dirname(_path),
-                    data=data,
-                    filename=pcloudfile.filename,
-                )
-                if resp.get("result") != 0:
-                    api.log.error(f"Upload Error for file {_path}: {resp}")
-                    return
-            pcloudfile.raw.close()
+            try:
+                if _mode.create or _mode.writing:
+                    pcloudfile.raw.seek(0)
+                    # the spooled file is streamed in chunks, not read at once
+                    resp = self.pcloud.uploadfile(
+                        path=dirname(_path),
+                        data=pcloudfile.raw,
+                        filename=pcloudfile.filename,
+                    )
+                    if resp.get("result") != 0:
+                        api.log.error(f"Upload Error for file {_path}: {resp}")
+            finally:
+                pcloudfile.raw.close()
 
         if _mode.create:
             dir_path = dirname(_path)
@@ -321,17 +484,21 @@ class PCloudFS(FS):
             pcloud_file = PCloudFile.factory(path, _mode, on_close=on_close)
 
             if _mode.appending:
-                resp = self.pcloud.file_open(path=_path, flags=flags)
-                fd = resp.get("fd")
-                if fd is not None:
-                    data = self.pcloud.file_read(fd=fd, count=info.size)
-                    if resp.get("result") != 0:
-                        api.log.error(f"Error reading file {_path} failed with {resp}")
-                    pcloud_file.seek(0, os.SEEK_END)
-                    pcloud_file.raw.write(data)
-                    resp = self.pcloud.file_close(fd=fd)
-                else:
-                    api.log.error(f"No open file found to write. {resp}")
+                with self.pcloud.pin():
+                    resp = self.pcloud.file_open(path=_path, flags=flags)
+                    fd = resp.get("fd")
+                    if fd is not None:
+                        pcloud_file.seek(0, os.SEEK_END)
+                        resp = self.pcloud.file_read(
+                            fd=fd, count=info.size, writer=pcloud_file.raw
+                        )
+                        if resp.get("result") != 0:
+                            api.log.error(
+                                f"Error reading file {_path} failed with {resp}"
+                            )
+                        resp = self.pcloud.file_close(fd=fd)
+                    else:
+                        api.log.error(f"No open file found to write. {resp}")
 
             return pcloud_file
 
@@ -339,17 +506,27 @@ class PCloudFS(FS):
         if info.is_dir:
             raise errors.FileExpected(_path)
 
+        if not _mode.writing:
+            try:
+                reader = RangedReader(self.pcloud, size=info.size, path=_path)
+            except OSError as e:
+                raise errors.OperationFailed(path=_path, exc=e)
+            buffer_size = buffering if buffering > 1 else self.read_ahead
+            return PCloudFile(
+                io.BufferedReader(reader, buffer_size), _path, _mode, on_close=on_close
+            )
+
         pcloud_file = PCloudFile.factory(_path, _mode, on_close=on_close)
-        resp = self.pcloud.file_open(path=_path, flags=api.O_WRITE)
-        fd = resp.get("fd")
-        if fd is None:
-            api.log.error(f"Error opening file {_path} failed with {resp}")
-        else:
-            data = self.pcloud.file_read(fd=fd, count=info.size)
-            pcloud_file.raw.write(data)
-            resp = self.pcloud.file_close(fd=fd)
-            if resp.get("result") != 0:
-                api.log.error(f"Error closing file {_path} failed with {resp}")
+        with self.pcloud.pin():
+            resp = self.pcloud.file_open(path=_path, flags=api.O_WRITE)
+            fd = resp.get("fd")
+            if fd is None:
+                api.log.error(f"Error opening file {_path} failed with {resp}")
+            else:
+                self.pcloud.file_read(fd=fd, count=info.size, writer=pcloud_file.raw)
+                resp = self.pcloud.file_close(fd=fd)
+                if resp.get("result") != 0:
+                    api.log.error(f"Error closing file {_path} failed with {resp}")
 
         pcloud_file.seek(0)
         return pcloud_file
@@ -404,6 +581,7 @@ class PCloudOpener(Opener):
             username=parse_result.username,
             password=parse_result.password,
             endpoint=endpoint,
+            lazy=True,
         )
         if directory:
             return fs.opendir(directory)
@@ -1,39 +1,56 @@
+from pcloud.asyncbinaryprotocol import AsyncPCloudBinaryConnection
+from pcloud.asyncjsonprotocol import AsyncPCloudJSONConnection
 from pcloud.dummyprotocol import PCloudDummyConnection
 from pcloud.jsonprotocol import PCloudJSONConnection
 from pcloud.binaryprotocol import PCloudBinaryConnection
+from pcloud.binaryprotocol import PCloudBinaryConnectionPool
 
 
 class TestProtocol(object):
     name = "test"
     endpoint = "http://localhost:5023/"
     connection = PCloudDummyConnection
+    async_connection = AsyncPCloudJSONConnection
 
 
 class JsonAPIProtocol(object):
     name = "api"
     endpoint = "https://api.pcloud.com/"
     connection = PCloudJSONConnection
+    async_connection = AsyncPCloudJSONConnection
 
 
 class JsonEAPIProtocol(object):
     name = "eapi"
     endpoint = "https://eapi.pcloud.com/"
     connection = PCloudJSONConnection
+    async_connection = AsyncPCloudJSONConnection
 
 
 class BinAPIProtocol(object):
     name = "binapi"
     endpoint = "https://binapi.pcloud.com/"
     connection = PCloudBinaryConnection
+    connection_pool = PCloudBinaryConnectionPool
+    async_connection = AsyncPCloudBinaryConnection
 
 
 class BinEAPIProtocol(object):
     name = "bineapi"
     endpoint = "https://bineapi.pcloud.com/"
     connection = PCloudBinaryConnection
+    connection_pool = PCloudBinaryConnectionPool
+    async_connection = AsyncPCloudBinaryConnection
 
 
 class NearestProtocol(object):
     name = "nearest"
     endpoint = ""
     connection = PCloudJSONConnection
+
+
+class BinNearestProtocol(object):
+    name = "binnearest"
+    endpoint = ""
+    connection = PCloudBinaryConnection
+    connection_pool = PCloudBinaryConnectionPool
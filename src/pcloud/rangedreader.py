@@ -0,0 +1,149 @@
+import copy
+import httpx
+import io
+import os
+
+from pcloud.binaryprotocol import PCloudBinaryConnection
+from pcloud.binaryprotocol import PCloudBinaryConnectionPool
+from pcloud.jsonprotocol import PCloudJSONConnection
+from pcloud.utils import ViewWriter
+from pcloud.utils import log
+
+
+class RangedReader(io.RawIOBase):
+    """Read-only raw file reading the requested ranges of a pCloud file
+    with `file_pread` instead of downloading it on open.
+
+    The file stays open on a connection of its own, since file descriptors
+    are only valid on the connection they were opened on. If the descriptor
+    gets lost, i.e. after the server closed an idle connection, the file is
+    opened again on a new connection. Wrap it in an `io.BufferedReader` for
+    read-ahead.
+    """
+
+    _fd = None
+    _own_connection = False
+
+    def __init__(self, api, size=None, **kwargs):
+        """
+        :param size: size of the file if known, saves a request
+        :param kwargs: `path` or `fileid` of the file
+        """
+        super().__init__()
+        self.api = self._client(api)
+        self._own_connection = self.api is not api
+        self.size = size
+        self._params = kwargs
+        self._fd = None
+        self._pos = 0
+        try:
+            self._open()
+        except BaseException:
+            self.close()
+            raise
+
+    @staticmethod
+    def _client(api):
+        """Return an api with a connection only used by this file"""
+        connection = api.connection
+        if isinstance(connection, (PCloudBinaryConnection, PCloudBinaryConnectionPool)):
+            client = copy.copy(api)
+            # the token is sent with every request, the socket needs no login
+            client.connection = PCloudBinaryConnection(client).connect()
+        elif isinstance(connection, PCloudJSONConnection):
+            client = copy.copy(api)
+            options = dict(
+                connection.client_options, limits=httpx.Limits(max_connections=1)
+            )
+            client.connection = PCloudJSONConnection(client, **options)
+        else:
+            client = api
+        return client
+
+    def _open(self):
+        resp = self.api.file_open(flags=0, **self._params)
+        if resp.get("result") != 0:
+            raise OSError(f"Opening {self._params} failed: {resp}")
+        self._fd = resp["fd"]
+        if "fileid" in resp:
+            # stick to this file, even if the path is replaced
+            self._params = {"fileid": resp["fileid"]}
+        if self.size is None:
+            resp = self.api.file_size(fd=self._fd)
+            if resp.get("result") != 0:
+                raise OSError(f"Getting the size of {self._params} failed: {resp}")
+            self.size = resp["size"]
+
+    def _pread(self, view):
+        """Read into view at the position and return whether it succeeded"""
+        writer = ViewWriter(view)
+        resp = self.api.file_pread(
+            fd=self._fd, offset=self._pos, count=len(view), writer=writer
+        )
+        # with a writer, errors of both protocols are returned as dict
+        return resp.get("result") == 0 and writer.pos == len(view)
+
+    def _reconnect(self):
+        """Replace a broken connection of this file"""
+        if self._own_connection and isinstance(
+            self.api.connection, PCloudBinaryConnection
+        ):
+            self.api.connection.reconnect()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            pos = offset
+        elif whence == os.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == os.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError("invalid value for 'whence'")
+        if pos < 0:
+            raise ValueError(f"negative seek position {pos}")
+        self._pos = pos
+        return pos
+
+    def readinto(self, b):
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+        count = min(len(b), max(self.size - self._pos, 0))
+        if not count:
+            return 0
+        with memoryview(b) as view, view.cast("B")[:count] as target:
+            try:
+                done = self._pread(target)
+            except (httpx.HTTPError, OSError) as e:
+                # the descriptor is lost with the connection
+                log.info(f"Reading {self._params} failed ({e}), connecting again")
+                self._reconnect()
+                done = False
+            if not done:
+                log.info(f"Reading {self._params} failed, opening it again")
+                self._open()
+                if not self._pread(target):
+                    raise OSError(f"Reading {count} bytes at {self._pos} failed")
+        self._pos += count
+        return count
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._fd is not None:
+                self.api.file_close(fd=self._fd)
+        except (httpx.HTTPError, OSError) as e:
+            log.warning(f"Closing {self._params} failed: {e}")
+        finally:
+            if self._own_connection:
+                self.api.connection.close()
+            super().close()
@@ -0,0 +1,219 @@
+import posixpath
+import threading
+import time
+
+from collections import OrderedDict
+from pcloud.api import O_APPEND
+from pcloud.api import O_CREAT
+from pcloud.api import O_EXCL
+from pcloud.api import O_TRUNC
+from pcloud.api import O_WRITE
+
+
+class PathResolver(object):
+    """Learns the ids of paths from responses and replaces the `path`
+    parameter of later calls with the file or folder id.
+
+    Calls of `changing_methods` forget the paths and ids they change,
+    folders with their contents. Changes made by other clients are only
+    seen once mappings expire, so only lookups, opening files for reading
+    and creating folders are rewritten. Writes, uploads, deletes and
+    renames keep their paths, as the path might refer to another object.
+    """
+
+    # methods, whose path can be replaced with an id of this kind
+    id_methods = {
+        "stat": "fileid",
+        "checksumfile": "fileid",
+        "getfilehistory": "fileid",
+        "file_open": "fileid",
+        "listfolder": "folderid",
+    }
+    # flags of file_open, which may create or change a file
+    writing_flags = O_WRITE | O_CREAT | O_EXCL | O_TRUNC | O_APPEND
+    # methods, whose path can be replaced with the folderid of its parent
+    # and a name
+    parent_methods = frozenset(["createfolder", "createfolderifnotexists"])
+    # methods, whose metadata describes the object at path
+    describing_methods = frozenset(
+        [
+            "stat",
+            "checksumfile",
+            "listfolder",
+            "createfolder",
+            "createfolderifnotexists",
+        ]
+    )
+    changing_methods = frozenset(
+        [
+            "deletefile",
+            "deletefolder",
+            "deletefolderrecursive",
+            "renamefile",
+            "renamefolder",
+            "copyfile",
+            "copyfolder",
+            "extractarchive",
+            "downloadfile",
+            "savezip",
+        ]
+    )
+
+    def __init__(self, maxsize=10000, ttl=300):
+        """
+        :param maxsize: maximum number of paths kept
+        :param ttl: seconds after which a mapping expires
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self._paths = OrderedDict()
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._paths)
+
+    def lookup(self, path):
+        """Return the (kind, id) tuple of path or None"""
+        path = posixpath.normpath(path)
+        if path == "/":
+            return ("folderid", 0)
+        with self._lock:
+            entry = self._paths.get(path)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(path)
+                return None
+            self._paths.move_to_end(path)
+            return entry[1]
+
+    def resolve(self, method, params):
+        """Return the parameters of a call with its path replaced by an id,
+        if it is known.
+        """
+        path = params.get("path")
+        if not path:
+            return params
+        if method in self.id_methods:
+            if method == "file_open" and self.writing_flags & int(
+                params.get("flags", 0)
+            ):
+                return params
+            ident = self.lookup(path)
+            if ident is None or ident[0] != self.id_methods[method]:
+                return params
+            params = dict(params, **{ident[0]: ident[1]})
+        elif method in self.parent_methods and "name" not in params:
+            parent, name = posixpath.split(posixpath.normpath(path))
+            ident = self.lookup(parent)
+            if ident is None or ident[0] != "folderid" or not name:
+                return params
+            params = dict(params, folderid=ident[1], name=name)
+        else:
+            return params
+        del params["path"]
+        self.hits += 1
+        return params
+
+    def update(self, method, params, response=None):
+        """Learn the ids of the response of a call with the original
+        parameters and forget the ones it changed.
+        """
+        if not isinstance(response, dict) or response.get("result") != 0:
+            # the path may refer to something else than learned
+            if params.get("path"):
+                self.forget({"path": params["path"]})
+            return
+        if method in self.changing_methods:
+            self.forget(params)
+        self._learn(method, params, response)
+
+    def forget(self, params):
+        """Forget the paths and ids of the parameters of a call, including
+        the contents of folders.
+        """
+        paths = {
+            posixpath.normpath(params[name])
+            for name in ("path", "topath")
+            if params.get(name)
+        }
+        with self._lock:
+            for name in ("fileid", "folderid", "tofolderid"):
+                if params.get(name) is None:
+                    continue
+                ident = (name.replace("to", ""), int(params[name]))
+                if ident in self._ids:
+                    paths.update(self._ids[ident])
+                elif ident[0] == "folderid":
+                    # the contents of an unknown folder can't be found
+                    self._paths.clear()
+                    self._ids.clear()
+                    return
+            prefixes = tuple(path.rstrip("/") + "/" for path in paths)
+            for path in list(self._paths):
+                if path in paths or path.startswith(prefixes):
+                    self._drop(path)
+
+    def clear(self):
+        with self._lock:
+            self._paths.clear()
+            self._ids.clear()
+
+    def _drop(self, path):
+        _, ident = self._paths.pop(path)
+        paths = self._ids.get(ident)
+        if paths is not None:
+            paths.discard(path)
+            if not paths:
+                del self._ids[ident]
+
+    def _add(self, path, metadata):
+        if metadata.get("isfolder"):
+            ident = ("folderid", metadata.get("folderid"))
+        else:
+            ident = ("fileid", metadata.get("fileid"))
+        if ident[1] is None or path == "/":
+            return
+        if path in self._paths:
+            self._drop(path)
+        self._paths[path] = (time.monotonic() + self.ttl, ident)
+        self._ids.setdefault(ident, set()).add(path)
+        while len(self._paths) > self.maxsize:
+            self._drop(next(iter(self._paths)))
+
+    def _learn(self, method, params, response):
+        metadata = response.get("metadata")
+        path = posixpath.normpath(params["path"]) if params.get("path") else None
+        pending = []
+        with self._lock:
+            if method in self.describing_methods and path:
+                pending.append((path, metadata))
+            elif method == "uploadfile" and isinstance(metadata, list):
+                if path is None and params.get("folderid") is not None:
+                    folderid = int(params["folderid"])
+                    paths = (
+                        {"/"}
+                        if folderid == 0
+                        else self._ids.get(("folderid", folderid))
+                    )
+                    path = next(iter(paths)) if paths else None
+                if path is not None:
+                    pending.extend(
+                        (posixpath.join(path, meta["name"]), meta) for meta in metadata
+                    )
+            elif method == "file_open" and path and "fileid" in response:
+                pending.append((path, {"fileid": response["fileid"]}))
+            elif isinstance(metadata, dict) and metadata.get("path"):
+                pending.append((metadata["path"], metadata))
+            while pending:
+                path, meta = pending.pop()
+                if not isinstance(meta, dict):
+                    continue
+                self._add(path, meta)
+                pending.extend(
+                    (posixpath.join(path, child["name"]), child)
+                    for child in meta.get("contents", [])
+                    if "name" in child
+                )
@@ -0,0 +1,226 @@
+import asyncio
+import httpx
+import json
+import os
+
+from pcloud.binaryprotocol import PCloudBinaryConnection
+from pcloud.utils import log
+
+
+class ResumableUploadError(Exception):
+    """pCloud rejected a request of the upload session"""
+
+
+class ResumableUpload(object):
+    """Upload of a file in chunks using an upload session of pCloud.
+
+    Every chunk pCloud has confirmed is recorded in a journal file. If the
+    upload is interrupted, running it again continues at the offset pCloud
+    has stored instead of starting over. Broken connections are retried
+    right away. See https://docs.pcloud.com/methods/upload/
+    """
+
+    chunk_size = 8 * 1024 * 1024
+    retries = 3
+    # errors of broken connections, which are retried
+    retry_errors = (OSError, httpx.TransportError)
+
+    def __init__(
+        self,
+        api,
+        filename,
+        chunk_size=None,
+        journal=None,
+        progress_callback=None,
+        retries=None,
+    ):
+        """
+        :param api: PyCloud instance
+        :param filename: path of the file to upload
+        :param chunk_size: size of the chunks written with one request
+        :param journal: path of the journal file, defaults to the path of
+            the file with the suffix `.pcloud-upload`
+        :param progress_callback: called with the number of bytes sent
+        :param retries: how often a broken connection is retried
+        """
+        self.api = api
+        self.filename = os.fspath(filename)
+        self.chunk_size = chunk_size or self.chunk_size
+        self.journal = journal or self.filename + ".pcloud-upload"
+        self.progress_callback = progress_callback
+        if retries is not None:
+            self.retries = retries
+        stat = os.stat(self.filename)
+        self.size = stat.st_size
+        self.mtime = int(stat.st_mtime)
+        self.uploadid = None
+        self.offset = 0
+
+    def _check(self, resp, method):
+        if resp.get("result") != 0:
+            raise ResumableUploadError(
+                f"pCloud error occured ({resp.get('result')}) in {method} - "
+                f"{resp.get('error')}: {self.filename}"
+            )
+        return resp
+
+    def _read_journal(self):
+        """Return the upload id of an unfinished upload of the same file"""
+        try:
+            with open(self.journal) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("size") != self.size or state.get("mtime") != self.mtime:
+            log.info("%s changed since the last upload, starting over", self.filename)
+            return None
+        return state.get("uploadid")
+
+    def _write_journal(self):
+        state = {
+            "uploadid": self.uploadid,
+            "offset": self.offset,
+            "size": self.size,
+            "mtime": self.mtime,
+        }
+        tmp = self.journal + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        # don't leave a truncated journal behind on a crash
+        os.replace(tmp, self.journal)
+
+    def _offset(self, resp):
+        """Return the size pCloud has stored according to the response of
+        `upload_info` or None if the upload session is gone.
+        """
+        if resp.get("result") != 0 or resp.get("size", 0) > self.size:
+            return None
+        return resp["size"]
+
+    def _resumed(self, offset):
+        """Continue at the confirmed offset, if the session still exists"""
+        if offset is None:
+            return False
+        log.info("Resuming upload of %s at %s", self.filename, offset)
+        self.offset = offset
+        return True
+
+    def _created(self, resp):
+        self.uploadid = self._check(resp, "upload_create")["uploadid"]
+        self.offset = 0
+        self._write_journal()
+
+    def _next_chunk(self, f):
+        """Return the parameters of `upload_write` for the next chunk or
+        None if the whole file has been sent.
+        """
+        if self.offset >= self.size:
+            return None
+        f.seek(self.offset)
+        chunk = f.read(min(self.chunk_size, self.size - self.offset))
+        if not chunk:
+            raise ResumableUploadError(f"{self.filename} has been truncated")
+        return {
+            "uploadid": self.uploadid,
+            "uploadoffset": self.offset,
+            "data": chunk,
+            "progress_callback": self.progress_callback,
+        }
+
+    def _written(self, resp, params):
+        self._check(resp, "upload_write")
+        self.offset += len(params["data"])
+        self._write_journal()
+
+    def _failed(self, attempt, error):
+        """Raise the error of the last attempt, else prepare the retry"""
+        if attempt == self.retries:
+            raise error
+        log.warning("Upload of %s failed (%s), retrying", self.filename, error)
+        connection = self.api.connection
+        if isinstance(connection, PCloudBinaryConnection):
+            # the broken socket would fail again or return a stale result
+            connection.reconnect()
+
+    def _saved(self, resp):
+        self._check(resp, "upload_save")
+        os.remove(self.journal)
+        return resp
+
+    def _confirmed_offset(self):
+        return self._offset(self.api.upload_info(uploadid=self.uploadid))
+
+    def _resume(self):
+        """Continue the upload session of the journal or create a new one."""
+        self.uploadid = self._read_journal()
+        if self.uploadid is not None and self._resumed(self._confirmed_offset()):
+            return
+        self._created(self.api.upload_create())
+
+    def _write_chunks(self, f):
+        params = self._next_chunk(f)
+        while params is not None:
+            self._written(self.api.upload_write(**params), params)
+            params = self._next_chunk(f)
+
+    def upload(self, **kwargs):
+        """Send the missing chunks and save the file.
+
+        The keyword arguments are passed to `upload_save`, i.e. `path` or
+        `folderid` of the target folder. The name defaults to the name of
+        the local file.
+        """
+        kwargs.setdefault("name", os.path.basename(self.filename))
+        self._resume()
+        with open(self.filename, "rb") as f:
+            for attempt in range(self.retries + 1):
+                try:
+                    self._write_chunks(f)
+                    break
+                except self.retry_errors as e:
+                    self._failed(attempt, e)
+                    if not self._resumed(self._confirmed_offset()):
+                        raise
+        return self._saved(self.api.upload_save(uploadid=self.uploadid, **kwargs))
+
+
+class AsyncResumableUpload(ResumableUpload):
+    """`ResumableUpload` for `AsyncPyCloud`, `upload` is a coroutine.
+
+    The asyncio binary connection is opened again by the next request
+    after a failure, so retries don't reconnect.
+    """
+
+    # the binary protocol raises IncompleteReadError on EOF
+    retry_errors = ResumableUpload.retry_errors + (asyncio.IncompleteReadError,)
+
+    async def _confirmed_offset(self):
+        return self._offset(await self.api.upload_info(uploadid=self.uploadid))
+
+    async def _resume(self):
+        self.uploadid = self._read_journal()
+        if self.uploadid is not None and self._resumed(await self._confirmed_offset()):
+            return
+        self._created(await self.api.upload_create())
+
+    async def _write_chunks(self, f):
+        params = self._next_chunk(f)
+        while params is not None:
+            self._written(await self.api.upload_write(**params), params)
+            params = self._next_chunk(f)
+
+    async def upload(self, **kwargs):
+        """See `ResumableUpload.upload`"""
+        kwargs.setdefault("name", os.path.basename(self.filename))
+        await self._resume()
+        with open(self.filename, "rb") as f:
+            for attempt in range(self.retries + 1):
+                try:
+                    await self._write_chunks(f)
+                    break
+                except self.retry_errors as e:
+                    self._failed(attempt, e)
+                    if not self._resumed(await self._confirmed_offset()):
+                        raise
+        resp = await self.api.upload_save(uploadid=self.uploadid, **kwargs)
+        return self._saved(resp)
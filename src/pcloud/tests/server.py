@@ -3,14 +3,75 @@ from http.server import BaseHTTPRequestHandler
 from multipart import MultipartParser
 from multipart import parse_options_header
 from os import path
+from urllib.parse import parse_qs
+import json
 import socketserver
 
 
 class MockHandler(BaseHTTPRequestHandler):
+    # Contents of the upload sessions by uploadid
+    uploads = {}
+    # Files served by file_open and file_pread by path and opened files by fd
+    files = {}
+    fds = {}
+
+    def send_json(self, data):
+        self.send_response(200)
+        self.send_header("Content-type", "application/json")
+        self.end_headers()
+        self.wfile.write(bytes(json.dumps(data), "utf-8"))
+
+    def upload_session(self, method, params):
+        """Stateful stand-in for the upload_* methods"""
+        if method == "upload_create":
+            uploadid = len(self.uploads) + 1
+            self.uploads[uploadid] = bytearray()
+            return {"result": 0, "uploadid": uploadid}
+        content = self.uploads.get(int(params.get("uploadid", 0)))
+        if content is None:
+            return {"result": 1900, "error": "Invalid 'uploadid' provided."}
+        if method == "upload_info":
+            return {"result": 0, "size": len(content)}
+        elif method == "upload_write":
+            offset = int(params["uploadoffset"])
+            content[offset : offset + len(params["data"])] = params["data"]
+            return {"result": 0}
+        elif method == "upload_save":
+            metadata = {"name": params["name"], "size": len(content)}
+            return {"result": 0, "metadata": metadata}
+
+    def file_access(self, method, params):
+        """Stand-in for reading the files in `files`"""
+        if method == "stat":
+            content = self.files[params["path"]]
+            return {"result": 0, "metadata": {"size": len(content)}}
+        elif method == "file_open":
+            fd = len(self.fds) + 1
+            self.fds[fd] = self.files[params["path"]]
+            return {"result": 0, "fd": fd}
+        elif method == "file_close":
+            self.fds[int(params["fd"])] = None
+            return {"result": 0}
+        content = self.fds[int(params["fd"])]
+        offset = int(params["offset"])
+        return content[offset : offset + int(params["count"])]
+
     # Handler for GET requests
     def do_GET(self):
         # Send the json message
         methodparts = self.path[1:].split("?")
+        params = {k: v[0] for k, v in parse_qs(methodparts[-1]).items()}
+        if methodparts[0].startswith("upload_"):
+            return self.send_json(self.upload_session(methodparts[0], params))
+        if params.get("path") in self.files or int(params.get("fd", 0)) in self.fds:
+            result = self.file_access(methodparts[0], params)
+            if isinstance(result, dict):
+                return self.send_json(result)
+            self.send_response(200)
+            self.send_header("Content-type", "application/octet-stream")
+            self.end_headers()
+            self.wfile.write(result)
+            return
         basepath = path.join(path.dirname(__file__), "data")
         method = path.join(basepath, methodparts[0] + ".json")
         safemethod = path.realpath(method)
@@ -27,7 +88,7 @@ class MockHandler(BaseHTTPRequestHandler):
             code = 404
             data = '{"Error": "Path not found or not accessible!"}'
         self.send_response(code)
-        self.send_header("Content-type", "applicaton/json")
+        self.send_header("Content-type", "application/json")
         self.end_headers()
         self.wfile.write(bytes(data, "utf-8"))
 
@@ -39,8 +100,14 @@ class MockHandler(BaseHTTPRequestHandler):
             self.rfile, options["boundary"], content_length=content_length
         )
         file_ = form.get("file")
+        if self.path.startswith("/upload_write"):
+            params = {
+                name: form.get(name).value for name in ("uploadid", "uploadoffset")
+            }
+            params["data"] = file_.raw
+            return self.send_json(self.upload_session("upload_write", params))
         self.send_response(200)
-        self.send_header("Content-type", "applicaton/json")
+        self.send_header("Content-type", "application/json")
         self.end_headers()
         print(f"File: {file_.value.encode('utf-8')}, Size: {file_.size}", end="")
         # Send the json message
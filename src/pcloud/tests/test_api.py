@@ -1,5 +1,7 @@
 #
+from io import BytesIO
 from pcloud import api
+from pcloud.jsonprotocol import PCloudMultipartStream
 from pcloud.pcloudfs import PCloudFS
 
 import datetime
@@ -50,6 +52,32 @@ class DummyPCloudFS(PCloudFS):
     factory = DummyPyCloud
 
 
+def test_multipart_stream(tmp_path):
+    testfile = tmp_path / "foo.txt"
+    testfile.write_bytes(b"x" * 10)
+    stream = PCloudMultipartStream(
+        {"folderid": 0}, [("file", ("foo.txt", testfile))], chunk_size=3
+    )
+    chunks = list(stream)
+    body = b"".join(chunks)
+    assert stream.content_length == len(body)
+    assert b'name="folderid"\r\n\r\n0\r\n' in body
+    assert b'filename="foo.txt"' in body
+    assert b"x" * 10 in body
+    # files are read in chunks
+    assert max(len(chunk) for chunk in chunks if chunk.startswith(b"x")) == 3
+
+
+def test_multipart_stream_unknown_size():
+    class Stream(BytesIO):
+        def seekable(self):
+            return False
+
+    stream = PCloudMultipartStream({}, [("file", ("foo.txt", Stream(b"foo")))])
+    assert stream.content_length is None
+    assert "Content-Length" not in stream.headers
+
+
 def test_getfolderpublink():
     pcapi = DummyPyCloud("john", "doe", noop=True)
     dt = datetime.datetime(2023, 10, 5, 12, 3, 12)
@@ -59,6 +87,65 @@ def test_getfolderpublink():
     }
 
 
+def test_http_options():
+    pcapi = api.PyCloud("", "", endpoint="test", timeout=3, pool_size=2)
+    session = pcapi.connection.session
+    assert session.timeout == httpx.Timeout(3)
+    assert pcapi.connection.client_options["limits"] == httpx.Limits(
+        max_connections=2, max_keepalive_connections=2
+    )
+
+
+def test_pin_json_session():
+    pcapi = api.PyCloud("", "", endpoint="test")
+    shared = pcapi.connection.session
+    with pcapi.pin():
+        pinned = pcapi.connection.session
+        assert pinned is not shared
+        with pcapi.pin():
+            assert pcapi.connection.session is pinned
+    assert pcapi.connection.session is shared
+    # the connection of the pinned client is reused
+    with pcapi.pin():
+        assert pcapi.connection.session is pinned
+    pcapi.connection.close()
+    assert pinned.is_closed
+
+
+@pytest.fixture
+def lazy_api(monkeypatch):
+    opened = []
+
+    def connect(self):
+        opened.append(self)
+        return self
+
+    def do_get_request(self, method, authenticate=True, json=True, endpoint=None, **kw):
+        return {"result": 0, "auth": self.api.auth_token}
+
+    monkeypatch.setattr(api.PyCloud, "get_auth_token", lambda self: "token")
+    monkeypatch.setattr(api.PCloudJSONConnection, "connect", connect)
+    monkeypatch.setattr(api.PCloudJSONConnection, "do_get_request", do_get_request)
+    pcapi = api.PyCloud("foo", "bar", endpoint="api", lazy=True)
+    return pcapi, opened
+
+
+def test_lazy(lazy_api):
+    pcapi, opened = lazy_api
+    assert pcapi._connection is None
+    assert pcapi.auth_token == ""
+    assert pcapi.userinfo() == {"result": 0, "auth": "token"}
+    pcapi.userinfo()
+    assert len(opened) == 1
+
+
+def test_warmup(lazy_api):
+    pcapi, opened = lazy_api
+    pcapi.warmup().join()
+    assert opened == [pcapi.connection]
+    assert pcapi.auth_token == "token"
+
+
 @pytest.mark.usefixtures("start_mock_server")
 class TestPcloudApi(object):
     noop_dummy_file = "/test.txt"
@@ -87,6 +174,82 @@ class TestPcloudApi(object):
             "metadata": {"size": 14},
         }
 
+    def test_upload_progress(self):
+        api = DummyPyCloud("foo", "bar")
+        testfile = os.path.join(os.path.dirname(__file__), "data", "upload.txt")
+        progress = []
+        resp = api.uploadfile(
+            files=[testfile], chunk_size=4, progress_callback=progress.append
+        )
+        assert resp == {"result": 0, "metadata": {"size": 14}}
+        assert progress == [4, 4, 4, 2]
+
+    def test_upload_parallel(self):
+        api = DummyPyCloud("foo", "bar")
+        testfile = os.path.join(os.path.dirname(__file__), "data", "upload.txt")
+        missing = os.path.join(os.path.dirname(__file__), "data", "missing.txt")
+        results = api.uploadfile(files=[testfile, missing, testfile], workers=2)
+        assert results[0] == results[2] == {"result": 0, "metadata": {"size": 14}}
+        assert isinstance(results[1], FileNotFoundError)
+
+    def test_upload_data(self):
+        api = DummyPyCloud("foo", "bar")
+        resp = api.uploadfile(data=b"Hello pCloud!", filename="foo.txt")
+        assert resp == {"result": 0, "metadata": {"size": 13}}
+
+    def test_upload_data_stream(self):
+        api = DummyPyCloud("foo", "bar")
+        data = BytesIO(b"skip Hello pCloud!")
+        data.seek(5)
+        resp = api.uploadfile(data=data, filename="foo.txt", chunk_size=4)
+        assert resp == {"result": 0, "metadata": {"size": 13}}
+        assert not data.closed
+
+    def test_download_writer(self):
+        api = DummyPyCloud("foo", "bar")
+        writer = BytesIO()
+        progress = []
+        resp = api.connection.do_get_request(
+            "getdigest",
+            json=False,
+            _data_writer=writer,
+            _data_chunk_size=8,
+            _data_progress_callback=progress.append,
+        )
+        digest = json.loads(writer.getvalue())
+        assert resp == {"result": 0, "data": len(writer.getvalue())}
+        assert digest["digest"] == "YGtAxbUpI85Zvs7lC7Z62rBwv907TBXhV2L867Hkh"
+        assert sum(progress) == resp["data"]
+        assert max(progress) == 8
+
+    def test_download_stream(self):
+        api = DummyPyCloud("foo", "bar")
+        chunks = list(
+            api.connection.do_get_request(
+                "getdigest", json=False, _stream=True, _data_chunk_size=8
+            )
+        )
+        assert {len(chunk) for chunk in chunks[:-1]} == {8}
+        assert json.loads(b"".join(chunks))["result"] == 0
+
+    def test_download_error(self):
+        api = DummyPyCloud("foo", "bar")
+        writer = BytesIO()
+        resp = api.connection.do_get_request(
+            "upload_info", json=False, uploadid=42, _data_writer=writer
+        )
+        assert resp["result"] == 1900
+        assert writer.getvalue() == b""
+        resp = api.connection.do_get_request(
+            "upload_info", json=False, uploadid=42, _stream=True
+        )
+        assert resp["result"] == 1900
+
+    def test_getpubzip_unzip_stream(self):
+        api = DummyPyCloud("foo", "bar")
+        with pytest.raises(ValueError):
+            api.getpubzip(code="foo", unzip=True, stream=True)
+
     def test_extractarchive(self):
         api = DummyPyCloud("foo", "bar")
         testfile = os.path.join(
@@ -96,6 +259,38 @@ class TestPcloudApi(object):
             expected = json.load(f)
             assert api.extractarchive(fileid=999, topath="/unittest") == expected
 
+    def test_pipeline(self):
+        papi = DummyPyCloud("foo", "bar")
+        with papi.pipeline() as pipeline:
+            assert pipeline.userinfo() == 0
+            assert pipeline.extractarchive(fileid=999, topath="/unittest") == 1
+        assert len(pipeline.results) == 2
+        assert pipeline.results[1]["result"] == 0
+
+    def test_pipeline_validation(self):
+        papi = DummyPyCloud("foo", "bar")
+        with pytest.raises(ValueError):
+            papi.pipeline().stat(name="foo")
+
+    def test_pipeline_upload(self):
+        papi = DummyPyCloud("foo", "bar")
+        with pytest.raises(TypeError):
+            papi.pipeline().file_write(fd=1, data=b"foo")
+
+    def test_pipeline_unsupported(self):
+        pipeline = DummyPyCloud("foo", "bar").pipeline()
+        for name in ("getdigest", "get_auth_token", "file_exists"):
+            with pytest.raises(TypeError):
+                getattr(pipeline, name)
+        with pytest.raises(TypeError):
+            pipeline.getpubzip(code="abc", unzip=True)
+        assert pipeline.getpubzip(code="abc") == 0
+        with pytest.raises(AttributeError):
+            pipeline.connection
+        with pytest.raises(TypeError):
+            pipeline.file_read(fd=1, count=1, writer=BytesIO())
+        assert len(pipeline.commands) == 1
+
     def test_getfilelink(self):
         papi = DummyPyCloud("foo", "bar")
         with pytest.raises(api.OnlyPcloudError):
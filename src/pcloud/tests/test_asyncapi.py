@@ -0,0 +1,315 @@
+#
+from io import BytesIO
+from pcloud.asyncapi import AsyncPyCloud
+from pcloud.asyncbinaryprotocol import AsyncPCloudBinaryConnection
+from pcloud.tests.server import MockHandler
+from pcloud.tests.test_binaryprotocol import data_frame
+from pcloud.tests.test_binaryprotocol import frame
+
+import asyncio
+import json
+import os.path
+import pytest
+
+
+async def mock_binary_handler(reader, writer):
+    """Answer requests of the binary protocol with canned responses"""
+    counter = 0
+    while True:
+        try:
+            req_len = int.from_bytes(await reader.readexactly(2), "little")
+        except asyncio.IncompleteReadError:
+            break
+        req = await reader.readexactly(req_len)
+        method_len, pos, data = req[0], 1, b""
+        if method_len & 0x80:
+            data_len = int.from_bytes(req[1:9], "little")
+            method_len, pos = method_len & 0x7F, 9
+            data = await reader.readexactly(data_len)
+        method = req[pos : pos + method_len].decode("utf-8")
+        if method == "getdigest":
+            response = frame({"result": 0, "digest": "DIGEST"})
+        elif method == "userinfo" and b"getauth" in req:
+            response = frame({"result": 0, "auth": "TOKEN"})
+        elif method == "file_read":
+            response = data_frame(b"Hello pCloud!")
+        elif method == "uploadfile":
+            response = frame({"result": 0, "size": len(data)})
+        else:
+            counter += 1
+            response = frame({"result": 0, "n": counter, "auth": b"\x04auth" in req})
+        writer.write(response)
+        await writer.drain()
+    writer.close()
+
+
+class MockAsyncConnection(AsyncPCloudBinaryConnection):
+    port = None
+
+    async def _open_connection(self):
+        return await asyncio.open_connection("127.0.0.1", self.port)
+
+
+class MockProtocol(object):
+    name = "mock"
+    endpoint = "http://localhost/"
+    async_connection = MockAsyncConnection
+
+
+class MockAsyncPyCloud(AsyncPyCloud):
+    endpoints = {"mock": MockProtocol}
+
+
+def run_with_server(coro_func):
+    async def main():
+        server = await asyncio.start_server(mock_binary_handler, "127.0.0.1", 0)
+        MockAsyncConnection.port = server.sockets[0].getsockname()[1]
+        async with server:
+            async with MockAsyncPyCloud("foo", "bar", endpoint="mock") as pc:
+                return await coro_func(pc)
+
+    return asyncio.run(main())
+
+
+def test_lazy_authentication():
+    async def check(pc):
+        assert pc.auth_token == ""
+        resp = await pc.stat(path="/foo.txt")
+        assert pc.auth_token == "TOKEN"
+        return resp
+
+    assert run_with_server(check) == {"result": 0, "n": 1, "auth": True}
+
+
+def test_concurrent_requests():
+    async def check(pc):
+        return await asyncio.gather(*(pc.stat(fileid=i) for i in range(50)))
+
+    results = run_with_server(check)
+    assert [resp["n"] for resp in results] == list(range(1, 51))
+
+
+def test_pipeline():
+    async def check(pc):
+        async with pc.pipeline() as pipeline:
+            pipeline.stat(fileid=1)
+            pipeline.deletefile(fileid=2)
+            assert pipeline.getpubzip(code="abc") == 2
+        return pipeline.results
+
+    assert [resp["n"] for resp in run_with_server(check)] == [1, 2, 3]
+
+
+def test_warmup():
+    async def check(pc):
+        await pc.warmup()
+        return pc.auth_token
+
+    assert run_with_server(check) == "TOKEN"
+
+
+def test_file_read():
+    async def check(pc):
+        writer = BytesIO()
+        assert await pc.file_read(fd=1, count=13) == b"Hello pCloud!"
+        resp = await pc.file_read(fd=1, count=13, writer=writer)
+        return resp, writer.getvalue()
+
+    assert run_with_server(check) == ({"result": 0, "data": 13}, b"Hello pCloud!")
+
+
+def test_upload():
+    async def check(pc):
+        return await pc.uploadfile(data=b"x" * 100000, filename="foo.bin")
+
+    assert run_with_server(check) == {"result": 0, "size": 100000}
+
+
+def test_upload_invalidates_cache():
+    class RecordingCache(object):
+        cached_methods = frozenset()
+
+        def __init__(self):
+            self.invalidated = []
+
+        def invalidate(self, method, params, resp):
+            self.invalidated.append((method, params, resp))
+
+    async def check(pc):
+        pc.cache = RecordingCache()
+        await pc.uploadfile(data=b"x" * 10, filename="foo.bin", folderid=0)
+        return pc.cache.invalidated
+
+    invalidated = [call for call in run_with_server(check) if call[0] == "uploadfile"]
+    assert invalidated == [("uploadfile", {"folderid": "0"}, {"result": 0, "size": 10})]
+
+
+def test_upload_parallel(tmp_path):
+    files = []
+    for size in (10, 20, 30):
+        files.append(tmp_path / f"{size}.bin")
+        files[-1].write_bytes(b"x" * size)
+
+    async def check(pc):
+        return await pc.uploadfile(files=files, workers=2)
+
+    assert [resp["size"] for resp in run_with_server(check)] == [10, 20, 30]
+
+
+def test_stream():
+    async def check(pc):
+        stream = await pc.file_read(fd=1, count=13, stream=True, chunk_size=5)
+        # waits for the stream to be consumed
+        following = asyncio.ensure_future(pc.stat(fileid=1))
+        chunks = [chunk async for chunk in stream]
+        return chunks, await following
+
+    chunks, resp = run_with_server(check)
+    assert chunks == [b"Hello", b" pClo", b"ud!"]
+    assert resp["result"] == 0
+
+
+def test_stream_closed():
+    async def check(pc):
+        stream = await pc.file_read(fd=1, count=13, stream=True, chunk_size=5)
+        assert await stream.__anext__() == b"Hello"
+        await stream.aclose()
+        # the connection is opened again
+        return await pc.stat(fileid=1)
+
+    assert run_with_server(check)["result"] == 0
+
+
+def test_reconnect_after_send_error(monkeypatch):
+    async def check(pc):
+        await pc.stat(fileid=0)
+
+        async def broken(*args):
+            await asyncio.sleep(0.01)
+            raise OSError("send failed")
+
+        # only the upload has data to send
+        pc.connection._send_raw_data = broken
+        upload = pc.uploadfile(data=b"x" * 10, filename="foo.bin")
+        # the requests queued behind the failed one use a new connection
+        return await asyncio.gather(
+            upload, *(pc.stat(fileid=i) for i in range(3)), return_exceptions=True
+        )
+
+    opened = []
+    original = MockAsyncConnection._open_connection
+
+    async def open_connection(self):
+        opened.append(self)
+        return await original(self)
+
+    monkeypatch.setattr(MockAsyncConnection, "_open_connection", open_connection)
+    results = run_with_server(check)
+    assert isinstance(results[0], OSError)
+    assert [resp["n"] for resp in results[1:]] == [1, 2, 3]
+    assert len(opened) == 2
+
+
+def test_validation():
+    pc = AsyncPyCloud("foo", "bar", endpoint="binapi")
+    with pytest.raises(ValueError):
+        pc.stat(name="foo")
+
+
+@pytest.mark.usefixtures("start_mock_server")
+class TestAsyncJSON(object):
+    datadir = os.path.join(os.path.dirname(__file__), "data")
+
+    def run(self, coro_func):
+        async def main():
+            async with AsyncPyCloud("foo", "bar", endpoint="test") as pc:
+                return await coro_func(pc)
+
+        return asyncio.run(main())
+
+    def test_lazy_authentication(self):
+        async def check(pc):
+            assert pc.auth_token == ""
+            resp = await pc.extractarchive(fileid=999, topath="/unittest")
+            assert pc.auth_token == "TOKEN"
+            return resp
+
+        with open(os.path.join(self.datadir, "extractarchive.json")) as f:
+            assert self.run(check) == json.load(f)
+
+    def test_concurrent_requests(self):
+        async def check(pc):
+            return await asyncio.gather(*(pc.userinfo() for i in range(10)))
+
+        assert [resp["auth"] for resp in self.run(check)] == ["TOKEN"] * 10
+
+    def test_upload_files(self):
+        async def check(pc):
+            testfile = os.path.join(self.datadir, "upload.txt")
+            return await pc.uploadfile(files=[testfile])
+
+        assert self.run(check) == {"result": 0, "metadata": {"size": 14}}
+
+    def test_write_data(self):
+        async def check(pc):
+            writer = BytesIO()
+            resp = await pc.connection.do_get_request(
+                "getdigest", json=False, _data_writer=writer
+            )
+            return resp, json.loads(writer.getvalue())
+
+        resp, digest = self.run(check)
+        assert resp["data"] > 0
+        assert digest["digest"] == "YGtAxbUpI85Zvs7lC7Z62rBwv907TBXhV2L867Hkh"
+
+    def test_stream_data(self):
+        async def check(pc):
+            stream = await pc.connection.do_get_request(
+                "getdigest", json=False, _stream=True, _data_chunk_size=8
+            )
+            return [chunk async for chunk in stream]
+
+        chunks = self.run(check)
+        assert {len(chunk) for chunk in chunks[:-1]} == {8}
+        assert json.loads(b"".join(chunks))["result"] == 0
+
+    def test_resumable_upload(self, tmp_path):
+        testfile = tmp_path / "backup.tar"
+        testfile.write_bytes(b"0123456789" * 450)
+
+        async def check(pc):
+            return await pc.resumable_upload(testfile, chunk_size=1000, path="/")
+
+        resp = self.run(check)
+        assert resp == {"result": 0, "metadata": {"name": "backup.tar", "size": 4500}}
+        assert bytes(MockHandler.uploads[max(MockHandler.uploads)]) == (
+            testfile.read_bytes()
+        )
+        assert not os.path.exists(f"{testfile}.pcloud-upload")
+
+    def test_write_data_error(self):
+        async def check(pc):
+            writer = BytesIO()
+            resp = await pc.connection.do_get_request(
+                "upload_info", json=False, uploadid=42, _data_writer=writer
+            )
+            return resp, writer.getvalue()
+
+        resp, data = self.run(check)
+        assert resp["result"] == 1900
+        assert data == b""
+
+    def test_pin(self):
+        async def check(pc):
+            shared = pc.connection.session
+            async with pc.pin():
+                pinned = pc.connection.session
+                assert pinned is not shared
+            assert pc.connection.session is shared
+            async with pc.pin():
+                # the connection of the pinned client is reused
+                assert pc.connection.session is pinned
+            await pc.connection.close()
+            return pinned.is_closed
+
+        assert self.run(check)
@@ -0,0 +1,499 @@
+#
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pcloud import api
+from pcloud.api import PyCloud
+from pcloud.binaryprotocol import PCloudBinaryConnection
+from pcloud.binaryprotocol import PCloudBinaryConnectionPool
+from pcloud.binaryprotocol import PCloudBinaryDecoder
+from pcloud.binaryprotocol import PCloudBuffer
+from pcloud.paralleldownload import ParallelDownload
+
+import io
+import pytest
+import tempfile
+import threading
+
+
+class DummyAPI(object):
+    endpoint = "https://binapi.pcloud.com/"
+    auth_token = "TOKEN"
+    access_token = ""
+
+
+def encode(value, strings=None):
+    """Minimal encoder for the binary response format used in tests"""
+    if strings is None:
+        strings = {}
+    if isinstance(value, bool):
+        return bytes([19 if value else 18])
+    if isinstance(value, int):
+        if value < 20:
+            return bytes([200 + value])
+        return bytes([15]) + value.to_bytes(8, "little")
+    if isinstance(value, str):
+        if value in strings:
+            return bytes([150 + strings[value]])
+        strings[value] = len(strings)
+        raw = value.encode("utf-8")
+        if len(raw) < 50:
+            return bytes([100 + len(raw)]) + raw
+        return bytes([3]) + len(raw).to_bytes(4, "little") + raw
+    if isinstance(value, dict):
+        result = bytes([16])
+        for key, val in value.items():
+            result += encode(key, strings) + encode(val, strings)
+        return result + bytes([255])
+    if isinstance(value, list):
+        result = bytes([17])
+        for val in value:
+            result += encode(val, strings)
+        return result + bytes([255])
+    raise ValueError(value)
+
+
+def frame(value):
+    encoded = encode(value)
+    return len(encoded).to_bytes(4, "little") + encoded
+
+
+class RecordingReader(BytesIO):
+    """Records how many bytes have been written when reading starts"""
+
+    def __init__(self, response, writer):
+        super().__init__(response)
+        self.writer = writer
+        self.written_before_read = None
+
+    def readinto(self, b):
+        if self.written_before_read is None:
+            self.written_before_read = len(self.writer.getvalue())
+        return super().readinto(b)
+
+
+def make_connection(response):
+    conn = PCloudBinaryConnection(DummyAPI())
+    writer = BytesIO()
+    conn.reader = RecordingReader(response, writer)
+    conn.fp = PCloudBuffer(conn.reader, writer, 8192)
+    return conn
+
+
+listing = {
+    "result": 0,
+    "metadata": {
+        "name": "/",
+        "isfolder": True,
+        "contents": [
+            {"name": "foo.txt", "size": 1234567, "isfolder": False},
+            {"name": "bär.txt", "size": 7, "isfolder": False},
+            {"name": "x" * 300, "size": 0, "isfolder": False},
+        ],
+    },
+}
+
+
+def test_decode_listing():
+    assert PCloudBinaryDecoder(encode(listing)).decode() == listing
+
+
+def data_frame(payload):
+    """Response of i.e. file_read with the payload as data"""
+    response = bytes([16, 106]) + b"result" + bytes([200, 104]) + b"data"
+    response += bytes([20]) + len(payload).to_bytes(8, "little") + bytes([255])
+    return len(response).to_bytes(4, "little") + response + payload
+
+
+def test_decode_data_payload():
+    conn = make_connection(data_frame(b"Hello"))
+    assert conn.get_result() == b"Hello"
+
+
+def test_decode_unknown_type():
+    with pytest.raises(ValueError):
+        PCloudBinaryDecoder(bytes([99])).decode()
+
+
+def test_get_result_consecutive():
+    conn = make_connection(frame({"result": 0}) + frame(listing))
+    assert conn.get_result() == {"result": 0}
+    assert conn.get_result() == listing
+
+
+class TimeoutSocket(object):
+    def __init__(self):
+        self.timeouts = []
+
+    def settimeout(self, timeout):
+        self.timeouts.append(timeout)
+
+    def close(self):
+        self.timeouts.append("closed")
+
+
+def test_request_timeout():
+    conn = make_connection(frame({"result": 0}))
+    conn.socket = TimeoutSocket()
+    resp = conn.do_get_request("diff", authenticate=False, block=1, _timeout=600)
+    assert resp == {"result": 0}
+    assert conn.socket.timeouts == [600, 30]
+    assert b"_timeout" not in conn.reader.writer.getvalue()
+
+
+def test_reconnect(monkeypatch):
+    conn = make_connection(frame({"result": 0}))
+    conn.socket = sock = TimeoutSocket()
+    monkeypatch.setattr(PCloudBinaryConnection, "connect", lambda self: self)
+    assert conn.reconnect() is conn
+    assert sock.timeouts == ["closed"]
+    assert conn.socket is None and conn.fp is None
+
+
+def test_auth(monkeypatch):
+    new = make_connection(frame({"result": 0}) * 2)
+
+    def connect(self):
+        self.fp = new.fp
+        return self
+
+    conn = make_connection(b"")
+    conn.socket = TimeoutSocket()
+    monkeypatch.setattr(PCloudBinaryConnection, "connect", connect)
+    conn.reconnect()
+    # the new socket hasn't logged in, the token is sent with the request
+    conn.do_get_request("stat", fileid=1)
+    conn.do_get_request("getdigest", authenticate=False)
+    assert new.reader.writer.getvalue().count(b"TOKEN") == 1
+
+
+def test_pipeline():
+    conn = make_connection(frame({"result": 0}) + frame({"result": 2009}))
+    pc = PyCloud.__new__(PyCloud)
+    pc.connection = conn
+    with pc.pipeline() as pipeline:
+        pipeline.stat(path="/foo.txt")
+        pipeline.deletefile(fileid=1)
+    assert pipeline.results == [{"result": 0}, {"result": 2009}]
+    # both requests are written before the first result is read
+    reader = conn.reader
+    assert reader.written_before_read == len(reader.writer.getvalue())
+
+
+def test_pipeline_window():
+    conn = make_connection(frame({"result": 0}) * 3)
+    commands = [("stat", True, True, None, {"fileid": i}) for i in range(3)]
+    assert conn.pipeline(commands, window=1) == [{"result": 0}] * 3
+    reader = conn.reader
+    assert reader.written_before_read < len(reader.writer.getvalue())
+
+
+def test_pipeline_too_long():
+    conn = make_connection(frame({"result": 0}))
+    commands = [
+        ("stat", True, True, None, {"fileid": 1}),
+        ("stat", True, True, None, {"path": "/" + "x" * 70000}),
+    ]
+    with pytest.raises(AssertionError):
+        conn.pipeline(commands)
+    # nothing is left in the buffer for the next request
+    conn.fp.flush()
+    assert conn.reader.writer.getvalue() == b""
+
+
+def test_pipeline_send_error(monkeypatch):
+    conn = make_connection(frame({"result": 0}))
+    reconnects = []
+    monkeypatch.setattr(conn, "reconnect", lambda: reconnects.append(conn))
+
+    def write(data):
+        raise BrokenPipeError("Broken pipe")
+
+    monkeypatch.setattr(conn.fp, "write", write)
+    with pytest.raises(BrokenPipeError):
+        conn.pipeline([("stat", True, True, None, {"fileid": 1})])
+    assert reconnects == [conn]
+
+
+class DummyConnection(object):
+    opened = 0
+
+    def __init__(self, api):
+        self.closed = False
+        self.params = []
+
+    def connect(self):
+        DummyConnection.opened += 1
+        return self
+
+    def do_get_request(self, method, authenticate=True, json=True, endpoint=None, **kw):
+        if method == "broken":
+            raise IOError("Connection reset")
+        self.params.append(kw)
+        return {"result": 0, "connection": self}
+
+    def upload(self, method, files, **kwargs):
+        return self.do_get_request(method, filename=files[0][1][0], **kwargs)
+
+    def close(self):
+        self.closed = True
+
+
+class DummyPool(PCloudBinaryConnectionPool):
+    connection_class = DummyConnection
+
+
+class TestConnectionPool(object):
+    def setup_method(self, method):
+        DummyConnection.opened = 0
+
+    def test_lazy_connect(self):
+        pool = DummyPool(DummyAPI(), size=2).connect()
+        assert DummyConnection.opened == 0
+        first = pool.do_get_request("stat", fileid=1)["connection"]
+        second = pool.do_get_request("stat", fileid=2)["connection"]
+        assert DummyConnection.opened == 1
+        assert first is second
+        assert first.params == [
+            {"fileid": 1, "auth": "TOKEN"},
+            {"fileid": 2, "auth": "TOKEN"},
+        ]
+
+    def test_no_auth(self):
+        pool = DummyPool(DummyAPI(), size=2)
+        conn = pool.do_get_request("getdigest", authenticate=False)["connection"]
+        assert conn.params == [{}]
+
+    def test_drop_broken(self):
+        pool = DummyPool(DummyAPI(), size=2)
+        conn = pool.do_get_request("stat", fileid=1)["connection"]
+        with pytest.raises(IOError):
+            pool.do_get_request("broken")
+        assert conn.closed
+        assert pool.do_get_request("stat", fileid=1)["connection"] is not conn
+
+    def test_threads(self):
+        pool = DummyPool(DummyAPI(), size=3)
+        barrier = threading.Barrier(3)
+
+        def worker(_):
+            with pool.checkout() as conn:
+                barrier.wait(timeout=5)
+                return conn
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            connections = set(executor.map(worker, range(3)))
+        assert len(connections) == 3
+        assert len(pool._idle) == 3
+
+    def test_parallel_upload(self, monkeypatch):
+        monkeypatch.setattr(api, "PCloudBinaryConnectionPool", DummyPool)
+        pc = PyCloud.__new__(PyCloud)
+        pc.connection = PCloudBinaryConnection(DummyAPI())
+        files = [f"/tmp/{i}.txt" for i in range(20)]
+        results = pc.uploadfile(files=files, folderid=0, workers=3)
+        connections = {resp["connection"] for resp in results}
+        assert 1 <= len(connections) <= 3
+        assert all(conn.closed for conn in connections)
+        params = [p for conn in connections for p in conn.params]
+        assert sorted(p["filename"] for p in params) == sorted(
+            f"{i}.txt" for i in range(20)
+        )
+        assert {p["folderid"] for p in params} == {"0"}
+
+    def test_parallel_download_pool(self):
+        pc = PyCloud.__new__(PyCloud)
+        pc.connection = conn = PCloudBinaryConnection(DummyAPI())
+        client = ParallelDownload(pc, "/tmp/foo.bin", workers=2)._client()
+        assert isinstance(client.connection, PCloudBinaryConnectionPool)
+        assert client.connection.size == 2
+        assert client.connection.api is client
+        assert pc.connection is conn
+
+    def test_pin(self):
+        pool = DummyPool(DummyAPI(), size=2)
+        with pool.pin() as pinned:
+            with pool.checkout() as other:
+                assert other is pinned
+            assert pool.do_get_request("stat", fileid=1)["connection"] is pinned
+
+    def test_noresult(self):
+        pool = DummyPool(DummyAPI(), size=1)
+        # the result would be read by the next borrower
+        with pytest.raises(ValueError):
+            pool.do_get_request("stat", fileid=1, _noresult=True)
+        assert DummyConnection.opened == 0
+        with pool.pin() as pinned:
+            resp = pool.do_get_request("stat", fileid=1, _noresult=True)
+            assert resp["connection"] is pinned
+
+
+class StreamPool(PCloudBinaryConnectionPool):
+    payload = bytes(range(256)) * 100
+
+    def _new_connection(self):
+        return make_connection(
+            data_frame(self.payload) + frame({"result": 2009}) + frame({"result": 0})
+        )
+
+
+class TestPoolStream(object):
+    def test_checked_out_until_read(self):
+        pool = StreamPool(DummyAPI(), size=1)
+        stream = pool.do_get_request("file_read", fd=1, count=25600, _stream=True)
+        assert not pool._idle
+        assert stream.read(10) == StreamPool.payload[:10]
+        # another thread can't get the connection before the stream is read
+        assert not pool._slots.acquire(blocking=False)
+        assert stream.read() == StreamPool.payload[10:]
+        assert len(pool._idle) == 1
+        assert pool.do_get_request("stat", fileid=1) == {"result": 2009}
+
+    def test_close(self):
+        pool = StreamPool(DummyAPI(), size=1)
+        stream = pool.do_get_request("file_read", fd=1, count=25600, _stream=True)
+        stream.close()
+        assert len(pool._idle) == 1
+        assert pool.do_get_request("stat", fileid=1) == {"result": 2009}
+
+    def test_no_data(self):
+        pool = StreamPool(DummyAPI(), size=1)
+        conn = make_connection(frame({"result": 2009}))
+        pool._idle.append(conn)
+        assert pool.do_get_request("file_read", fd=1, count=1, _stream=True) == {
+            "result": 2009
+        }
+        assert pool._idle == [conn]
+
+
+class TestSendData(object):
+    payload = bytes(range(256)) * 1000
+
+    def send(self, data, **kwargs):
+        conn = make_connection(b"")
+        chunks = []
+        conn.send_command_nb(
+            "uploadfile", {}, data=data, data_progress_callback=chunks.append, **kwargs
+        )
+        return conn.reader.writer.getvalue(), chunks
+
+    def test_bytes(self):
+        written, chunks = self.send(self.payload, data_chunk_size=100000)
+        assert written.endswith(self.payload)
+        assert chunks == [100000, 100000, 56000]
+
+    def test_bytesio(self):
+        data = BytesIO(b"skip" + self.payload)
+        data.seek(4)
+        written, chunks = self.send(data)
+        assert written.endswith(self.payload)
+        assert sum(chunks) == len(self.payload)
+        assert data.tell() == len(self.payload) + 4
+
+    def test_file(self, tmp_path):
+        testfile = tmp_path / "upload.bin"
+        testfile.write_bytes(b"skip" + self.payload)
+        with open(testfile, "rb") as data:
+            data.seek(4)
+            written, chunks = self.send(data, data_chunk_size=65536)
+            assert data.tell() == len(self.payload) + 4
+        assert written.endswith(self.payload)
+        assert chunks == [65536, 65536, 65536, 59392]
+
+    def test_spooled(self, monkeypatch):
+        data = tempfile.SpooledTemporaryFile(max_size=len(self.payload) + 4)
+        data.write(b"skip" + self.payload)
+        data.seek(4)
+        # fileno would write the spooled data to disk
+        monkeypatch.setattr(data, "fileno", lambda: pytest.fail("rolled over"))
+        written, chunks = self.send(data, data_chunk_size=65536)
+        assert written.endswith(self.payload)
+        assert chunks == [65536, 65536, 65536, 59392]
+
+    def test_stream(self):
+        class Stream(io.RawIOBase):
+            def __init__(self, data):
+                self.data = BytesIO(data)
+
+            def readable(self):
+                return True
+
+            def readinto(self, b):
+                # return at most 1000 bytes per call
+                return self.data.readinto(memoryview(b)[:1000])
+
+        written, chunks = self.send(
+            Stream(self.payload), data_len=len(self.payload), data_chunk_size=4096
+        )
+        assert written.endswith(self.payload)
+        assert sum(chunks) == len(self.payload)
+
+    def test_stream_too_short(self):
+        with pytest.raises(IOError):
+            self.send(BytesIO(b"short"), data_len=10)
+
+
+class TestDataStream(object):
+    payload = bytes(range(256)) * 1000
+
+    def test_read(self):
+        conn = make_connection(data_frame(self.payload))
+        stream = conn.do_get_request("file_read", fd=1, count=256000, _stream=True)
+        assert stream.size == 256000
+        assert stream.read(10) == self.payload[:10]
+        buf = bytearray(100)
+        assert stream.readinto(buf) == 100
+        assert buf == self.payload[10:110]
+        assert stream.read() == self.payload[110:]
+        assert stream.read() == b""
+
+    def test_iter(self):
+        conn = make_connection(data_frame(self.payload))
+        stream = conn.do_get_request("file_read", fd=1, count=256000, _stream=True)
+        chunks = list(stream)
+        assert [len(chunk) for chunk in chunks] == [65536, 65536, 65536, 59392]
+        assert b"".join(chunks) == self.payload
+
+    def test_drain_before_next_command(self):
+        conn = make_connection(data_frame(self.payload) + frame({"result": 0}))
+        stream = conn.do_get_request("file_read", fd=1, count=256000, _stream=True)
+        assert stream.read(10) == self.payload[:10]
+        assert conn.do_get_request("file_close", fd=1) == {"result": 0}
+        assert stream.read() == b""
+
+    def test_writer(self):
+        conn = make_connection(data_frame(self.payload) + frame({"result": 0}))
+        writer = BytesIO()
+        chunks = []
+        assert conn.do_get_request(
+            "file_read",
+            fd=1,
+            count=256000,
+            _data_writer=writer,
+            _data_progress_callback=chunks.append,
+        ) == {"result": 0, "data": 256000}
+        assert writer.getvalue() == self.payload
+        assert sum(chunks) == 256000
+        assert conn.do_get_request("file_close", fd=1) == {"result": 0}
+
+    def test_file_read_writer(self):
+        pc = PyCloud.__new__(PyCloud)
+        pc.connection = make_connection(data_frame(self.payload))
+        writer = BytesIO()
+        assert pc.file_read(fd=1, count=256000, writer=writer)["data"] == 256000
+        assert writer.getvalue() == self.payload
+
+    def test_file_read_stream(self):
+        pc = PyCloud.__new__(PyCloud)
+        pc.connection = make_connection(data_frame(self.payload))
+        progress = []
+        stream = pc.file_read(
+            fd=1,
+            count=256000,
+            stream=True,
+            chunk_size=100000,
+            progress_callback=progress.append,
+        )
+        chunks = list(stream)
+        assert [len(chunk) for chunk in chunks] == [100000, 100000, 56000]
+        assert b"".join(chunks) == self.payload
+        assert sum(progress) == 256000
@@ -0,0 +1,138 @@
+#
+from pcloud.api import O_TRUNC
+from pcloud.api import O_WRITE
+from pcloud.api import PyCloud
+from pcloud.cache import MetadataCache
+
+import pytest
+
+
+class RecordingConnection(object):
+    """Answers stat and listfolder with canned metadata"""
+
+    def __init__(self):
+        self.calls = []
+
+    def do_get_request(self, method, authenticate=True, json=True, endpoint=None, **kw):
+        self.calls.append(method)
+        if method == "listfolder":
+            contents = [
+                {
+                    "name": "foo.txt",
+                    "fileid": 11,
+                    "parentfolderid": 1,
+                    "isfolder": False,
+                },
+                {"name": "sub", "folderid": 2, "parentfolderid": 1, "isfolder": True},
+            ]
+            if kw.get("recursive"):
+                contents[1]["contents"] = []
+            metadata = {"path": "/docs", "folderid": 1, "parentfolderid": 0}
+            return {"result": 0, "metadata": dict(metadata, contents=contents)}
+        elif method == "stat":
+            return {"result": 0, "metadata": {"fileid": 11, "parentfolderid": 1}}
+        elif method == "deletefile":
+            return {"result": 0, "metadata": {"fileid": 12, "parentfolderid": 2}}
+        return {"result": 2009, "error": "File not found."}
+
+
+@pytest.fixture
+def pc():
+    pc = PyCloud.__new__(PyCloud)
+    pc.connection = RecordingConnection()
+    pc.cache = MetadataCache()
+    return pc
+
+
+def test_hit(pc):
+    assert pc.stat(path="/docs/foo.txt") == pc.stat(path="/docs/foo.txt")
+    assert pc.connection.calls == ["stat"]
+    assert (pc.cache.hits, pc.cache.misses) == (1, 1)
+
+
+def test_copy(pc):
+    pc.stat(path="/docs/foo.txt")["metadata"]["fileid"] = 99
+    assert pc.stat(path="/docs/foo.txt")["metadata"]["fileid"] == 11
+
+
+def test_errors_not_cached(pc):
+    pc.checksumfile(fileid=1)
+    pc.checksumfile(fileid=1)
+    assert pc.connection.calls == ["checksumfile", "checksumfile"]
+
+
+def test_ttl(pc, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("pcloud.cache.time.monotonic", lambda: now[0])
+    pc.cache.ttl = 10
+    pc.stat(fileid=11)
+    now[0] += 11
+    pc.stat(fileid=11)
+    assert pc.connection.calls == ["stat", "stat"]
+
+
+def test_lru(pc):
+    pc.cache.maxsize = 2
+    pc.stat(fileid=1)
+    pc.stat(fileid=2)
+    pc.stat(fileid=1)
+    pc.stat(fileid=3)
+    assert len(pc.cache) == 2
+    pc.stat(fileid=1)
+    assert pc.cache.hits == 2
+    pc.stat(fileid=2)
+    assert pc.connection.calls.count("stat") == 4
+
+
+@pytest.mark.parametrize(
+    "method, params, invalidated",
+    [
+        # without response only the listing of the path is known
+        ("deletefile", {"path": "/docs/foo.txt"}, ["listfolder"]),
+        ("deletefile", {"fileid": 11}, ["stat"]),
+        ("createfolder", {"path": "/docs/new"}, ["listfolder"]),
+        ("createfolder", {"path": "/other/new"}, []),
+        ("createfolder", {"folderid": 1, "name": "new"}, ["listfolder", "stat"]),
+        ("renamefile", {"fileid": 5, "topath": "/docs/bar.txt"}, ["listfolder"]),
+        ("copypubfile", {"code": "abc", "topath": "/docs/bar.txt"}, ["listfolder"]),
+        ("file_write", {"fd": 1}, ["listfolder", "stat"]),
+        ("file_open", {"path": "/docs/foo.txt", "flags": 0}, []),
+        ("file_open", {"fileid": 11, "flags": 0}, []),
+        ("file_open", {"fileid": 11, "flags": O_WRITE | O_TRUNC}, ["stat"]),
+        ("userinfo", {}, []),
+    ],
+)
+def test_invalidate(pc, method, params, invalidated):
+    pc.listfolder(path="/docs")
+    pc.stat(fileid=11)
+    pc.cache.invalidate(method, params)
+    pc.listfolder(path="/docs")
+    pc.stat(fileid=11)
+    assert pc.connection.calls[2:] == invalidated
+
+
+def test_invalidate_by_response(pc):
+    pc.listfolder(path="/docs")
+    pc.listfolder(folderid=0, recursive=1)
+    # the deleted file was in the subfolder of the recursive listing
+    pc.deletefile(path="/elsewhere/bar.txt")
+    pc.listfolder(path="/docs")
+    pc.listfolder(folderid=0, recursive=1)
+    assert pc.connection.calls == ["listfolder"] * 2 + ["deletefile", "listfolder"]
+
+
+def test_invalidate_pipeline(pc):
+    pc.stat(fileid=11)
+    pc.connection.pipeline = lambda commands: [{"result": 0}]
+    with pc.pipeline() as pipeline:
+        pipeline.deletefile(fileid=11)
+    pc.stat(fileid=11)
+    assert pc.connection.calls == ["stat", "stat"]
+
+
+def test_no_cache():
+    pc = PyCloud.__new__(PyCloud)
+    pc.connection = RecordingConnection()
+    pc.stat(fileid=11)
+    pc.stat(fileid=11)
+    assert pc.connection.calls == ["stat", "stat"]
@@ -0,0 +1,95 @@
+#
+from pcloud.api import PyCloud
+from pcloud.endpointselector import EndpointSelector
+
+import httpx
+import json
+import pytest
+
+LATENCIES = {
+    "api1.pcloud.com": 0.05,
+    "api2.pcloud.com": 0.01,
+    "api.pcloud.com": 0.03,
+    "binapi1.pcloud.com": 0.02,
+    "binapi.pcloud.com": None,
+}
+
+
+class ApiServerResponse(object):
+    def json(self):
+        return {
+            "result": 0,
+            "api": ["api1.pcloud.com", "api2.pcloud.com"],
+            "binapi": ["binapi1.pcloud.com"],
+        }
+
+
+@pytest.fixture
+def probes(monkeypatch):
+    probes = []
+
+    def probe(self, host, port=443):
+        probes.append(host)
+        return LATENCIES.get(host)
+
+    monkeypatch.setattr(EndpointSelector, "probe", probe)
+    monkeypatch.setattr(
+        "pcloud.endpointselector.httpx.get", lambda url, **kw: ApiServerResponse()
+    )
+    return probes
+
+
+def test_select(probes):
+    selector = EndpointSelector()
+    assert selector.candidates() == [
+        "api1.pcloud.com",
+        "api2.pcloud.com",
+        "api.pcloud.com",
+    ]
+    assert selector.select() == "https://api2.pcloud.com/"
+    assert selector.select(binary=True) == "https://binapi1.pcloud.com/"
+    assert selector.select() == "https://api2.pcloud.com/"
+    assert len(probes) == 5
+
+
+def test_cache_file(probes, tmp_path):
+    cache_file = tmp_path / "endpoints.json"
+    assert EndpointSelector(cache_file=cache_file).select() == (
+        "https://api2.pcloud.com/"
+    )
+    assert EndpointSelector(cache_file=cache_file).select() == (
+        "https://api2.pcloud.com/"
+    )
+    assert len(probes) == 3
+    with open(cache_file) as f:
+        cache = json.load(f)
+    assert cache["https://api.pcloud.com/ api"][0] == "https://api2.pcloud.com/"
+
+
+def test_expired(probes, tmp_path):
+    cache_file = tmp_path / "endpoints.json"
+    with open(cache_file, "w") as f:
+        json.dump({"https://api.pcloud.com/ api": ["https://api1.pcloud.com/", 0]}, f)
+    assert EndpointSelector(cache_file=cache_file).select() == (
+        "https://api2.pcloud.com/"
+    )
+
+
+def test_unreachable(probes, monkeypatch):
+    def get(url, **kw):
+        raise httpx.ConnectError("offline")
+
+    monkeypatch.setattr("pcloud.endpointselector.httpx.get", get)
+    selector = EndpointSelector("https://eapi.pcloud.com/")
+    assert selector.candidates(binary=True) == ["bineapi.pcloud.com"]
+    # the default is used, but not remembered
+    assert selector.select(binary=True) == "https://bineapi.pcloud.com/"
+    selector.select(binary=True)
+    assert probes == ["bineapi.pcloud.com"] * 2
+
+
+def test_nearest(probes):
+    pc = PyCloud("", "", endpoint="binnearest", lazy=True)
+    assert pc.getnearestendpoint() == "https://binapi1.pcloud.com/"
+    pc = PyCloud("", "", endpoint="nearest", lazy=True)
+    assert pc.getnearestendpoint() == "https://api2.pcloud.com/"
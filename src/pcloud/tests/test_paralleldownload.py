@@ -0,0 +1,98 @@
+#
+from pcloud.asyncapi import AsyncPyCloud
+from pcloud.paralleldownload import ParallelDownload
+from pcloud.paralleldownload import ParallelDownloadError
+from pcloud.tests.server import MockHandler
+from pcloud.tests.test_api import DummyPyCloud
+
+import asyncio
+import os
+import pytest
+import threading
+
+
+@pytest.fixture
+def pc():
+    content = bytes(range(256)) * 100
+    MockHandler.files["/big.bin"] = content
+    yield DummyPyCloud("foo", "bar")
+    del MockHandler.files["/big.bin"]
+
+
+@pytest.mark.usefixtures("start_mock_server")
+class TestParallelDownload(object):
+    def test_download(self, pc, tmp_path):
+        destination = tmp_path / "big.bin"
+        progress = []
+        metadata = pc.parallel_download(
+            destination,
+            path="/big.bin",
+            chunk_size=1000,
+            workers=3,
+            progress_callback=progress.append,
+        )
+        assert metadata == {"size": 25600}
+        assert destination.read_bytes() == MockHandler.files["/big.bin"]
+        assert sum(progress) == 25600
+
+    def test_connection_per_worker(self, monkeypatch, pc, tmp_path):
+        opened = {}
+        file_open = pc.file_open
+
+        def record_open(**kwargs):
+            resp = file_open(**kwargs)
+            opened[resp["fd"]] = (threading.get_ident(), pc.connection.session)
+            return resp
+
+        monkeypatch.setattr(pc, "file_open", record_open)
+        pc.parallel_download(
+            tmp_path / "big.bin", path="/big.bin", chunk_size=1000, workers=3
+        )
+        assert len(opened) == 3
+        assert len({thread for thread, session in opened.values()}) == 3
+        assert len({session for thread, session in opened.values()}) == 3
+
+    def test_small_file(self, pc, tmp_path):
+        destination = tmp_path / "big.bin"
+        pc.parallel_download(destination, path="/big.bin", workers=4)
+        assert destination.read_bytes() == MockHandler.files["/big.bin"]
+
+    def test_empty_file(self, pc, tmp_path):
+        MockHandler.files["/big.bin"] = b""
+        destination = tmp_path / "big.bin"
+        assert pc.parallel_download(destination, path="/big.bin") == {"size": 0}
+        assert destination.read_bytes() == b""
+
+    def test_error(self, monkeypatch, pc, tmp_path):
+        monkeypatch.setattr(pc, "file_pread", lambda **kw: {"result": 1007})
+        destination = tmp_path / "big.bin"
+        with pytest.raises(ParallelDownloadError):
+            pc.parallel_download(destination, path="/big.bin", chunk_size=1000)
+        assert not os.path.exists(destination)
+
+    def test_open_error(self, monkeypatch, pc, tmp_path):
+        monkeypatch.setattr(pc, "file_open", lambda **kw: {"result": 2009})
+        download = ParallelDownload(pc, tmp_path / "big.bin", chunk_size=1000)
+        with pytest.raises(ParallelDownloadError):
+            download.download(path="/big.bin")
+        # the other workers stop as well
+        assert download._failed.is_set()
+
+    @pytest.mark.usefixtures("pc")
+    def test_async(self, tmp_path):
+        destination = tmp_path / "big.bin"
+        progress = []
+
+        async def main():
+            async with AsyncPyCloud("foo", "bar", endpoint="test") as pc:
+                return await pc.parallel_download(
+                    destination,
+                    path="/big.bin",
+                    chunk_size=1000,
+                    workers=3,
+                    progress_callback=progress.append,
+                )
+
+        assert asyncio.run(main()) == {"size": 25600}
+        assert destination.read_bytes() == MockHandler.files["/big.bin"]
+        assert sum(progress) == 25600
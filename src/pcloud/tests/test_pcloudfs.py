@@ -0,0 +1,361 @@
+#
+from fs import errors
+from pcloud.api import PyCloud
+from pcloud.binaryprotocol import PCloudBinaryConnection
+from pcloud.pcloudfs import PCloudFile
+from pcloud.pcloudfs import PCloudFS
+from pcloud.rangedreader import RangedReader
+from pcloud.tests.test_binaryprotocol import DummyAPI
+from pcloud.tests.test_binaryprotocol import TimeoutSocket
+from pcloud.tests.test_binaryprotocol import data_frame
+from pcloud.tests.test_binaryprotocol import frame
+from pcloud.tests.test_binaryprotocol import make_connection
+
+import contextlib
+import copy
+import httpx
+import os
+import posixpath
+import pytest
+import socket
+import tempfile
+
+MODIFIED = "Thu, 05 Oct 2023 12:03:12 +0000"
+
+
+class FakePyCloud(object):
+    """Keeps a tree of folder and file metadata and records the calls"""
+
+    connection = None
+
+    def __init__(self, username, password, endpoint, **kwargs):
+        self.calls = []
+        self.failing_recursive = False
+        self.broken_connection = False
+        self.data = {}
+        self.fds = {}
+        self.items = {"/": self.folder("", 0)}
+        self.nextid = 1
+
+    def folder(self, name, folderid):
+        return {
+            "name": name,
+            "isfolder": True,
+            "folderid": folderid,
+            "modified": MODIFIED,
+            "created": MODIFIED,
+            "contents": [],
+        }
+
+    def add(self, path, size=None, data=None):
+        if data is not None:
+            self.data[self.nextid] = data
+            size = len(data)
+        parent = self.items[posixpath.dirname(path)]
+        name = posixpath.basename(path)
+        if size is None:
+            metadata = self.folder(name, self.nextid)
+        else:
+            metadata = {
+                "name": name,
+                "isfolder": False,
+                "fileid": self.nextid,
+                "size": size,
+                "modified": MODIFIED,
+                "created": MODIFIED,
+            }
+        self.nextid += 1
+        parent["contents"].append(metadata)
+        self.items[path] = metadata
+
+    def _metadata(self, metadata):
+        return {k: v for k, v in metadata.items() if k != "contents"}
+
+    def stat(self, path):
+        self.calls.append(("stat", path))
+        if path not in self.items:
+            return {"result": 2009, "error": "File or folder not found."}
+        return {"result": 0, "metadata": self._metadata(self.items[path])}
+
+    def file_open(self, flags, path=None, fileid=None):
+        self.calls.append(("file_open", path or fileid))
+        if fileid is None:
+            fileid = self.items[path]["fileid"]
+        fd = len(self.fds) + 1
+        self.fds[fd] = fileid
+        return {"result": 0, "fd": fd, "fileid": fileid}
+
+    def file_size(self, fd):
+        self.calls.append(("file_size", fd))
+        return {"result": 0, "size": len(self.data[self.fds[fd]])}
+
+    def file_pread(self, fd, offset, count, writer):
+        self.calls.append(("file_pread", offset, count))
+        if self.broken_connection:
+            self.broken_connection = False
+            self.fds.clear()
+            raise ConnectionResetError("Connection reset by peer")
+        if fd not in self.fds:
+            return {"result": 1007, "error": "Invalid or closed file descriptor."}
+        data = self.data[self.fds[fd]][offset : offset + count]
+        writer.write(data)
+        return {"result": 0, "data": len(data)}
+
+    def file_close(self, fd):
+        self.calls.append(("file_close", fd))
+        self.fds.pop(fd, None)
+        return {"result": 0}
+
+    def file_read(self, fd, count, writer):
+        self.calls.append(("file_read", count))
+        writer.write(self.data[self.fds[fd]][:count])
+        return {"result": 0}
+
+    def pin(self):
+        return contextlib.nullcontext()
+
+    def uploadfile(self, path, data, filename):
+        self.calls.append(("uploadfile", path, filename))
+        self.uploaded = data
+        self.add(posixpath.join(path, posixpath.basename(filename)), data=data.read())
+        return {"result": 0}
+
+    def listfolder(self, path=None, folderid=None, recursive=False, _timeout=None):
+        self.calls.append(("listfolder", path or folderid))
+        if self.failing_recursive and recursive:
+            raise self.failing_recursive("too large")
+        if folderid is not None:
+            path = {m.get("folderid"): p for p, m in self.items.items()}.get(folderid)
+        metadata = self.items.get(path)
+        if metadata is None or not metadata["isfolder"]:
+            return {"result": 2005, "error": "Directory does not exist."}
+        if recursive:
+            return {"result": 0, "metadata": copy.deepcopy(metadata)}
+        contents = [self._metadata(item) for item in metadata["contents"]]
+        return {"result": 0, "metadata": dict(metadata, contents=contents)}
+
+
+class FakePCloudFS(PCloudFS):
+    factory = FakePyCloud
+
+
+@pytest.fixture
+def pcfs():
+    pcfs = FakePCloudFS("foo", "bar")
+    for i in range(5):
+        pcfs.pcloud.add(f"/file{i}.txt", size=i)
+    pcfs.pcloud.add("/sub")
+    return pcfs
+
+
+def test_scandir(pcfs):
+    infos = list(pcfs.scandir("/", namespaces=["details"]))
+    assert [info.name for info in infos] == [f"file{i}.txt" for i in range(5)] + ["sub"]
+    assert [info.size for info in infos[:5]] == list(range(5))
+    assert infos[-1].is_dir
+    assert infos[0].modified.year == 2023
+    assert pcfs.pcloud.calls == [("listfolder", "/")]
+
+
+def test_scandir_page(pcfs):
+    infos = pcfs.scandir("/", page=(1, 3))
+    assert [info.name for info in infos] == ["file1.txt", "file2.txt"]
+    assert len(pcfs.pcloud.calls) == 1
+
+
+def test_scandir_errors(pcfs):
+    with pytest.raises(errors.ResourceNotFound):
+        pcfs.scandir("/missing")
+    with pytest.raises(errors.DirectoryExpected):
+        pcfs.scandir("/file1.txt")
+
+
+def test_listdir(pcfs):
+    assert pcfs.listdir("/sub") == []
+    assert pcfs.pcloud.calls == [("listfolder", "/sub")]
+
+
+@pytest.fixture
+def tree(pcfs):
+    for path in ("/sub/a", "/sub/a/deep", "/sub/b"):
+        pcfs.pcloud.add(path)
+    pcfs.pcloud.add("/sub/a/deep/x.txt", size=1)
+    pcfs.pcloud.add("/sub/b/y.txt", size=2)
+    return pcfs
+
+
+def walk(pcfs, path="/", **kwargs):
+    return [
+        (step.path, sorted(i.name for i in step.dirs), [i.name for i in step.files])
+        for step in pcfs.walk(path, **kwargs)
+    ]
+
+
+def test_walk(tree):
+    steps = walk(tree, "/sub")
+    assert steps == [
+        ("/sub", ["a", "b"], []),
+        ("/sub/a", ["deep"], []),
+        ("/sub/b", [], ["y.txt"]),
+        ("/sub/a/deep", [], ["x.txt"]),
+    ]
+    assert tree.pcloud.calls == [("listfolder", "/sub")]
+    assert sorted(tree.walk.files("/sub")) == ["/sub/a/deep/x.txt", "/sub/b/y.txt"]
+
+
+def test_walk_levels(tree):
+    expected = walk(tree, "/sub")
+    tree.pcloud.calls = []
+    tree.pcloud.failing_recursive = httpx.ReadTimeout
+    assert walk(tree, "/sub") == expected
+    # the recursive listing, the folder and its two levels of subfolders
+    assert len(tree.pcloud.calls) == 5
+
+
+class ReconnectingConnection(PCloudBinaryConnection):
+    reconnects = 0
+
+    def reconnect(self):
+        self.reconnects += 1
+        return self
+
+
+def test_walk_binary_timeout(tree):
+    expected = walk(tree, "/sub")
+    tree.pcloud.connection = ReconnectingConnection(DummyAPI())
+    tree.pcloud.failing_recursive = socket.timeout
+    assert walk(tree, "/sub") == expected
+    # the response of the recursive listing must not be read by the next call
+    assert tree.pcloud.connection.reconnects == 1
+
+
+def test_walk_max_depth(tree):
+    steps = walk(tree, "/sub", max_depth=2)
+    assert [path for path, _, _ in steps] == ["/sub", "/sub/a", "/sub/b"]
+    assert [call[0] for call in tree.pcloud.calls] == ["listfolder"] * 3
+
+
+def test_walk_subfs(tree):
+    subfs = tree.opendir("/sub")
+    assert walk(subfs, "/a") == [("/a", ["deep"], []), ("/a/deep", [], ["x.txt"])]
+    assert tree.pcloud.calls[-1] == ("listfolder", "/sub/a")
+
+
+@pytest.fixture
+def bigfile(pcfs):
+    pcfs.pcloud.add("/big.bin", data=bytes(range(256)) * 64)
+    pcfs.pcloud.calls = []
+    return pcfs
+
+
+def test_open_read(bigfile):
+    with bigfile.openbin("/big.bin", buffering=100) as f:
+        assert f.read(4) == bytes(range(4))
+        f.seek(-2, os.SEEK_END)
+        assert f.read() == bytes([254, 255])
+        f.seek(300)
+        buf = bytearray(10)
+        assert f.readinto(buf) == 10
+        assert buf == bytes(range(44, 54))
+    preads = [call for call in bigfile.pcloud.calls if call[0] == "file_pread"]
+    # only the read ahead of the buffer is fetched, not the whole file
+    assert preads == [
+        ("file_pread", 0, 100),
+        ("file_pread", 16382, 2),
+        ("file_pread", 300, 100),
+    ]
+    assert bigfile.pcloud.calls[-1][0] == "file_close"
+    assert not bigfile.pcloud.fds
+
+
+def test_ranged_reader_reopen(bigfile):
+    reader = RangedReader(
+        bigfile.pcloud, fileid=bigfile.pcloud.items["/big.bin"]["fileid"]
+    )
+    assert reader.size == 256 * 64
+    # the descriptor got lost with the connection
+    bigfile.pcloud.fds.clear()
+    reader.seek(256)
+    assert reader.read(3) == bytes(range(3))
+    assert reader.read(0) == b""
+    reader.seek(0, os.SEEK_END)
+    assert reader.read(3) == b""
+    reader.close()
+    assert [call[0] for call in bigfile.pcloud.calls].count("file_open") == 2
+
+
+def test_ranged_reader_reconnect(bigfile):
+    reader = RangedReader(
+        bigfile.pcloud, fileid=bigfile.pcloud.items["/big.bin"]["fileid"]
+    )
+    # pretend the file has a binary connection of its own
+    reader._own_connection = True
+    reader.api.connection = ReconnectingConnection(DummyAPI())
+    reader.api.connection.close = lambda: None
+    bigfile.pcloud.broken_connection = True
+    assert reader.read(3) == bytes(range(3))
+    assert reader.api.connection.reconnects == 1
+    reader.close()
+    assert [call[0] for call in bigfile.pcloud.calls].count("file_open") == 2
+
+
+def test_ranged_reader_auth(monkeypatch):
+    responses = frame({"result": 0, "fd": 1, "fileid": 5}) + data_frame(b"abc")
+    sockets = []
+
+    def connect(self):
+        sockets.append(make_connection(responses + frame({"result": 0})))
+        self.socket, self.fp = TimeoutSocket(), sockets[-1].fp
+        return self
+
+    monkeypatch.setattr(PCloudBinaryConnection, "connect", connect)
+    pc = PyCloud.__new__(PyCloud)
+    pc.endpoint = DummyAPI.endpoint
+    pc.auth_token = "TOKEN"
+    pc.connection = PCloudBinaryConnection(pc)
+    with RangedReader(pc, size=3, fileid=5) as reader:
+        assert reader.read(3) == b"abc"
+    # the connection of the file never logged in
+    assert sockets[-1].reader.writer.getvalue().count(b"TOKEN") == 3
+
+
+def test_ranged_reader_error(bigfile, monkeypatch):
+    reader = RangedReader(bigfile.pcloud, path="/big.bin")
+    error = {"result": 5000, "error": "Internal error. Try again later."}
+    monkeypatch.setattr(bigfile.pcloud, "file_pread", lambda **kw: error)
+    with pytest.raises(OSError):
+        reader.read(3)
+
+
+# in memory and rolled over to disk
+@pytest.mark.parametrize("size", [10, 100])
+def test_write_spooled(pcfs, monkeypatch, size):
+    monkeypatch.setattr(PCloudFile, "spool_size", 50)
+    with pcfs.openbin("/new.bin", "w") as f:
+        f.write(b"x" * size)
+    assert pcfs.pcloud.calls[-1] == ("uploadfile", "/", "/new.bin")
+    # the spooled data is streamed, not read into bytes
+    assert isinstance(pcfs.pcloud.uploaded, tempfile.SpooledTemporaryFile)
+    assert pcfs.pcloud.uploaded.closed
+    assert pcfs.pcloud.data[pcfs.pcloud.items["/new.bin"]["fileid"]] == b"x" * size
+
+
+def test_write_upload_error(pcfs, monkeypatch):
+    def uploadfile(**kwargs):
+        pcfs.pcloud.uploaded = kwargs["data"]
+        raise httpx.ConnectError("offline")
+
+    monkeypatch.setattr(pcfs.pcloud, "uploadfile", uploadfile)
+    f = pcfs.openbin("/new.bin", "w")
+    f.write(b"x")
+    with pytest.raises(httpx.ConnectError):
+        f.close()
+    assert pcfs.pcloud.uploaded.closed
+
+
+def test_append(pcfs):
+    pcfs.pcloud.add("/log.txt", data=b"old\n")
+    with pcfs.openbin("/log.txt", "a") as f:
+        f.write(b"new\n")
+    data = pcfs.pcloud.data[pcfs.pcloud.items["/log.txt"]["fileid"]]
+    assert data == b"old\nnew\n"
@@ -0,0 +1,148 @@
+#
+from pcloud.api import O_CREAT
+from pcloud.api import O_EXCL
+from pcloud.api import O_TRUNC
+from pcloud.api import O_WRITE
+from pcloud.api import PyCloud
+from pcloud.resolver import PathResolver
+
+import pytest
+
+
+class RecordingConnection(object):
+    """Answers with metadata of a small tree and records the parameters"""
+
+    def __init__(self):
+        self.calls = []
+
+    def do_get_request(self, method, authenticate=True, json=True, endpoint=None, **kw):
+        self.calls.append((method, kw))
+        if method == "listfolder":
+            contents = [
+                {"name": "foo.txt", "fileid": 11, "isfolder": False},
+                {"name": "sub", "folderid": 2, "isfolder": True},
+            ]
+            metadata = {"name": "docs", "folderid": 1, "isfolder": True}
+            return {"result": 0, "metadata": dict(metadata, contents=contents)}
+        elif method == "stat":
+            return {"result": 0, "metadata": {"fileid": 11, "isfolder": False}}
+        elif method == "file_open":
+            return {"result": 0, "fd": 1, "fileid": 12}
+        return {"result": 0, "metadata": {"folderid": 3, "isfolder": True}}
+
+    def upload(self, method, files, **kwargs):
+        self.calls.append((method, kwargs))
+        metadata = [{"name": name, "fileid": 13} for _, (name, _) in files]
+        return {"result": 0, "metadata": metadata}
+
+
+@pytest.fixture
+def pc():
+    pc = PyCloud.__new__(PyCloud)
+    pc.connection = RecordingConnection()
+    pc.resolver = PathResolver()
+    return pc
+
+
+def test_stat(pc):
+    pc.stat(path="/docs/foo.txt")
+    pc.stat(path="/docs/foo.txt")
+    assert pc.connection.calls[1] == ("stat", {"fileid": 11})
+    assert pc.resolver.hits == 1
+
+
+def test_listfolder(pc):
+    pc.listfolder(path="/")
+    pc.listfolder(path="/docs")
+    pc.stat(path="/docs/foo.txt")
+    pc.listfolder(path="/docs/sub")
+    assert [params for _, params in pc.connection.calls] == [
+        {"folderid": 0},
+        {"path": "/docs"},
+        {"fileid": 11},
+        {"folderid": 2},
+    ]
+
+
+def test_kind(pc):
+    pc.listfolder(path="/docs")
+    pc.stat(path="/docs/sub")
+    pc.listfolder(path="/docs/foo.txt")
+    assert pc.connection.calls[1:] == [
+        ("stat", {"path": "/docs/sub"}),
+        ("listfolder", {"path": "/docs/foo.txt"}),
+    ]
+
+
+def test_createfolder(pc):
+    pc.listfolder(path="/docs")
+    pc.createfolder(path="/docs/sub/new")
+    pc.listfolder(path="/docs/sub/new")
+    assert pc.connection.calls[1:] == [
+        ("createfolder", {"folderid": 2, "name": "new"}),
+        ("listfolder", {"folderid": 3}),
+    ]
+
+
+@pytest.mark.parametrize(
+    "method, params",
+    [
+        ("deletefile", {"fileid": 11}),
+        ("renamefolder", {"path": "/docs"}),
+        ("renamefolder", {"folderid": 1, "toname": "other"}),
+        # the contents of unknown folders aren't known
+        ("deletefolderrecursive", {"folderid": 99}),
+        ("copyfile", {"fileid": 5, "topath": "/docs/foo.txt"}),
+    ],
+)
+def test_forget(pc, method, params):
+    pc.listfolder(path="/docs")
+    getattr(pc, method)(**params)
+    pc.stat(path="/docs/foo.txt")
+    assert pc.connection.calls[-1] == ("stat", {"path": "/docs/foo.txt"})
+
+
+def test_forget_sibling(pc):
+    pc.listfolder(path="/docs")
+    pc.deletefolder(path="/docs/sub")
+    pc.stat(path="/docs/foo.txt")
+    assert pc.connection.calls[-1] == ("stat", {"fileid": 11})
+
+
+def test_error(pc):
+    pc.stat(path="/docs/foo.txt")
+    # the file was deleted by another client
+    pc.connection.do_get_request = lambda *args, **kw: {"result": 2009}
+    pc.stat(path="/docs/foo.txt")
+    assert pc.resolver.lookup("/docs/foo.txt") is None
+
+
+def test_ttl(pc, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("pcloud.resolver.time.monotonic", lambda: now[0])
+    pc.resolver.ttl = 10
+    pc.stat(path="/docs/foo.txt")
+    now[0] += 11
+    pc.stat(path="/docs/foo.txt")
+    assert pc.connection.calls[1] == ("stat", {"path": "/docs/foo.txt"})
+    assert len(pc.resolver) == 1
+
+
+def test_file_open(pc):
+    pc.file_open(path="/docs/new.txt", flags=O_CREAT | O_EXCL)
+    pc.file_open(path="/docs/new.txt", flags=O_WRITE | O_TRUNC)
+    pc.file_open(path="/docs/new.txt", flags=0)
+    calls = [params for _, params in pc.connection.calls]
+    # writes keep the path, which might refer to another file by now
+    assert [params.get("path") for params in calls] == ["/docs/new.txt"] * 2 + [None]
+    assert calls[2]["fileid"] == 12
+
+
+def test_uploadfile(pc):
+    pc.listfolder(path="/docs")
+    pc.uploadfile(data=b"x", filename="up.txt", path="/docs/sub")
+    pc.stat(path="/docs/sub/up.txt")
+    assert pc.connection.calls[1:] == [
+        ("uploadfile", {"path": "/docs/sub"}),
+        ("stat", {"fileid": 13}),
+    ]
@@ -0,0 +1,128 @@
+#
+from pcloud.binaryprotocol import PCloudBinaryConnection
+from pcloud.resumableupload import ResumableUpload
+from pcloud.resumableupload import ResumableUploadError
+from pcloud.tests.server import MockHandler
+from pcloud.tests.test_api import DummyPyCloud
+
+import httpx
+import os
+import pytest
+
+
+class Crash(Exception):
+    """Simulates the process dying during the upload"""
+
+
+@pytest.fixture
+def testfile(tmp_path):
+    path = tmp_path / "backup.tar"
+    path.write_bytes(b"0123456789" * 450)
+    return path
+
+
+@pytest.fixture
+def pc():
+    return DummyPyCloud("foo", "bar")
+
+
+def record_writes(monkeypatch, pc, fail_at=None, exc=Crash):
+    """Record offsets of upload_write calls and fail before the call with
+    the index `fail_at`
+    """
+    offsets = []
+    upload_write = pc.upload_write
+
+    def write(**kwargs):
+        if len(offsets) == fail_at:
+            offsets.append(None)
+            raise exc("Connection lost")
+        offsets.append(kwargs["uploadoffset"])
+        return upload_write(**kwargs)
+
+    monkeypatch.setattr(pc, "upload_write", write)
+    return offsets
+
+
+class ReconnectingConnection(PCloudBinaryConnection):
+    """Binary connection sending its requests over the given connection"""
+
+    def __init__(self, connection):
+        super().__init__(connection.api)
+        self.connection = connection
+        self.reconnects = 0
+
+    def do_get_request(self, *args, **kwargs):
+        return self.connection.do_get_request(*args, **kwargs)
+
+    def upload(self, *args, **kwargs):
+        return self.connection.upload(*args, **kwargs)
+
+    def reconnect(self):
+        self.reconnects += 1
+        return self
+
+
+def uploaded():
+    """Content of the last upload session of the mock server"""
+    return bytes(MockHandler.uploads[max(MockHandler.uploads)])
+
+
+@pytest.mark.usefixtures("start_mock_server")
+class TestResumableUpload(object):
+    def test_chunks(self, monkeypatch, pc, testfile):
+        offsets = record_writes(monkeypatch, pc)
+        progress = []
+        resp = pc.resumable_upload(
+            testfile, chunk_size=1000, progress_callback=progress.append, path="/"
+        )
+        assert resp == {"result": 0, "metadata": {"name": "backup.tar", "size": 4500}}
+        assert offsets == [0, 1000, 2000, 3000, 4000]
+        assert sum(progress) == 4500
+        assert uploaded() == testfile.read_bytes()
+        assert not os.path.exists(f"{testfile}.pcloud-upload")
+
+    def test_resume(self, monkeypatch, pc, testfile):
+        offsets = record_writes(monkeypatch, pc, fail_at=2)
+        with pytest.raises(Crash):
+            pc.resumable_upload(testfile, chunk_size=1000, path="/")
+        assert os.path.exists(f"{testfile}.pcloud-upload")
+
+        # a new process continues the upload
+        pc = DummyPyCloud("foo", "bar")
+        offsets = record_writes(monkeypatch, pc)
+        upload = ResumableUpload(pc, testfile, chunk_size=1000)
+        resp = upload.upload(path="/")
+        assert offsets == [2000, 3000, 4000]
+        assert resp["metadata"]["size"] == 4500
+        assert uploaded() == testfile.read_bytes()
+
+    def test_changed_file(self, monkeypatch, pc, testfile):
+        record_writes(monkeypatch, pc, fail_at=2)
+        with pytest.raises(Crash):
+            pc.resumable_upload(testfile, chunk_size=1000, path="/")
+        testfile.write_bytes(b"changed" * 100)
+        offsets = record_writes(monkeypatch, pc)
+        pc.resumable_upload(testfile, chunk_size=1000, path="/")
+        assert offsets == [0]
+        assert uploaded() == b"changed" * 100
+
+    def test_retry(self, monkeypatch, pc, testfile):
+        offsets = record_writes(monkeypatch, pc, fail_at=1, exc=httpx.ConnectError)
+        pc.resumable_upload(testfile, chunk_size=2000, path="/")
+        assert offsets == [0, None, 2000, 4000]
+        assert uploaded() == testfile.read_bytes()
+
+    def test_retry_binary(self, monkeypatch, pc, testfile):
+        pc.connection = connection = ReconnectingConnection(pc.connection)
+        offsets = record_writes(monkeypatch, pc, fail_at=1, exc=ConnectionResetError)
+        pc.resumable_upload(testfile, chunk_size=2000, path="/")
+        assert offsets == [0, None, 2000, 4000]
+        # the broken socket is replaced before retrying
+        assert connection.reconnects == 1
+        assert uploaded() == testfile.read_bytes()
+
+    def test_error(self, monkeypatch, pc, testfile):
+        monkeypatch.setattr(pc, "upload_save", lambda **kw: {"result": 2005})
+        with pytest.raises(ResumableUploadError):
+            pc.resumable_upload(testfile, path="/")
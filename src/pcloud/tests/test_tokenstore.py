@@ -0,0 +1,147 @@
+#
+from pcloud.api import PyCloud
+from pcloud.asyncapi import AsyncPyCloud
+from pcloud.tests.test_binaryprotocol import frame
+from pcloud.tests.test_binaryprotocol import make_connection
+from pcloud.tokenstore import FileTokenStore
+from pcloud.tokenstore import KeyringTokenStore
+from pcloud.tokenstore import MemoryTokenStore
+
+import asyncio
+import os
+import pytest
+import sys
+import time
+import types
+
+
+class RejectingConnection(object):
+    """Rejects all requests with other tokens than the current one"""
+
+    def __init__(self, api):
+        self.api = api
+
+    def do_get_request(self, method, authenticate=True, json=True, endpoint=None, **kw):
+        if self.api.auth_token != self.api.valid_token:
+            return {"result": 1000, "error": "Log in required."}
+        return {"result": 0}
+
+
+class TokenPyCloud(PyCloud):
+    logins = []
+    valid_token = "token1"
+
+    def get_auth_token(self):
+        self.logins.append(self.username)
+        return f"token{len(self.logins)}"
+
+
+class AsyncTokenPyCloud(AsyncPyCloud):
+    logins = TokenPyCloud.logins
+    valid_token = "token1"
+
+    async def get_auth_token(self):
+        self.logins.append(self.username)
+        return f"token{len(self.logins)}"
+
+
+@pytest.fixture(autouse=True)
+def logins():
+    del TokenPyCloud.logins[:]
+    return TokenPyCloud.logins
+
+
+def test_reuse(tmp_path, logins):
+    store = FileTokenStore(tmp_path / "tokens.json")
+    assert TokenPyCloud("foo", "bar", endpoint="test", token_store=store).auth_token
+    pc = TokenPyCloud("foo", "bar", endpoint="test", token_store=store)
+    assert pc.auth_token == "token1"
+    assert len(logins) == 1
+    assert os.stat(store.filename).st_mode & 0o777 == 0o600
+    TokenPyCloud("other", "bar", endpoint="test", token_store=store)
+    assert len(logins) == 2
+
+
+def test_expired(logins):
+    store = MemoryTokenStore()
+    pc = TokenPyCloud("foo", "bar", endpoint="test", token_store=store)
+    store.set(pc._token_key(), "token1", time.time() - 1)
+    TokenPyCloud("foo", "bar", endpoint="test", token_store=store)
+    assert len(logins) == 2
+
+
+def test_rejected(logins):
+    store = MemoryTokenStore()
+    pc = TokenPyCloud("foo", "bar", endpoint="test", token_store=store)
+    pc.connection = RejectingConnection(pc)
+    pc.valid_token = "token2"
+    assert pc.userinfo() == {"result": 0}
+    assert pc.auth_token == "token2"
+    assert store.get(pc._token_key()) == "token2"
+    assert len(logins) == 2
+
+
+def test_lazy_nearest(monkeypatch, logins):
+    endpoint = "https://api2.pcloud.com/"
+    monkeypatch.setattr(TokenPyCloud, "getnearestendpoint", lambda self: endpoint)
+    store = MemoryTokenStore()
+    pc = TokenPyCloud("foo", "bar", endpoint="nearest", lazy=True, token_store=store)
+    pc._authenticate()
+    # the token is stored for the chosen endpoint
+    assert store.get(f"{endpoint} foo") == pc.auth_token == "token1"
+
+
+def test_binary(logins):
+    store = MemoryTokenStore()
+    store.set("https://binapi.pcloud.com/ foo", "token0", time.time() + 60)
+    pc = TokenPyCloud("foo", "bar", endpoint="binapi", lazy=True, token_store=store)
+    pc.connection = conn = make_connection(frame({"result": 0}))
+    conn.api = pc
+    assert pc.userinfo() == {"result": 0}
+    # the socket isn't logged in, the stored token is sent with the request
+    assert b"token0" in conn.reader.writer.getvalue()
+    assert not logins
+
+
+def test_rejected_without_store(logins):
+    pc = TokenPyCloud("foo", "bar", endpoint="test")
+    pc.connection = RejectingConnection(pc)
+    pc.valid_token = "token2"
+    assert pc.userinfo()["result"] == 1000
+    assert len(logins) == 1
+
+
+def test_async_rejected(logins):
+    store = MemoryTokenStore()
+    store.set("http://localhost:5023/ foo", "token0", time.time() + 60)
+
+    async def run():
+        pc = AsyncTokenPyCloud("foo", "bar", endpoint="test", token_store=store)
+        pc.connection = RejectingConnection(pc)
+
+        async def do_get_request(*args, **kw):
+            return RejectingConnection.do_get_request(pc.connection, *args, **kw)
+
+        pc.connection.do_get_request = do_get_request
+        return pc, await pc.userinfo()
+
+    pc, resp = asyncio.run(run())
+    assert pc._token_key() == "http://localhost:5023/ foo"
+    assert resp == {"result": 0}
+    assert len(logins) == 1
+
+
+def test_keyring(monkeypatch):
+    passwords = {}
+    keyring = types.ModuleType("keyring")
+    keyring.get_password = lambda service, key: passwords.get((service, key))
+    keyring.set_password = lambda service, key, value: passwords.update(
+        {(service, key): value}
+    )
+    keyring.delete_password = lambda service, key: passwords.pop((service, key))
+    monkeypatch.setitem(sys.modules, "keyring", keyring)
+    store = KeyringTokenStore()
+    store.set("key", "token", time.time() + 60)
+    assert store.get("key") == "token"
+    store.delete("key")
+    assert store.get("key") is None
@@ -0,0 +1,215 @@
+#
+from pcloud.api import PyCloud
+from pcloud.asyncapi import AsyncPyCloud
+from pcloud.treeindex import TreeIndex
+
+import asyncio
+import pytest
+
+
+def folder(name, folderid, *contents):
+    return dict(name=name, folderid=folderid, isfolder=True, contents=list(contents))
+
+
+def file(name, fileid, size=1):
+    return {
+        "name": name,
+        "fileid": fileid,
+        "isfolder": False,
+        "size": size,
+        "hash": fileid * 10,
+        "modified": "Sat, 24 Jul 2021 09:51:28 +0000",
+    }
+
+
+class DummyApi(object):
+    def __init__(self):
+        self.calls = []
+        self.tree = {
+            "/": folder(
+                "/",
+                0,
+                folder(
+                    "docs",
+                    1,
+                    file("a.pdf", 11, 100),
+                    folder("old", 2, file("b.pdf", 12), file("c.txt", 13)),
+                ),
+                file("readme.txt", 14),
+            ),
+            "/docs/old": folder("old", 2, file("b.pdf", 12)),
+        }
+
+    def listfolder(self, path, recursive=0):
+        self.calls.append(path)
+        if path not in self.tree:
+            return {"result": 2005, "error": "Directory does not exist."}
+        return {"result": 0, "metadata": self.tree[path]}
+
+
+@pytest.fixture
+def index():
+    return TreeIndex(DummyApi()).refresh()
+
+
+def test_build(index):
+    assert len(index) == 7
+    assert index.api.calls == ["/"]
+    # the response is consumed
+    assert "contents" not in index.api.tree["/"]
+
+
+def test_get(index):
+    entry = index.get("/docs/a.pdf")
+    assert (entry.fileid, entry.size, entry.hash) == (11, 100, 110)
+    assert entry.folderid is None
+    assert entry.modified == 1627120288.0
+    assert entry.path == "/docs/a.pdf"
+    assert index.get("docs/old").folderid == 2
+    assert index.get("/docs/a.pdf/x") is None
+    assert "/docs/old/c.txt" in index
+    assert not index.exists("/missing")
+    assert not hasattr(entry, "__dict__")
+
+
+def test_subfolder_root():
+    api = DummyApi()
+    index = TreeIndex(api, "/docs/old").refresh()
+    assert index.listdir("/docs/old") == ["b.pdf"]
+    assert index.get("/docs/old/b.pdf").path == "/docs/old/b.pdf"
+    assert index.get("/docs") is None
+
+
+def test_listdir(index):
+    assert sorted(index.listdir("/")) == ["docs", "readme.txt"]
+    with pytest.raises(FileNotFoundError):
+        index.listdir("/missing")
+    with pytest.raises(NotADirectoryError):
+        index.listdir("/readme.txt")
+
+
+def test_walk(index):
+    paths = [entry.path for entry in index.walk("/docs")]
+    assert paths[0] == "/docs"
+    assert paths.index("/docs/old") < paths.index("/docs/old/b.pdf")
+    assert len(paths) == 5
+    assert list(index.walk("/missing")) == []
+
+
+@pytest.mark.parametrize(
+    "pattern, paths",
+    [
+        ("/*.txt", ["/readme.txt"]),
+        ("/docs/*", ["/docs/a.pdf", "/docs/old"]),
+        ("/**/*.pdf", ["/docs/a.pdf", "/docs/old/b.pdf"]),
+        (
+            "docs/**",
+            ["/docs", "/docs/a.pdf", "/docs/old", "/docs/old/b.pdf", "/docs/old/c.txt"],
+        ),
+        ("/docs/old/[bc].*", ["/docs/old/b.pdf", "/docs/old/c.txt"]),
+        ("/other/*", []),
+    ],
+)
+def test_glob(index, pattern, paths):
+    assert sorted(entry.path for entry in index.glob(pattern)) == paths
+
+
+def test_refresh_subtree(index):
+    index.refresh("/docs/old")
+    assert index.api.calls == ["/", "/docs/old"]
+    assert index.listdir("/docs/old") == ["b.pdf"]
+    assert len(index) == 6
+    assert index.get("/docs/old/b.pdf").parent is index.get("/docs/old")
+
+
+def test_error():
+    index = TreeIndex(DummyApi(), "/missing")
+    with pytest.raises(OSError):
+        index.refresh()
+
+
+def test_tree_index():
+    pc = PyCloud.__new__(PyCloud)
+    pc.listfolder = DummyApi().listfolder
+    assert len(pc.tree_index()) == 7
+
+
+def test_async_tree_index():
+    api = DummyApi()
+
+    async def listfolder(**kwargs):
+        return api.listfolder(**kwargs)
+
+    async def main():
+        pc = AsyncPyCloud.__new__(AsyncPyCloud)
+        pc.listfolder = listfolder
+        index = await pc.tree_index()
+        assert len(index) == 7
+        await index.apply(event("deletefolder", folderid=2, parentfolderid=1))
+        # the contents of folders moved into the index are listed
+        moved = event("modifyfolder", folderid=2, parentfolderid=0, name="old")
+        return index, await index.apply(moved)
+
+    api.tree["/old"] = folder("old", 2, file("b.pdf", 12))
+    index, changed = asyncio.run(main())
+    assert changed
+    assert api.calls == ["/", "/old"]
+    assert index.listdir("/old") == ["b.pdf"]
+
+
+def event(kind, **metadata):
+    metadata.setdefault("isfolder", kind.endswith("folder"))
+    return {"event": kind, "metadata": metadata}
+
+
+def test_apply_create(index):
+    assert index.apply(event("createfile", fileid=15, parentfolderid=1, name="d.txt"))
+    assert index.get("/docs/d.txt") is index.get_by_id(fileid=15)
+    assert index.apply(event("createfolder", folderid=3, parentfolderid=1, name="new"))
+    assert index.listdir("/docs/new") == []
+    assert len(index) == 9
+    assert index.api.calls == ["/"]
+
+
+def test_apply_replace(index):
+    index.apply(event("createfile", fileid=15, parentfolderid=1, name="a.pdf"))
+    assert index.get("/docs/a.pdf").fileid == 15
+    assert index.get_by_id(fileid=11) is None
+    assert len(index) == 7
+
+
+def test_apply_modify(index):
+    index.apply(event("modifyfile", fileid=12, parentfolderid=1, name="b2.pdf", size=5))
+    assert index.get("/docs/old/b.pdf") is None
+    assert index.get("/docs/b2.pdf").size == 5
+    index.apply(event("modifyfolder", folderid=2, parentfolderid=0, name="new"))
+    assert index.get_by_id(fileid=13).path == "/new/c.txt"
+    assert len(index) == 7
+
+
+def test_apply_delete(index):
+    assert index.apply(event("deletefolder", folderid=2, parentfolderid=1))
+    assert index.get_by_id(fileid=12) is None
+    assert len(index) == 4
+    assert not index.apply(event("deletefile", fileid=99, parentfolderid=1))
+
+
+def test_apply_outside(index):
+    assert not index.apply(event("createfile", fileid=20, parentfolderid=9, name="x"))
+    assert not index.apply({"event": "requestsharein", "share": {}})
+    # moved out of the index
+    assert index.apply(event("modifyfolder", folderid=2, parentfolderid=9, name="o"))
+    assert len(index) == 4
+    # moved back, its contents are listed
+    assert index.apply(event("modifyfolder", folderid=2, parentfolderid=1, name="old"))
+    assert index.api.calls == ["/", "/docs/old"]
+    assert index.listdir("/docs/old") == ["b.pdf"]
+    assert len(index) == 6
+
+
+def test_apply_root():
+    index = TreeIndex(DummyApi(), "/docs/old").refresh()
+    assert index.apply(event("modifyfolder", folderid=2, parentfolderid=1, name="x"))
+    assert index.get("/docs/old/b.pdf").fileid == 12
+    assert index.apply(event("deletefolder", folderid=2, parentfolderid=1))
+    assert index.root is None and len(index) == 0
@@ -0,0 +1,92 @@
+#
+from pcloud.tests.test_treesync import DiffApi
+from pcloud.treeindex import TreeIndex
+from pcloud.treestore import TreeStore
+from pcloud.treesync import TreeSync
+
+import pytest
+
+
+@pytest.fixture
+def store(tmp_path):
+    with TreeStore(tmp_path / "tree.sqlite") as store:
+        yield store
+
+
+def paths(index):
+    return sorted((entry.path, entry.size, entry.hash) for entry in index.walk())
+
+
+def test_save_load(store):
+    index = TreeIndex(DiffApi()).refresh()
+    assert store.save(index, 100)
+    loaded = TreeIndex(DiffApi())
+    assert store.load(loaded) == 100
+    assert paths(loaded) == paths(index)
+    assert len(loaded) == 7
+    assert loaded.get_by_id(fileid=12).path == "/docs/old/b.pdf"
+    assert loaded.api.calls == []
+
+
+def test_load_other_path(store):
+    store.save(TreeIndex(DiffApi()).refresh(), 100)
+    index = TreeIndex(DiffApi(), "/docs")
+    assert store.load(index) is None
+    assert index.root is None
+
+
+def test_sync_cold_start(store):
+    api = DiffApi()
+    TreeSync(TreeIndex(api), store=store).start()
+    api.add("createfile", fileid=15, parentfolderid=1, name="d.txt")
+    api.add("modifyfolder", folderid=2, parentfolderid=0, name="older")
+    api.add("deletefile", fileid=14, parentfolderid=0)
+    sync = TreeSync(TreeIndex(api), store=store).start()
+    assert api.calls == ["/"]
+    assert sync.diffid == 103
+    assert sorted(sync.index.listdir("/")) == ["docs", "older"]
+    # the events are stored as well
+    loaded = TreeIndex(api)
+    assert store.load(loaded) == 103
+    assert paths(loaded) == paths(sync.index)
+
+
+def test_moved_folder(store):
+    api = DiffApi()
+    sync = TreeSync(TreeIndex(api), store=store).start()
+    api.add("modifyfolder", folderid=2, parentfolderid=9, name="old")
+    api.add("modifyfolder", folderid=2, parentfolderid=1, name="old")
+    sync.poll()
+    loaded = TreeIndex(api)
+    store.load(loaded)
+    assert paths(loaded) == paths(sync.index)
+    assert loaded.listdir("/docs/old") == ["b.pdf"]
+
+
+def test_outdated(store, tmp_path):
+    api = DiffApi()
+    index = TreeIndex(api).refresh()
+    store.save(index, 100)
+    with TreeStore(tmp_path / "tree.sqlite") as other:
+        api.add("deletefile", fileid=14, parentfolderid=0)
+        TreeSync(TreeIndex(api), diffid=None, store=other).start()
+    # the stored state is newer than this index
+    assert not store.save(index, 100)
+    assert not store.update(index, [], 101)
+    loaded = TreeIndex(api)
+    assert store.load(loaded) == 101
+    assert not loaded.exists("/readme.txt")
+
+
+def test_replaced_folder(store):
+    api = DiffApi()
+    sync = TreeSync(TreeIndex(api), store=store).start()
+    # a file takes the name of the folder with two files
+    api.add("createfile", fileid=20, parentfolderid=1, name="old")
+    sync.poll()
+    assert not sync.index.get("/docs/old").isfolder
+    count = store._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+    assert count == len(sync.index) == 5
+    loaded = TreeIndex(api)
+    store.load(loaded)
+    assert paths(loaded) == paths(sync.index)
@@ -0,0 +1,138 @@
+#
+from pcloud.binaryprotocol import PCloudBinaryConnection
+from pcloud.tests.test_binaryprotocol import DummyAPI
+from pcloud.tests.test_treeindex import DummyApi
+from pcloud.tests.test_treeindex import event
+from pcloud.treeindex import TreeIndex
+from pcloud.treesync import TreeSync
+
+import httpx
+import pytest
+import socket
+import threading
+
+
+class DiffApi(DummyApi):
+    """Answers diff with the queued events after the requested diffid"""
+
+    def __init__(self):
+        super().__init__()
+        self.events = []
+        self.diffs = []
+
+    def add(self, kind, **metadata):
+        diffid = len(self.events) + 101
+        self.events.append(dict(event(kind, **metadata), diffid=diffid))
+
+    def diff(self, diffid=None, last=None, limit=None, block=None, _timeout=None):
+        self.diffs.append(
+            dict(diffid=diffid, last=last, limit=limit, block=block, timeout=_timeout)
+        )
+        if last == 0:
+            return {"result": 0, "diffid": len(self.events) + 100, "entries": []}
+        entries = [e for e in self.events if e["diffid"] > diffid][:limit]
+        if block and not entries:
+            raise httpx.ReadTimeout("no events")
+        return {
+            "result": 0,
+            "diffid": entries[-1]["diffid"] if entries else diffid,
+            "entries": entries,
+        }
+
+
+@pytest.fixture
+def api():
+    return DiffApi()
+
+
+def test_start(api):
+    sync = TreeSync(TreeIndex(api)).start()
+    assert sync.diffid == 100
+    assert len(sync.index) == 7
+    assert api.calls == ["/"]
+
+
+def test_poll(api):
+    sync = TreeSync(TreeIndex(api)).start()
+    api.add("createfile", fileid=15, parentfolderid=1, name="d.txt")
+    api.add("deletefile", fileid=11, parentfolderid=1)
+    assert len(sync.poll()) == 2
+    assert sync.diffid == 102
+    assert sorted(sync.index.listdir("/docs")) == ["d.txt", "old"]
+    assert sync.poll() == []
+
+
+def test_poll_pages(api):
+    sync = TreeSync(TreeIndex(api)).start()
+    sync.limit = 2
+    for i in range(5):
+        api.add("createfile", fileid=20 + i, parentfolderid=0, name=f"{i}.txt")
+    assert len(sync.poll()) == 5
+    assert [diff["diffid"] for diff in api.diffs[-3:]] == [100, 102, 104]
+    assert len(sync.index) == 12
+
+
+def test_resume(api):
+    index = TreeSync(TreeIndex(api)).start().index
+    api.add("createfile", fileid=15, parentfolderid=1, name="d.txt")
+    sync = TreeSync(index, diffid=100).start()
+    assert index.exists("/docs/d.txt")
+    assert sync.diffid == 101
+    assert api.calls == ["/"]
+
+
+def test_reset(api):
+    sync = TreeSync(TreeIndex(api)).start()
+    api.add("reset")
+    sync.poll()
+    assert api.calls == ["/", "/"]
+
+
+def test_block_timeout(api):
+    sync = TreeSync(TreeIndex(api)).start()
+    assert sync.poll(block=True) == []
+    api.add("createfile", fileid=15, parentfolderid=1, name="d.txt")
+    assert len(sync.poll(block=True)) == 1
+    assert api.diffs[-1]["block"] == 1
+    assert api.diffs[-1]["timeout"] == sync.block_timeout
+
+
+class ReconnectingConnection(PCloudBinaryConnection):
+    reconnects = 0
+
+    def reconnect(self):
+        self.reconnects += 1
+        return self
+
+
+def test_block_timeout_binary(api):
+    sync = TreeSync(TreeIndex(api)).start()
+    api.connection = ReconnectingConnection(DummyAPI())
+
+    def diff(**kwargs):
+        raise socket.timeout("timed out")
+
+    api.diff = diff
+    assert sync.poll(block=True) == []
+    # the late response must not be read as result of the next request
+    assert api.connection.reconnects == 1
+
+
+def test_run(api):
+    sync = TreeSync(TreeIndex(api)).start()
+    stop = threading.Event()
+    received = []
+
+    def callback(events):
+        received.extend(events)
+        stop.set()
+
+    api.add("createfile", fileid=15, parentfolderid=1, name="d.txt")
+    sync.run(callback=callback, stop=stop)
+    assert len(received) == 1
+
+
+def test_error(api):
+    api.diff = lambda **kw: {"result": 2000, "error": "Log in failed."}
+    with pytest.raises(OSError):
+        TreeSync(TreeIndex(api)).start()
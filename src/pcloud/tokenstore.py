@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+import time
+
+
+class MemoryTokenStore(object):
+    """Keeps auth tokens for the lifetime of the process.
+
+    Token stores map a key of endpoint and user to an auth token and the
+    time it expires. `get` only returns tokens, which haven't expired.
+    """
+
+    def __init__(self):
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            token, expires = self._tokens.get(key, (None, 0))
+        return token if expires > time.time() else None
+
+    def set(self, key, token, expires):
+        with self._lock:
+            self._tokens[key] = (token, expires)
+
+    def delete(self, key):
+        with self._lock:
+            self._tokens.pop(key, None)
+
+
+class FileTokenStore(MemoryTokenStore):
+    """Keeps auth tokens in a JSON file readable only by the user, so they
+    are shared by processes.
+    """
+
+    def __init__(self, filename):
+        super().__init__()
+        self.filename = os.fspath(filename)
+
+    def _read(self):
+        try:
+            with open(self.filename) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, tokens):
+        # replace the file at once, so readers never see parts of it
+        tmp = f"{self.filename}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, "w") as f:
+            json.dump(tokens, f)
+        os.replace(tmp, self.filename)
+
+    def get(self, key):
+        with self._lock:
+            token, expires = self._read().get(key, (None, 0))
+        return token if expires > time.time() else None
+
+    def set(self, key, token, expires):
+        with self._lock:
+            tokens = self._read()
+            now = time.time()
+            tokens = {k: v for k, v in tokens.items() if v[1] > now}
+            tokens[key] = (token, expires)
+            self._write(tokens)
+
+    def delete(self, key):
+        with self._lock:
+            tokens = self._read()
+            if tokens.pop(key, None) is not None:
+                self._write(tokens)
+
+
+class KeyringTokenStore(object):
+    """Keeps auth tokens in the keyring of the system.
+    Needs the `keyring` extra.
+    """
+
+    def __init__(self, service="pcloud"):
+        import keyring
+
+        self.keyring = keyring
+        self.service = service
+
+    def get(self, key):
+        value = self.keyring.get_password(self.service, key)
+        if not value:
+            return None
+        token, expires = json.loads(value)
+        return token if expires > time.time() else None
+
+    def set(self, key, token, expires):
+        self.keyring.set_password(self.service, key, json.dumps([token, expires]))
+
+    def delete(self, key):
+        try:
+            self.keyring.delete_password(self.service, key)
+        except self.keyring.errors.PasswordDeleteError:
+            pass
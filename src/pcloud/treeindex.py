@@ -0,0 +1,355 @@
+import posixpath
+
+from datetime import datetime
+from fnmatch import fnmatchcase
+from pcloud.utils import DT_FORMAT_STRING
+
+
+class TreeEntry(object):
+    """File or folder of a `TreeIndex`
+
+    Entries don't store their path, it is computed from the parents.
+    `children` maps names to entries for folders and is None for files.
+    `modified` is a POSIX timestamp.
+    """
+
+    __slots__ = ("name", "id", "parent", "size", "hash", "modified", "children")
+
+    def __init__(self, name, id, parent, size, hash, modified, children):
+        self.name = name
+        self.id = id
+        self.parent = parent
+        self.size = size
+        self.hash = hash
+        self.modified = modified
+        self.children = children
+
+    def __repr__(self):
+        return f"<TreeEntry {self.path}>"
+
+    @property
+    def isfolder(self):
+        return self.children is not None
+
+    @property
+    def fileid(self):
+        return None if self.isfolder else self.id
+
+    @property
+    def folderid(self):
+        return self.id if self.isfolder else None
+
+    @property
+    def path(self):
+        names = []
+        entry = self
+        while entry.parent is not None:
+            names.append(entry.name)
+            entry = entry.parent
+        # the root entry is named by its path
+        return posixpath.join(entry.name, *reversed(names))
+
+
+class TreeIndex(object):
+    """Index of the files and folders below `path`, built from a single
+    recursive `listfolder`, to answer metadata queries without requests.
+
+    Entries are compact records and the response is consumed while the
+    index is built, so its memory can be freed early. The index doesn't
+    follow changes, call `refresh` to update it or a part of it or `apply`
+    the events of `diff` (see `TreeSync`).
+    """
+
+    # events of diff, which change files or folders
+    update_events = frozenset(
+        ["createfolder", "modifyfolder", "createfile", "modifyfile"]
+    )
+    delete_events = frozenset(["deletefolder", "deletefile"])
+
+    def __init__(self, api, path="/"):
+        self.api = api
+        self.path = posixpath.normpath(path)
+        self.root = None
+        self.size = 0
+        self._ids = {}
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, path):
+        return self.get(path) is not None
+
+    def _listfolder(self, path):
+        return self._listing(self.api.listfolder(path=path, recursive=1), path)
+
+    @staticmethod
+    def _listing(resp, path):
+        result = resp.get("result")
+        if result != 0:
+            raise OSError(f"pCloud error occured ({result}) - {resp['error']}:  {path}")
+        return resp["metadata"]
+
+    @staticmethod
+    def _entry(metadata, name, parent):
+        modified = metadata.get("modified")
+        if modified:
+            modified = datetime.strptime(modified, DT_FORMAT_STRING).timestamp()
+        if metadata.get("isfolder"):
+            return TreeEntry(name, metadata["folderid"], parent, 0, None, modified, {})
+        return TreeEntry(
+            name,
+            metadata["fileid"],
+            parent,
+            metadata.get("size", 0),
+            metadata.get("hash"),
+            modified,
+            None,
+        )
+
+    @staticmethod
+    def key(metadata):
+        """Return the ("fileid", id) or ("folderid", id) tuple of metadata,
+        which `get_by_id` accepts as keyword argument.
+        """
+        if metadata.get("isfolder"):
+            return ("folderid", metadata["folderid"])
+        return ("fileid", metadata["fileid"])
+
+    def _build(self, metadata, name, parent):
+        """Return entry of the folder metadata and add it to the index.
+
+        The contents of the metadata are removed while building.
+        """
+        root = self._entry(metadata, name, parent)
+        self._ids[self.key(metadata)] = root
+        self.size += 1
+        stack = [(root, metadata.pop("contents", []))]
+        while stack:
+            folder, contents = stack.pop()
+            while contents:
+                item = contents.pop()
+                entry = self._entry(item, item["name"], folder)
+                folder.children[entry.name] = entry
+                self._ids[self.key(item)] = entry
+                self.size += 1
+                if entry.isfolder:
+                    stack.append((entry, item.pop("contents", [])))
+        return root
+
+    def _discard(self, entry):
+        """Remove entry and its contents from the index"""
+        if entry.parent is not None:
+            entry.parent.children.pop(entry.name, None)
+        stack = [entry]
+        while stack:
+            entry = stack.pop()
+            key = ("folderid", entry.id) if entry.isfolder else ("fileid", entry.id)
+            self._ids.pop(key, None)
+            self.size -= 1
+            if entry.isfolder:
+                stack.extend(entry.children.values())
+
+    def _insert(self, entry, parent, name):
+        """Move entry to parent, replacing the entry of the same name"""
+        if entry.parent is not None and entry.parent.children.get(entry.name) is entry:
+            del entry.parent.children[entry.name]
+        old = parent.children.get(name)
+        if old is not None and old is not entry:
+            self._discard(old)
+        entry.parent = parent
+        entry.name = name
+        parent.children[name] = entry
+
+    def _set_root(self, root):
+        """Replace all entries with the tree of root"""
+        self.root = root
+        self._ids = {}
+        self.size = 0
+        for entry in self.walk():
+            key = ("folderid", entry.id) if entry.isfolder else ("fileid", entry.id)
+            self._ids[key] = entry
+            self.size += 1
+
+    def _refreshed(self, path):
+        """Return the path `refresh(path)` lists and the entry of its parent,
+        which is None if the whole index is rebuilt.
+        """
+        path = self.path if path is None else posixpath.normpath(path)
+        parent = self.get(posixpath.dirname(path)) if path != self.path else None
+        if self.root is None or parent is None or not parent.isfolder:
+            return self.path, None
+        return path, parent
+
+    def _load(self, path, parent, metadata):
+        """Replace the subtree at path or, without parent, all entries with
+        the recursive listing of path and return self.
+        """
+        if parent is None:
+            self._ids = {}
+            self.size = 0
+            self.root = self._build(metadata, self.path, None)
+            return self
+        old = parent.children.get(posixpath.basename(path))
+        if old is not None:
+            self._discard(old)
+        entry = self._build(metadata, posixpath.basename(path), parent)
+        parent.children[entry.name] = entry
+        return self
+
+    def refresh(self, path=None):
+        """(Re)build the index or the subtree at `path` and return self."""
+        path, parent = self._refreshed(path)
+        return self._load(path, parent, self._listfolder(path))
+
+    def get_by_id(self, fileid=None, folderid=None):
+        """Return the entry of the file or folder id or None."""
+        if fileid is not None:
+            return self._ids.get(("fileid", fileid))
+        return self._ids.get(("folderid", folderid))
+
+    def apply(self, event):
+        """Apply an event of `diff` and return whether the index changed.
+
+        Events of files and folders outside of the index are ignored,
+        folders moved into it are listed.
+        """
+        changed, moved = self._apply(event)
+        if moved is not None:
+            self.refresh(moved)
+        return changed
+
+    def _apply(self, event):
+        """Apply event and return whether the index changed and the path of
+        a folder moved into the index, whose contents have to be listed.
+        """
+        name = event.get("event")
+        if name not in self.update_events and name not in self.delete_events:
+            return False, None
+        metadata = event["metadata"]
+        entry = self._ids.get(self.key(metadata))
+        if entry is not None and entry is self.root:
+            # the root keeps its path, the index has to be rebuilt if it moves
+            if name in self.delete_events:
+                self.root, self.size, self._ids = None, 0, {}
+            else:
+                entry.modified = self._entry(metadata, None, None).modified
+            return True, None
+        parent = self._ids.get(("folderid", metadata.get("parentfolderid")))
+        if name in self.delete_events or parent is None or not parent.isfolder:
+            if entry is None:
+                return False, None
+            self._discard(entry)
+            return True, None
+        update = self._entry(metadata, metadata["name"], parent)
+        if entry is None:
+            self._insert(update, parent, update.name)
+            self._ids[self.key(metadata)] = update
+            self.size += 1
+            if update.isfolder and name != "createfolder":
+                # contents of moved folders aren't part of the event
+                return True, update.path
+            return True, None
+        entry.size = update.size
+        entry.hash = update.hash
+        entry.modified = update.modified
+        if entry.parent is not parent or entry.name != update.name:
+            self._insert(entry, parent, update.name)
+        return True, None
+
+    def _parts(self, path):
+        """Return the names of path below the root or None if it is outside"""
+        path = posixpath.normpath(posixpath.join(self.path, path))
+        if path == self.path:
+            return []
+        prefix = self.path.rstrip("/") + "/"
+        if not path.startswith(prefix):
+            return None
+        return path[len(prefix) :].split("/")
+
+    def get(self, path):
+        """Return the entry of path or None."""
+        parts = self._parts(path)
+        if parts is None or self.root is None:
+            return None
+        entry = self.root
+        for name in parts:
+            if not entry.isfolder:
+                return None
+            entry = entry.children.get(name)
+            if entry is None:
+                return None
+        return entry
+
+    def exists(self, path):
+        return self.get(path) is not None
+
+    def listdir(self, path):
+        """Return the names of the contents of the folder at path."""
+        entry = self.get(path)
+        if entry is None:
+            raise FileNotFoundError(path)
+        if not entry.isfolder:
+            raise NotADirectoryError(path)
+        return list(entry.children)
+
+    def walk(self, path=None):
+        """Yield all entries below path or an entry, folders before their
+        contents.
+        """
+        if path is None:
+            entry = self.root
+        elif isinstance(path, TreeEntry):
+            entry = path
+        else:
+            entry = self.get(path)
+        if entry is None:
+            return
+        stack = [entry]
+        while stack:
+            entry = stack.pop()
+            yield entry
+            if entry.isfolder:
+                stack.extend(reversed(list(entry.children.values())))
+
+    def glob(self, pattern):
+        """Yield the entries matching the pattern, i.e. `/docs/**/*.pdf`.
+
+        `*`, `?` and `[...]` match within a name, `**` any number of folders.
+        Relative patterns are relative to the root of the index.
+        """
+        parts = self._parts(pattern)
+        if parts is None or self.root is None:
+            return iter(())
+        return self._match(self.root, parts)
+
+    def _match(self, entry, parts):
+        if not parts:
+            yield entry
+            return
+        name, rest = parts[0], parts[1:]
+        if name == "**":
+            yield from self._match(entry, rest)
+            if entry.isfolder:
+                for child in entry.children.values():
+                    yield from self._match(child, parts)
+        elif entry.isfolder:
+            for child_name, child in entry.children.items():
+                if fnmatchcase(child_name, name):
+                    yield from self._match(child, rest)
+
+
+class AsyncTreeIndex(TreeIndex):
+    """`TreeIndex` for `AsyncPyCloud`, `refresh` and `apply` are coroutines."""
+
+    async def _listfolder(self, path):
+        return self._listing(await self.api.listfolder(path=path, recursive=1), path)
+
+    async def refresh(self, path=None):
+        path, parent = self._refreshed(path)
+        return self._load(path, parent, await self._listfolder(path))
+
+    async def apply(self, event):
+        changed, moved = self._apply(event)
+        if moved is not None:
+            await self.refresh(moved)
+        return changed
@@ -0,0 +1,207 @@
+import os
+import sqlite3
+import threading
+
+from contextlib import contextmanager
+from pcloud.treeindex import TreeEntry
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value);
+CREATE TABLE IF NOT EXISTS entries (
+    isfolder INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    parent INTEGER,
+    name TEXT NOT NULL,
+    size INTEGER,
+    hash TEXT,
+    modified REAL,
+    PRIMARY KEY (isfolder, id),
+    UNIQUE (parent, name)
+);
+CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent);
+"""
+
+INSERT = "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+DELETE_SUBTREE = """
+WITH RECURSIVE subtree(isfolder, id) AS (
+    VALUES (?, ?)
+    UNION SELECT entries.isfolder, entries.id FROM entries, subtree
+    WHERE subtree.isfolder = 1 AND entries.parent = subtree.id
+)
+DELETE FROM entries WHERE (isfolder, id) IN subtree
+"""
+
+# entries, which another entry with the same parent and name replaces, and
+# their contents
+DELETE_REPLACED = """
+WITH RECURSIVE subtree(isfolder, id) AS (
+    SELECT isfolder, id FROM entries
+    WHERE parent IS ? AND name = ? AND NOT (isfolder = ? AND id = ?)
+    UNION SELECT entries.isfolder, entries.id FROM entries, subtree
+    WHERE subtree.isfolder = 1 AND entries.parent = subtree.id
+)
+DELETE FROM entries WHERE (isfolder, id) IN subtree
+"""
+
+
+class TreeStore(object):
+    """SQLite file persisting a `TreeIndex` together with its `diffid`.
+
+    Entries are stored with the id of their parent folder, so every event
+    of `diff` changes single rows. Writes are transactions, which only
+    advance the stored `diffid`, so several processes can share the file.
+    One file stores the index of one path.
+    """
+
+    # seconds to wait for locks of other processes
+    timeout = 30
+
+    def __init__(self, filename):
+        """
+        :param filename: path of the database, it is created if missing
+        """
+        self.filename = os.fspath(filename)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            self.filename,
+            timeout=self.timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def _state(self, db):
+        return dict(db.execute("SELECT name, value FROM state"))
+
+    @staticmethod
+    def _row(entry):
+        parent = entry.parent.id if entry.parent is not None else None
+        hash = str(entry.hash) if entry.hash is not None else None
+        return (
+            int(entry.isfolder),
+            entry.id,
+            parent,
+            entry.name,
+            entry.size,
+            hash,
+            entry.modified,
+        )
+
+    def _insert(self, db, entries):
+        db.executemany(INSERT, (self._row(entry) for entry in entries))
+
+    def load(self, index):
+        """Fill the index with the stored entries and return their diffid.
+
+        Returns None and leaves the index untouched, if nothing is stored
+        for the path of the index.
+        """
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                state = self._state(self._db)
+                if state.get("path") != index.path:
+                    return None
+                rows = self._db.execute("SELECT * FROM entries").fetchall()
+            finally:
+                self._db.execute("COMMIT")
+        entries = {}
+        for isfolder, id, parent, name, size, hash, modified in rows:
+            entry = TreeEntry(
+                name,
+                id,
+                None,
+                size,
+                int(hash) if hash is not None else None,
+                modified,
+                {} if isfolder else None,
+            )
+            entries[isfolder, id] = (entry, parent)
+        root = None
+        for entry, parent in entries.values():
+            if parent is None:
+                root = entry
+            elif (1, parent) in entries:
+                folder = entries[1, parent][0]
+                entry.parent = folder
+                folder.children[entry.name] = entry
+        if root is None:
+            return None
+        index._set_root(root)
+        return state["diffid"]
+
+    def save(self, index, diffid):
+        """Replace the stored entries with the index at diffid"""
+        with self._transaction() as db:
+            state = self._state(db)
+            if state.get("path") == index.path and state["diffid"] >= diffid:
+                return False
+            db.execute("DELETE FROM entries")
+            self._insert(db, index.walk())
+            db.executemany(
+                "INSERT OR REPLACE INTO state VALUES (?, ?)",
+                [("path", index.path), ("diffid", diffid)],
+            )
+        return True
+
+    def apply(self, index, event):
+        """Apply an event of `diff` to the index and return the change of
+        the stored entries for `update`.
+        """
+        if event.get("event") not in index.update_events | index.delete_events:
+            index.apply(event)
+            return None
+        kind, id = index.key(event["metadata"])
+        known = index.get_by_id(**{kind: id}) is not None
+        index.apply(event)
+        entry = index.get_by_id(**{kind: id})
+        if entry is None:
+            return (int(kind == "folderid"), id, None)
+        # the contents of folders moved into the index are new as well
+        entries = [entry] if known else index.walk(entry)
+        return (int(kind == "folderid"), id, [self._row(e) for e in entries])
+
+    def update(self, index, changes, diffid):
+        """Store the changes returned by `apply`, which lead to diffid."""
+        with self._transaction() as db:
+            # entries of another path or from another process are newer
+            state = self._state(db)
+            if state.get("path") != index.path or state["diffid"] >= diffid:
+                return False
+            for change in changes:
+                if change is None:
+                    continue
+                isfolder, id, rows = change
+                if rows is None:
+                    db.execute(DELETE_SUBTREE, (isfolder, id))
+                    continue
+                # INSERT OR REPLACE would only drop the row of a replaced
+                # folder and leave its contents behind
+                db.executemany(
+                    DELETE_REPLACED, ((row[2], row[3], row[0], row[1]) for row in rows)
+                )
+                db.executemany(INSERT, rows)
+            db.execute("INSERT OR REPLACE INTO state VALUES ('diffid', ?)", (diffid,))
+        return True
@@ -0,0 +1,119 @@
+import httpx
+import socket
+
+from pcloud.binaryprotocol import PCloudBinaryConnection
+from pcloud.utils import log
+
+
+class TreeSync(object):
+    """Keeps a `TreeIndex` current with the events of `diff`.
+
+    The index is listed once, afterwards only the events following the
+    stored `diffid` are requested and applied. With a `TreeStore` the index
+    and `diffid` are persisted, so later runs continue without listing.
+    """
+
+    # number of events requested at once, while catching up
+    limit = 1000
+    # seconds a blocking diff waits for events
+    block_timeout = 600
+
+    def __init__(self, index, diffid=None, store=None):
+        """
+        :param index: TreeIndex to keep current
+        :param diffid: id of the last event already contained in the index
+        :param store: TreeStore the index is loaded from and saved to
+        """
+        self.index = index
+        self.api = index.api
+        self.diffid = diffid
+        self.store = store
+
+    def _diff(self, **params):
+        resp = self.api.diff(**params)
+        result = resp.get("result")
+        if result != 0:
+            raise OSError(f"pCloud error occured ({result}) - {resp['error']}: diff")
+        return resp
+
+    def _reset_connection(self):
+        """Reconnect a binary connection, the response of the timed out diff
+        would be taken for the result of the next request. Pooled
+        connections are dropped on errors anyway.
+        """
+        connection = getattr(self.api, "connection", None)
+        if isinstance(connection, PCloudBinaryConnection):
+            connection.reconnect()
+
+    def start(self):
+        """Build or load the index, unless a `diffid` is known, and catch up
+        with the events since. Returns self.
+        """
+        if self.diffid is None and self.store is not None:
+            self.diffid = self.store.load(self.index)
+        if self.diffid is None or self.index.root is None:
+            # changes made while listing are replayed by the next poll
+            self.diffid = self._diff(last=0)["diffid"]
+            self.index.refresh()
+            if self.store is not None:
+                self.store.save(self.index, self.diffid)
+        self.poll()
+        return self
+
+    def _apply(self, resp):
+        """Apply the events of a diff response and return them"""
+        events = resp.get("entries", [])
+        reset = False
+        changes = []
+        for event in events:
+            if event.get("event") == "reset":
+                # the events are replayed from the beginning
+                self.index.refresh()
+                reset = True
+            elif self.store is not None:
+                changes.append(self.store.apply(self.index, event))
+            else:
+                self.index.apply(event)
+        self.diffid = resp["diffid"]
+        if self.store is not None and events:
+            if reset:
+                self.store.save(self.index, self.diffid)
+            else:
+                self.store.update(self.index, changes, self.diffid)
+        return events
+
+    def poll(self, block=False):
+        """Apply the events since the last `diffid` and return them.
+
+        :param block: wait until an event arrives, at most `block_timeout`
+            seconds. A timeout of the request is handled like no events.
+        """
+        if block:
+            try:
+                resp = self._diff(
+                    diffid=self.diffid, block=1, _timeout=self.block_timeout
+                )
+            except (httpx.TimeoutException, socket.timeout):
+                self._reset_connection()
+                return []
+            return self._apply(resp)
+        events = []
+        while True:
+            entries = self._apply(self._diff(diffid=self.diffid, limit=self.limit))
+            events.extend(entries)
+            if len(entries) < self.limit:
+                return events
+
+    def run(self, callback=None, stop=None):
+        """Wait for events and apply them until `stop` is set.
+
+        :param callback: called with the list of events after applying them
+        :param stop: threading.Event ending the loop, it is checked after
+            every request
+        """
+        while stop is None or not stop.is_set():
+            events = self.poll(block=True)
+            if events:
+                log.debug("Applied %s events up to diffid %s", len(events), self.diffid)
+                if callback is not None:
+                    callback(events)
@@ -1,7 +1,10 @@
 import datetime
 import logging
+import os
 import sys
 
+from contextlib import contextmanager
+
 log = logging.getLogger("pcloud")
 log.setLevel(logging.INFO)
 
@@ -11,6 +14,9 @@ formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(messag
 handler.setFormatter(formatter)
 log.addHandler(handler)
 
+# format of the datetimes in responses of the API
+DT_FORMAT_STRING = "%a, %d %b %Y %H:%M:%S %z"
+
 
 # Helpers
 def to_api_datetime(dt):
@@ -21,3 +27,49 @@ def to_api_datetime(dt):
     if isinstance(dt, datetime.datetime):
         return dt.isoformat()
     return dt
+
+
+@contextmanager
+def open_upload(source):
+    """Open `source` of an upload for reading if it is a path.
+
+    File like objects are passed through and not closed.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield f
+    else:
+        yield source
+
+
+def stream_size(source):
+    """Return the bytes left to read from a seekable file like object or None
+
+    Files like `tempfile.SpooledTemporaryFile` aren't `io.IOBase` on all
+    supported versions of Python, so the type isn't checked.
+    """
+    seekable = getattr(source, "seekable", None)
+    if seekable is not None and not seekable():
+        return None
+    try:
+        pos = source.tell()
+        size = source.seek(0, os.SEEK_END) - pos
+        source.seek(pos)
+    except (AttributeError, OSError, ValueError):
+        # i.e. io.UnsupportedOperation for pipes
+        return None
+    return size
+
+
+class ViewWriter(object):
+    """File like object writing into a memoryview"""
+
+    def __init__(self, view):
+        self.view = view
+        self.pos = 0
+
+    def write(self, data):
+        size = len(data)
+        self.view[self.pos : self.pos + size] = data
+        self.pos += size
+        return size